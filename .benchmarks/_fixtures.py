@@ -0,0 +1,66 @@
+"""
+    Part of MML-client
+
+    Generates the audio files and the Songs used by the benchmarks
+"""
+
+from pathlib import Path
+from bin.playlist import Playlist
+from bin.song import Song
+# shared with the tests (.tests/ is on 'sys.path', see run.py):
+from _audio_files import make_mp3
+
+
+def make_library(path, count, frames=40, nested=False):
+    """
+    Creates 'count' '.mp3' files in the directory 'path'
+
+    :param Bool nested: in 'Artist/Album/' subdirectories (10 files per album)
+
+    :return path
+    :rtype  Path
+    """
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for index in range(count):
+        directory = path
+        if nested:
+            directory = path.joinpath("Artist {}".format(index // 100), "Album {}".format(index // 10))
+            directory.mkdir(parents=True, exist_ok=True)
+        make_mp3(directory.joinpath("song_{:06d}.mp3".format(index)),
+                 title="Song {}".format(index),
+                 artist="Artist {}".format(index % 100),
+                 album="Album {}".format(index % 1000),
+                 frames=frames)
+    return path
+
+
+def make_songs(count, nested=False):
+    """
+    Creates 'count' Songs, without any audio files (500 artists, 5000 albums)
+
+    :param Bool nested: with the paths of an 'Artist/Album/' library
+
+    :return the Songs
+    :rtype  list
+    """
+
+    songs = []
+    for index in range(count):
+        artist, album = "Artist {}".format(index % 500), "Album {}".format(index % 5000)
+        directory = "/music/{}/{}".format(artist, album) if nested else "/music"
+        songs.append(Song(title="Song {}".format(index), artist=artist, album=album, length=index % 600,
+                          path="{}/song_{:06d}.mp3".format(directory, index)))
+    return songs
+
+
+def make_playlist(count, name="Bench"):
+    """
+    :return a Playlist of 'count' Songs (see make_songs())
+    :rtype  Playlist
+    """
+
+    playlist = Playlist(name)
+    playlist.add_songs(make_songs(count))
+    return playlist
@@ -0,0 +1,126 @@
+"""
+    Part of MML-client
+
+    Runs the benchmarks from suite.py and compares them with a baseline
+
+    From the root of the repo:
+        python .benchmarks/run.py                       # run and compare with .benchmarks/baseline.json
+        python .benchmarks/run.py --save results.json   # ... and save the results
+        python .benchmarks/run.py --save .benchmarks/baseline.json --no-compare   # a new baseline
+        python .benchmarks/run.py -k playlist           # only the benchmarks with 'playlist' in their name
+
+    Exits with 1 if any benchmark is slower than the baseline by more than '--threshold'
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+# the audio files are generated by the same helpers as in the tests:
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), ".tests"))
+
+from suite import BENCHMARKS, UNITS, Fixtures, Unavailable  # noqa: E402
+
+
+def _shown(name, value):
+    """
+    :return (value, unit) as printed -> the seconds in ms
+    :rtype  tuple
+    """
+
+    unit = UNITS.get(name, "s")
+    return (value * 1000, "ms") if unit == "s" else (value, unit)
+
+
+def run(names, repeat):
+    """
+    :return name -> {"min", "median", "runs"} in seconds (or in their "unit", see suite.UNITS),
+            or {"skipped": reason} if it can not run here
+    :rtype  dict
+    """
+
+    results = {}
+    fixtures = Fixtures()
+    try:
+        for name in names:
+            try:
+                # the first run warms up the fixtures and the caches:
+                BENCHMARKS[name](fixtures)
+                runs = [BENCHMARKS[name](fixtures) for _ in range(repeat)]
+            except Unavailable as e:
+                results[name] = {"skipped": str(e)}
+                print("{:<45} skipped: {}".format(name, e))
+                continue
+            results[name] = {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+            if name in UNITS:
+                results[name]["unit"] = UNITS[name]
+            shown = _shown(name, min(runs)) + _shown(name, statistics.median(runs))
+            print("{:<45} min {:>10.3f} {:<2}   median {:>10.3f} {}".format(name, *shown))
+    finally:
+        fixtures.cleanup()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares the 'min' of every benchmark with the baseline
+
+    :return the names of the benchmarks slower than 'threshold' times the baseline
+    :rtype  list
+    """
+
+    regressions = []
+    print("\n{:<45} {:>15} {:>15} {:>8}".format("benchmark", "baseline", "now", "ratio"))
+    for name, result in results.items():
+        base = baseline.get(name)
+        if "min" not in result or base is None or "min" not in base:
+            continue
+        ratio = result["min"] / base["min"] if base["min"] else float("inf")
+        mark = "  REGRESSION" if ratio > threshold else ""
+        shown = _shown(name, base["min"]) + _shown(name, result["min"])
+        print("{:<45} {:>12.3f} {:<2} {:>12.3f} {:<2} {:>7.2f}x{}".format(name, *shown, ratio, mark))
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MML-Client benchmarks")
+    parser.add_argument("-k", dest="keyword", default="", help="Run only the benchmarks containing KEYWORD")
+    parser.add_argument("--repeat", type=int, default=5, help="Measured runs of every benchmark")
+    parser.add_argument("--baseline", default=os.path.join(BENCH_DIR, "baseline.json"),
+                        help="The results to compare with")
+    parser.add_argument("--no-compare", action="store_true", help="Do not compare with the baseline")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Max allowed ratio of the current to the baseline time")
+    parser.add_argument("--save", metavar="FILE", help="Save the results as JSON")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.keyword in name]
+    results = run(names, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w') as results_file:
+            json.dump({"machine": {"python": platform.python_version(),
+                                   "platform": platform.platform(),
+                                   "cpu_count": os.cpu_count()},
+                       "benchmarks": results}, results_file, indent=2, sort_keys=True)
+
+    if not args.no_compare and os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["benchmarks"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("\nSlower than the baseline: {}".format(", ".join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
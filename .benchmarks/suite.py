@@ -0,0 +1,366 @@
+"""
+    Part of MML-client
+
+    The benchmarks run by run.py
+
+    Every benchmark is a function, registered with @benchmark(name),
+    which takes the shared fixtures and returns the seconds of a single run
+    (setup done inside it is not measured), or another measure
+    in the 'unit' it was registered with (e.g. @benchmark(name, unit="B"))
+"""
+
+import gc
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import wave
+from flask import Flask, render_template
+from bin.crawler import Crawler
+from bin.playlist import Playlist
+from bin.search_index import SearchIndex
+from bin.tag_cache import TagCache
+from _fixtures import make_library, make_playlist, make_songs
+
+SCAN_SONGS = int(os.environ.get("MML_BENCH_SONGS", "500"))
+PLAYLIST_SIZES = [int(count) for count in os.environ.get("MML_BENCH_PLAYLIST_SIZES", "1000,10000,100000").split(",")]
+RENDER_SIZES = [int(count) for count in os.environ.get("MML_BENCH_RENDER_SONGS", "10000").split(",")]
+LIBRARY_SONGS = int(os.environ.get("MML_BENCH_LIBRARY_SONGS", "100000"))
+SEARCH_QUERIES = ["artist 42", "album 1234", "song 99999", "art", "song"]
+
+# name -> function(fixtures):
+BENCHMARKS = {}
+# name -> the unit of its result, when it is not "s" (seconds):
+UNITS = {}
+
+
+class Unavailable(Exception):
+    """The benchmark can not run in this environment"""
+
+
+def benchmark(name, unit="s"):
+    def register(function):
+        BENCHMARKS[name] = function
+        if unit != "s":
+            UNITS[name] = unit
+        return function
+    return register
+
+
+class Fixtures:
+    """
+        The generated files and objects shared by the benchmarks,
+        created on first use and removed by cleanup()
+    """
+
+    def __init__(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="mml-bench-")
+        self._library = None
+        self._nested_library = None
+        self._wav_library = None
+        self._long_song = None
+        self._playlists = {}
+        self._search_index = None
+
+    def library(self):
+        if self._library is None:
+            self._library = make_library(os.path.join(self.tmp_dir, "songs"), SCAN_SONGS)
+        return self._library
+
+    def nested_library(self):
+        # Artist/Album folders, older than 'Crawler.racy_mtime_ns' -> saved by a scan:
+        if self._nested_library is None:
+            self._nested_library = make_library(os.path.join(self.tmp_dir, "nested_songs"), SCAN_SONGS, nested=True)
+            for directory, subdirs, files in os.walk(str(self._nested_library)):
+                os.utime(directory, ns=(0, 10 ** 9))
+        return self._nested_library
+
+    def wav_library(self):
+        # a few 30 s, 44.1 kHz stereo WAV files (played without decoding):
+        if self._wav_library is None:
+            self._wav_library = os.path.join(self.tmp_dir, "wav_songs")
+            os.makedirs(self._wav_library)
+            for index in range(3):
+                with wave.open(os.path.join(self._wav_library, "song_{}.wav".format(index)), "wb") as wav_file:
+                    wav_file.setnchannels(2)
+                    wav_file.setsampwidth(2)
+                    wav_file.setframerate(44100)
+                    wav_file.writeframes(bytes(30 * 44100 * 4))
+        return self._wav_library
+
+    def long_song(self):
+        # ~10 minutes of 128 kbps frames:
+        if self._long_song is None:
+            library = make_library(os.path.join(self.tmp_dir, "long_songs"), 1, frames=23000)
+            self._long_song = os.path.join(str(library), os.listdir(str(library))[0])
+        return self._long_song
+
+    def playlist(self, count):
+        if count not in self._playlists:
+            self._playlists[count] = make_playlist(count)
+        return self._playlists[count]
+
+    def search_index(self):
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.playlist(LIBRARY_SONGS).songs)
+        return self._search_index
+
+    def cleanup(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+@benchmark("crawler.find_songs[{}]".format(SCAN_SONGS))
+def find_songs(fixtures):
+    return timed(Crawler.find_songs, fixtures.library())
+
+
+def _find_songs_warm(skip_unchanged):
+    def run(fixtures):
+        cache = TagCache(os.path.join(fixtures.tmp_dir, "cache_skip" if skip_unchanged else "cache"))
+        # the first scan fills the cache:
+        Crawler.find_songs(fixtures.nested_library(), cache=cache, skip_unchanged=skip_unchanged)
+        return timed(Crawler.find_songs, fixtures.nested_library(), cache=cache, skip_unchanged=skip_unchanged)
+    return run
+
+
+def _find_songs_parallel(workers, pool):
+    def run(fixtures):
+        return timed(Crawler.find_songs, fixtures.library(), workers=workers, pool=pool)
+    return run
+
+
+benchmark("crawler.find_songs[{} thread 8]".format(SCAN_SONGS))(_find_songs_parallel(8, "thread"))
+_PROCESSES = max(2, os.cpu_count() or 1)
+benchmark("crawler.find_songs[{} process {}]".format(SCAN_SONGS, _PROCESSES))(
+    _find_songs_parallel(_PROCESSES, "process"))
+
+
+@benchmark("crawler.find_songs_cold[nested {}]".format(SCAN_SONGS))
+def find_songs_cold(fixtures):
+    # an empty cache every run -> every file is loaded and cached:
+    cache = TagCache(tempfile.mkdtemp(dir=fixtures.tmp_dir))
+    return timed(Crawler.find_songs, fixtures.nested_library(), cache=cache)
+
+
+@benchmark("crawler.find_songs_dedup[{}]".format(SCAN_SONGS))
+def find_songs_dedup(fixtures):
+    from bin.content_hash import ContentIndex
+
+    # the generated files all have the same size -> the worst case, every file is hashed:
+    return timed(Crawler.find_songs, fixtures.library(), index=ContentIndex())
+
+
+benchmark("crawler.find_songs_warm[nested {}]".format(SCAN_SONGS))(_find_songs_warm(False))
+benchmark("crawler.find_songs_warm_skip[nested {}]".format(SCAN_SONGS))(_find_songs_warm(True))
+
+
+def _playlist_save(count):
+    def run(fixtures):
+        playlist = fixtures.playlist(count)
+        path = os.path.join(fixtures.tmp_dir, "playlists")
+        os.makedirs(path, exist_ok=True)
+        return timed(playlist.save, path, compact=True)
+    return run
+
+
+def _playlist_load(count):
+    def run(fixtures):
+        playlist = fixtures.playlist(count)
+        path = playlist.save(os.path.join(fixtures.tmp_dir, "playlists"), compact=True)
+        return timed(Playlist.load, path)
+    return run
+
+
+def _playlist_load_trusted(count):
+    def run(fixtures):
+        playlist = fixtures.playlist(count)
+        path = playlist.save(os.path.join(fixtures.tmp_dir, "playlists"), compact=True)
+        return timed(Playlist.load, path, trusted=True)
+    return run
+
+
+def _playlist_save_binary(count):
+    def run(fixtures):
+        playlist = fixtures.playlist(count)
+        path = os.path.join(fixtures.tmp_dir, "playlists")
+        os.makedirs(path, exist_ok=True)
+        return timed(playlist.save, path, compact=True, binary=True)
+    return run
+
+
+def _playlist_load_binary(count):
+    def run(fixtures):
+        playlist = fixtures.playlist(count)
+        path = playlist.save(os.path.join(fixtures.tmp_dir, "playlists"), compact=True, binary=True)
+        return timed(Playlist.load, path, trusted=True)
+    return run
+
+
+def _playlist_add_songs(count):
+    def run(fixtures):
+        songs = fixtures.playlist(count).songs
+        return timed(Playlist("Bench").add_songs, songs)
+    return run
+
+
+def _playlist_add_duplicates(count):
+    def run(fixtures):
+        playlist = fixtures.playlist(count)
+        return timed(playlist.add_songs, playlist.songs)
+    return run
+
+
+def _playlist_total_length(count):
+    def run(fixtures):
+        return timed(fixtures.playlist(count).total_length)
+    return run
+
+
+for _count in PLAYLIST_SIZES:
+    benchmark("playlist.save[{}]".format(_count))(_playlist_save(_count))
+    benchmark("playlist.load[{}]".format(_count))(_playlist_load(_count))
+    benchmark("playlist.load_trusted[{}]".format(_count))(_playlist_load_trusted(_count))
+    benchmark("playlist.save_binary[{}]".format(_count))(_playlist_save_binary(_count))
+    benchmark("playlist.load_binary[{}]".format(_count))(_playlist_load_binary(_count))
+    benchmark("playlist.add_songs[{}]".format(_count))(_playlist_add_songs(_count))
+    benchmark("playlist.add_songs_duplicates[{}]".format(_count))(_playlist_add_duplicates(_count))
+    benchmark("playlist.total_length[{}]".format(_count))(_playlist_total_length(_count))
+
+
+def _render_index(count):
+    def run(fixtures):
+        from web.views import main_view
+
+        app = Flask("web", root_path=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web"))
+        app.register_blueprint(main_view.bp, url_defaults={"backend": None})
+        all_songs = fixtures.playlist(count)
+        # the dropdown of all Songs is rendered only for a user Playlist:
+        current_playlist = Playlist("Current")
+        current_playlist.add_songs(all_songs.songs[:count // 10])
+        current_playlist.current_song_index = len(current_playlist) // 2
+
+        with app.test_request_context("/"):
+            return timed(render_template, "main_view/index.html",
+                         all_playlists=[all_songs.name(), current_playlist.name()],
+                         all_songs=all_songs,
+                         current_playlist=current_playlist,
+                         song_playing=True)
+    return run
+
+
+for _count in RENDER_SIZES:
+    benchmark("render.index[{}]".format(_count))(_render_index(_count))
+
+
+@benchmark("search.build[{}]".format(LIBRARY_SONGS))
+def search_build(fixtures):
+    songs = fixtures.playlist(LIBRARY_SONGS).songs
+    return timed(SearchIndex, songs)
+
+
+def _search(query):
+    def run(fixtures):
+        return timed(fixtures.search_index().search, query)
+    return run
+
+
+for _query in SEARCH_QUERIES:
+    benchmark("search.search[{}]".format(_query))(_search(_query))
+
+
+@benchmark("song.memory[{} nested]".format(LIBRARY_SONGS), unit="B")
+def song_memory(fixtures):
+    # bytes per Song of the default Playlist, with the paths of an 'Artist/Album/' library:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        songs_in_repo = Playlist("--all-songs--")
+        songs_in_repo.add_songs(make_songs(LIBRARY_SONGS, nested=True))
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return current / len(songs_in_repo)
+
+
+class NullSink:
+    """
+        Takes the place of simpleaudio.play_buffer, plays nothing,
+        records when the first chunk was passed to it
+    """
+
+    def __init__(self):
+        self.first_chunk = threading.Event()
+        self.first_chunk_time = None
+
+    def __call__(self, chunk, channels, sample_width, sample_rate):
+        if not self.first_chunk.is_set():
+            self.first_chunk_time = time.perf_counter()
+            self.first_chunk.set()
+        return self
+
+    def stop(self):
+        pass
+
+    def wait_done(self):
+        pass
+
+
+def _time_to_first_audio(fixtures, prefetched, songs_path=None):
+    try:
+        from web.backends.playback import Playback
+    except ImportError as e:
+        # 'simpleaudio' is needed by the StreamPlayer, even with another sink:
+        raise Unavailable(str(e))
+    from pydub import AudioSegment
+    if shutil.which(AudioSegment.converter) is None:
+        raise Unavailable("'{}' not found".format(AudioSegment.converter))
+
+    pl_path = os.path.join(fixtures.tmp_dir, "playback_playlists")
+    os.makedirs(pl_path, exist_ok=True)
+    sink = NullSink()
+    songs_path = songs_path if songs_path is not None else str(fixtures.library())
+    backend = Playback(songs_path=songs_path, pl_path=pl_path, watch=False, sink=sink)
+    try:
+        if prefetched:
+            # the start of the Song is decoded while the previous one plays:
+            backend.playlist.current_song_index = 0
+            backend._song_prefetch(backend.playlist, 0)
+            backend._prefetcher.submit(lambda: None).result()
+            backend.playlist.current_song_index = 1
+        start = time.perf_counter()
+        backend.song_play()
+        if not sink.first_chunk.wait(timeout=30):
+            raise Unavailable("no audio was decoded")
+        return sink.first_chunk_time - start
+    finally:
+        backend.song_stop()
+
+
+@benchmark("playback.time_to_first_audio")
+def time_to_first_audio(fixtures):
+    return _time_to_first_audio(fixtures, prefetched=False)
+
+
+@benchmark("playback.time_to_first_audio[prefetched]")
+def time_to_first_audio_prefetched(fixtures):
+    return _time_to_first_audio(fixtures, prefetched=True)
+
+
+@benchmark("playback.time_to_first_audio[wav]")
+def time_to_first_audio_wav(fixtures):
+    return _time_to_first_audio(fixtures, prefetched=False, songs_path=fixtures.wav_library())
+
+
+@benchmark("decoders.mp3_seek_index[10 min]")
+def mp3_seek_index(fixtures):
+    from bin.decoders import decoders
+
+    return timed(decoders["mp3"].seek_index, fixtures.long_song())
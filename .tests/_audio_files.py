@@ -0,0 +1,42 @@
+"""
+    Part of MML-client
+
+    Generates the audio files used by the tests and the benchmarks
+"""
+
+from pathlib import Path
+from mutagen.easyid3 import EasyID3
+
+# MPEG-1 Layer III, 128 kbps, 44100 Hz, joint stereo -> 417 bytes, 1152 samples:
+FRAME_HEADER = b"\xff\xfb\x90\x64"
+FRAME = FRAME_HEADER + bytes(413)
+
+
+def make_mp3(path, title="Title", artist=None, album=None, frames=40, audio=None):
+    """
+    Writes a minimal, silent '.mp3' file tagged with mutagen,
+    its directory is created if needed
+
+    :param path: the file to be created
+    :type  path: str
+    :type  path: Path
+
+    :param int   frames: number of MPEG frames (~26 ms each)
+    :param bytes audio:  written instead of the frames
+
+    :return path
+    :rtype  Path
+    """
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(FRAME * frames if audio is None else audio)
+
+    tags = EasyID3()
+    tags["title"] = title
+    if artist is not None:
+        tags["artist"] = artist
+    if album is not None:
+        tags["album"] = album
+    tags.save(path)
+    return path
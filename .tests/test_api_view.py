@@ -0,0 +1,93 @@
+import base64
+import io
+import unittest
+from types import SimpleNamespace
+from flask import Flask
+from bin.playlist import Playlist
+from bin.rw_lock import RWLock
+from bin.search_index import SearchIndex
+from bin.song import Song
+from web.views import api_view
+
+
+class TestApiSongs(unittest.TestCase):
+    def setUp(self) -> None:
+        self.seeks = []
+        self.songs_in_repo = Playlist("--all-songs--")
+        self.songs_in_repo.add_songs(Song(title="Song {}".format(index), length=index,
+                                          path="/music/song_{}.mp3".format(index))
+                                     for index in range(25))
+        backend = SimpleNamespace(lock=RWLock(), songs_in_repo=self.songs_in_repo, playlist=self.songs_in_repo,
+                                  lists_in_repo=["--all-songs--"], lists_meta={},
+                                  search_index=SearchIndex(self.songs_in_repo.songs),
+                                  songs_add=lambda audio_files: "job",
+                                  songs_add_status=lambda job_id: {"files": {}, "done": True}
+                                  if job_id == "job" else None,
+                                  song_seek=self.seeks.append)
+        app = Flask(__name__)
+        app.register_blueprint(api_view.bp, url_defaults={"backend": backend})
+        self.client = app.test_client()
+
+    def _get_all(self, **args):
+        items, cursor = [], None
+        while True:
+            query = dict(args, cursor=cursor) if cursor else args
+            page = self.client.get("/api/songs", query_string=query).get_json()
+            items += page["items"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return items
+
+    def test_pages(self):
+        items = self._get_all(limit=10)
+        self.assertEqual([item["index"] for item in items], list(range(25)))
+        self.assertEqual(items[3], {"index": 3, "title": "Song 3", "artist": "Unknown",
+                                    "album": "Unknown", "length": 3})
+
+    def test_fields(self):
+        page = self.client.get("/api/songs", query_string={"limit": 2, "fields": "title,length_pretty"}).get_json()
+        self.assertEqual(page["items"], [{"title": "Song 0", "length_pretty": "00:00"},
+                                         {"title": "Song 1", "length_pretty": "00:01"}])
+        self.assertEqual(page["total"], 25)
+
+    def test_cursor_after_remove(self):
+        page = self.client.get("/api/songs", query_string={"limit": 10}).get_json()
+        self.songs_in_repo.remove_song(0)
+        page = self.client.get("/api/songs", query_string={"limit": 10, "cursor": page["next_cursor"]}).get_json()
+        self.assertEqual(page["items"][0]["title"], "Song 10")
+
+    def test_invalid(self):
+        self.assertEqual(self.client.get("/api/songs?limit=0").status_code, 400)
+        self.assertEqual(self.client.get("/api/songs?limit=abc").status_code, 400)
+        self.assertEqual(self.client.get("/api/songs?fields=path").status_code, 400)
+        self.assertEqual(self.client.get("/api/songs?cursor=abc").status_code, 400)
+        cursor = base64.urlsafe_b64encode(b'[-20, "/music/missing.mp3"]').decode()
+        self.assertEqual(self.client.get("/api/songs", query_string={"cursor": cursor}).status_code, 400)
+
+    def test_search(self):
+        page = self.client.get("/api/search", query_string={"q": "song 1", "fields": "index,title"}).get_json()
+        self.assertEqual(page["items"][:2], [{"index": 1, "title": "Song 1"},
+                                             {"index": 10, "title": "Song 10"}])
+        self.assertEqual(page["total"], 11)
+        self.assertEqual(self.client.get("/api/search?q=song&limit=0").status_code, 400)
+
+    def test_uploads(self):
+        response = self.client.post("/api/uploads", data={"audio_files": (io.BytesIO(b"data"), "a.mp3")})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json(), {"job_id": "job", "status_url": "/api/uploads/job"})
+        self.assertEqual(self.client.get("/api/uploads/job").get_json(),
+                         {"job_id": "job", "files": {}, "done": True})
+        self.assertEqual(self.client.get("/api/uploads/other").status_code, 404)
+        self.assertEqual(self.client.post("/api/uploads").status_code, 400)
+
+    def test_seek(self):
+        response = self.client.post("/api/seek", query_string={"seconds": "61.5"})
+        self.assertEqual(response.get_json()["seconds"], 61.5)
+        self.assertEqual(self.seeks, [61.5])
+        self.assertEqual(self.client.post("/api/seek", data={"seconds": "abc"}).status_code, 400)
+        self.assertEqual(self.client.post("/api/seek", data={"seconds": "-1"}).status_code, 400)
+        self.assertEqual(self.client.post("/api/seek").status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
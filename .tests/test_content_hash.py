@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from bin import content_hash
+from bin.content_hash import PARTIAL_SIZE, ContentHasher, ContentIndex, full_hash, partial_hash
+from bin.tag_cache import TagCache
+
+
+class TestContentHasher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).joinpath("song.mp3")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_same_as_files(self):
+        for size in (0, 100, PARTIAL_SIZE, PARTIAL_SIZE + 1, 3 * PARTIAL_SIZE + 7):
+            data = os.urandom(size)
+            self.path.write_bytes(data)
+            hasher = ContentHasher()
+            # uneven chunks:
+            for start in range(0, size, 5000):
+                hasher.update(data[start:start + 5000])
+            self.assertEqual(hasher.partial(), partial_hash(self.path), size)
+            self.assertEqual(hasher.full(), full_hash(self.path), size)
+
+
+class TestContentIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).resolve()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _add(self, index, name, data):
+        path = self.path.joinpath(name)
+        path.write_bytes(data)
+        stat = path.stat()
+        return index.add(path, stat.st_mtime_ns, stat.st_size)
+
+    def test_add(self):
+        index = ContentIndex()
+        data = os.urandom(3 * PARTIAL_SIZE)
+        self.assertIsNone(self._add(index, "a.mp3", data))
+        # another size -> nothing is read:
+        with mock.patch.object(content_hash, "partial_hash", side_effect=AssertionError):
+            self.assertIsNone(self._add(index, "b.mp3", data[:-1]))
+        # the same head and tail -> compared as a whole:
+        middle = data[:PARTIAL_SIZE] + bytes(PARTIAL_SIZE) + data[-PARTIAL_SIZE:]
+        self.assertIsNone(self._add(index, "c.mp3", middle))
+        self.assertEqual(self._add(index, "d.mp3", data), str(self.path.joinpath("a.mp3")))
+        self.assertEqual(index.duplicates(), {str(self.path.joinpath("d.mp3")): str(self.path.joinpath("a.mp3"))})
+
+    def test_remove(self):
+        index = ContentIndex()
+        data = os.urandom(1000)
+        self._add(index, "a.mp3", data)
+        self._add(index, "b.mp3", data)
+        # the duplicate is no longer one:
+        self.assertEqual(index.remove([str(self.path.joinpath("a.mp3"))]), [str(self.path.joinpath("b.mp3"))])
+        self.assertIsNone(self._add(index, "b.mp3", data))
+        self.assertEqual(index.duplicates(), {})
+
+    def test_changed(self):
+        index = ContentIndex()
+        data = os.urandom(1000)
+        self._add(index, "a.mp3", data)
+        self._add(index, "b.mp3", data)
+
+        # re-tagged in place -> the same size, a newer mtime:
+        path = self.path.joinpath("a.mp3")
+        path.write_bytes(os.urandom(1000))
+        stat = path.stat()
+        orphans = []
+        self.assertIsNone(index.add(path, stat.st_mtime_ns + 10 ** 9, stat.st_size, orphans=orphans))
+        # its duplicate is no longer one:
+        self.assertEqual(orphans, [str(self.path.joinpath("b.mp3"))])
+        self.assertEqual(index.duplicates(), {})
+        self.assertIsNone(self._add(index, "b.mp3", data))
+
+    def test_cache(self):
+        cache = TagCache(self.path.joinpath("cache"))
+        index = ContentIndex(cache)
+        data = os.urandom(1000)
+        self._add(index, "a.mp3", data)
+        self._add(index, "b.mp3", data)
+        index.save()
+        self.assertEqual(len(cache.hashes()), 2)
+
+        # the hashes of the unchanged files are not computed again:
+        index = ContentIndex(cache)
+        with mock.patch.object(content_hash, "full_hash", side_effect=AssertionError), \
+                mock.patch.object(content_hash, "partial_hash", side_effect=AssertionError):
+            for name in ("a.mp3", "b.mp3"):
+                stat = self.path.joinpath(name).stat()
+                original = index.add(self.path.joinpath(name), stat.st_mtime_ns, stat.st_size)
+        self.assertEqual(original, str(self.path.joinpath("a.mp3")))
+
+
+if __name__ == "__main__":
+    unittest.main()
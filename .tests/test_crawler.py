@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from bin.content_hash import ContentIndex
+from bin.crawler import Crawler
+from bin.tag_cache import TagCache
+from _audio_files import make_mp3
+
+
+class TestCrawlerWalk(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).resolve()
+        self.songs = self.path.joinpath("songs")
+        for name in ("z.mp3", "Artist/Album/2.mp3", "Artist/Album/1.mp3", "Artist/single.mp3", "Artist/cover.jpg"):
+            make_mp3(self.songs.joinpath(name), Path(name).stem)
+        self.cache = TagCache(self.path.joinpath("cache"))
+
+    def tearDown(self) -> None:
+        del self.cache
+        self.tmp_dir.cleanup()
+
+    def _names(self, songs):
+        return [os.path.relpath(song.path(), str(self.songs)) for song in songs]
+
+    def _age_dirs(self):
+        # older than 'Crawler.racy_mtime_ns' -> saved by the scan:
+        for directory, subdirs, files in os.walk(str(self.songs)):
+            os.utime(directory, ns=(0, 10 ** 9))
+
+    def test_walk(self):
+        os.symlink(str(self.songs.joinpath("Artist")), str(self.songs.joinpath("link")))
+        dirs = {}
+        files = Crawler.walk(self.songs, (".mp3",), dirs)
+        self.assertEqual([os.path.relpath(file, str(self.songs)) for file, mtime_ns, size in files],
+                         ["Artist/Album/1.mp3", "Artist/Album/2.mp3", "Artist/single.mp3", "z.mp3"])
+        self.assertEqual(sorted(dirs), [str(self.songs), str(self.songs.joinpath("Artist")),
+                                        str(self.songs.joinpath("Artist", "Album"))])
+
+    def test_walk_missing(self):
+        self.assertEqual(list(Crawler.walk(self.path.joinpath("missing"), (".mp3",))), [])
+
+    def test_find_songs_recursive(self):
+        self.assertEqual(self._names(Crawler.find_songs(self.songs)),
+                         ["Artist/Album/1.mp3", "Artist/Album/2.mp3", "Artist/single.mp3", "z.mp3"])
+        self.assertEqual(self._names(Crawler.find_songs(self.songs, cache=self.cache)),
+                         self._names(Crawler.find_songs(self.songs)))
+
+    def test_find_songs_incremental(self):
+        events = []
+        walk = Crawler.walk
+
+        def logged_walk(*args):
+            for file, mtime_ns, size in walk(*args):
+                events.append(("walk", Path(file).name))
+                yield file, mtime_ns, size
+        load_song = Crawler._load_song
+
+        def logged_load_song(file):
+            events.append(("load", Path(file).name))
+            return load_song(file)
+
+        for cache in (None, self.cache):
+            del events[:]
+            with mock.patch.object(Crawler, "walk", side_effect=logged_walk), \
+                    mock.patch.object(Crawler, "_load_song", side_effect=logged_load_song):
+                songs = Crawler.find_songs(self.songs, cache=cache)
+            self.assertEqual(len(songs), 4)
+            # every file is loaded as soon as it is yielded, before the next one is listed:
+            self.assertEqual(events[:4], [("walk", "1.mp3"), ("load", "1.mp3"), ("walk", "2.mp3"), ("load", "2.mp3")])
+
+    def test_skip_unchanged(self):
+        self._age_dirs()
+        Crawler.find_songs(self.songs, cache=self.cache, skip_unchanged=True)
+        self.assertEqual(len(self.cache.dirs(str(self.songs))), 3)
+
+        # added without changing the mtime of the directory -> not listed again:
+        album = self.songs.joinpath("Artist", "Album")
+        make_mp3(album.joinpath("3.mp3"), "3")
+        os.utime(str(album), ns=(0, 10 ** 9))
+        # a changed directory is listed again:
+        make_mp3(self.songs.joinpath("Artist", "new.mp3"), "new")
+
+        self.assertEqual(self._names(Crawler.find_songs(self.songs, cache=self.cache, skip_unchanged=True)),
+                         ["Artist/Album/1.mp3", "Artist/Album/2.mp3", "Artist/new.mp3", "Artist/single.mp3", "z.mp3"])
+        self.assertEqual(len(Crawler.find_songs(self.songs, cache=self.cache)), 6)
+
+    def test_skip_unchanged_removed_dir(self):
+        self._age_dirs()
+        Crawler.find_songs(self.songs, cache=self.cache, skip_unchanged=True)
+        for name in ("1.mp3", "2.mp3"):
+            self.songs.joinpath("Artist", "Album", name).unlink()
+        self.songs.joinpath("Artist", "Album").rmdir()
+
+        self.assertEqual(self._names(Crawler.find_songs(self.songs, cache=self.cache, skip_unchanged=True)),
+                         ["Artist/single.mp3", "z.mp3"])
+        self.assertEqual(len(self.cache.records()), 2)
+
+    def test_duplicates(self):
+        copy = self.songs.joinpath("Artist", "copy.mp3")
+        copy.write_bytes(self.songs.joinpath("z.mp3").read_bytes())
+        index = ContentIndex(self.cache)
+
+        # the first one by path is kept:
+        self.assertEqual(self._names(Crawler.find_songs(self.songs, cache=self.cache, index=index)),
+                         ["Artist/Album/1.mp3", "Artist/Album/2.mp3", "Artist/copy.mp3", "Artist/single.mp3"])
+        self.assertEqual(index.duplicates(), {str(self.songs.joinpath("z.mp3")): str(copy)})
+
+
+if __name__ == "__main__":
+    unittest.main()
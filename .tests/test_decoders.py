@@ -0,0 +1,130 @@
+import struct
+import tempfile
+import unittest
+import wave
+from pathlib import Path
+from mutagen.id3 import TIT2, TPE1
+from mutagen.wave import WAVE
+from bin.decoders import Decoder, WavSource, decoders, find_decoder, register, supported_suffixes
+from bin.song import Song
+
+
+def make_wav(path, seconds=1, channels=2, sample_width=2, sample_rate=8000):
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(sample_rate)
+        size = seconds * sample_rate * channels * sample_width
+        wav_file.writeframes((bytes(range(256)) * (size // 256 + 1))[:size])
+
+
+class TestDecoders(unittest.TestCase):
+    def test_find_decoder(self):
+        self.assertIs(find_decoder("/music/song.mp3"), decoders["mp3"])
+        self.assertIs(find_decoder(Path("/music/SONG.WAV")), decoders["wav"])
+        self.assertIs(find_decoder("/music/song.flac"), decoders["flac"])
+        self.assertIs(find_decoder("/music/song.ogg"), decoders["ogg"])
+        self.assertIsNone(find_decoder("/music/cover.jpg"))
+        self.assertIn(".mp3", supported_suffixes())
+
+    def test_register(self):
+        class WaveOnlyDecoder(Decoder):
+            name = "wav"
+            suffixes = (".WAVE",)
+
+        class WavxDecoder(Decoder):
+            name = "wav"
+            suffixes = (".WAVX",)
+
+        wav_decoder = decoders["wav"]
+        try:
+            register(WaveOnlyDecoder())
+            self.assertIsInstance(find_decoder("song.wave"), WaveOnlyDecoder)
+            # the suffixes of the replaced Decoder are removed:
+            self.assertIsNone(find_decoder("song.wav"))
+
+            register(WavxDecoder())
+            # ... in any case:
+            self.assertIsNone(find_decoder("song.wave"))
+        finally:
+            register(wav_decoder)
+        self.assertIs(find_decoder("song.wav"), wav_decoder)
+        self.assertIsNone(find_decoder("song.WAVX"))
+        self.assertRaises(TypeError, register, "wav")
+
+
+class TestWavSource(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).joinpath("song.wav")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_read(self):
+        make_wav(self.path, seconds=2)
+        with wave.open(str(self.path), "rb") as wav_file:
+            frames = wav_file.readframes(wav_file.getnframes())
+
+        source = decoders["wav"].open(str(self.path))
+        self.assertIsInstance(source, WavSource)
+        self.assertTrue(source.zero_copy)
+        self.assertEqual(source.pcm_format, (2, 2, 8000))
+
+        chunk = source.read(32000)
+        self.assertIsInstance(chunk, memoryview)
+        self.assertEqual(bytes(chunk), frames[:32000])
+        self.assertEqual(bytes(source.read(100000)), frames[32000:])
+        self.assertEqual(len(source.read(100)), 0)
+        # 'chunk' is still referenced:
+        source.close()
+        self.assertEqual(len(source.read(100)), 0)
+
+    def test_seconds(self):
+        make_wav(self.path, seconds=2, channels=1, sample_width=3)
+        source = WavSource(self.path, seconds=1.5)
+        self.assertEqual(source.pcm_format, (1, 3, 8000))
+        self.assertEqual(len(source.read(100000)), 4000 * 3)
+        source.close()
+
+    def test_not_pcm(self):
+        # IEEE float samples are decoded by 'ffmpeg':
+        fmt = struct.pack("<HHIIHH", 3, 1, 8000, 32000, 4, 32)
+        data = bytes(16)
+        self.path.write_bytes(b"RIFF" + struct.pack("<I", 4 + 8 + len(fmt) + 8 + len(data)) + b"WAVE" +
+                              b"fmt " + struct.pack("<I", len(fmt)) + fmt +
+                              b"data" + struct.pack("<I", len(data)) + data)
+        self.assertRaises(ValueError, WavSource, self.path)
+        self.path.write_bytes(b"not a WAV file")
+        self.assertRaises(ValueError, WavSource, self.path)
+
+
+class TestSongLoadFormats(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_wav(self):
+        make_wav(self.path.joinpath("untagged.wav"), seconds=2)
+        song = Song.load(self.path.joinpath("untagged.wav"))
+        self.assertEqual((song.title(), song.artist(), song.length()), ("untagged", "Unknown", "2"))
+
+        make_wav(self.path.joinpath("tagged.wav"))
+        audio_file = WAVE(self.path.joinpath("tagged.wav"))
+        audio_file.add_tags()
+        audio_file.tags.add(TIT2(encoding=3, text="Title"))
+        audio_file.tags.add(TPE1(encoding=3, text="Artist"))
+        audio_file.save()
+        song = Song.load(self.path.joinpath("tagged.wav"))
+        self.assertEqual((song.title(), song.artist(), song.album()), ("Title", "Artist", "Unknown"))
+
+    def test_unsupported(self):
+        self.path.joinpath("cover.jpg").write_bytes(b"\xff\xd8")
+        self.assertIsNone(Song.load(self.path.joinpath("cover.jpg")))
+
+
+if __name__ == "__main__":
+    unittest.main()
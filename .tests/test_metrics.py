@@ -0,0 +1,58 @@
+import unittest
+from flask import Flask
+from bin.metrics import Metrics
+from web.views import metrics_view
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.metrics = Metrics()
+
+    def test_counter(self):
+        self.metrics.inc("mml_scan_files_total", 3)
+        self.metrics.inc("mml_scan_files_total", 2)
+        self.assertIn("mml_scan_files_total 5\n", self.metrics.render())
+
+    def test_histogram(self):
+        self.metrics.observe("mml_request_seconds", 0.003, endpoint="main_view.main_screen")
+        self.metrics.observe("mml_request_seconds", 2.0, endpoint="main_view.main_screen")
+        text = self.metrics.render()
+        self.assertIn('# TYPE mml_request_seconds histogram\n', text)
+        self.assertIn('mml_request_seconds_bucket{endpoint="main_view.main_screen",le="0.001"} 0\n', text)
+        self.assertIn('mml_request_seconds_bucket{endpoint="main_view.main_screen",le="0.005"} 1\n', text)
+        self.assertIn('mml_request_seconds_bucket{endpoint="main_view.main_screen",le="+Inf"} 2\n', text)
+        self.assertIn('mml_request_seconds_sum{endpoint="main_view.main_screen"} 2.003\n', text)
+        self.assertIn('mml_request_seconds_count{endpoint="main_view.main_screen"} 2\n', text)
+
+    def test_timer(self):
+        with self.metrics.timer("mml_playlist_load_seconds"):
+            pass
+        self.assertIn("mml_playlist_load_seconds_count 1\n", self.metrics.render())
+
+    def test_disabled(self):
+        self.metrics.enabled = False
+        with self.metrics.timer("mml_playlist_load_seconds"):
+            pass
+        self.metrics.inc("mml_scan_files_total")
+        self.assertNotIn("mml_playlist_load_seconds_count", self.metrics.render())
+        self.assertNotIn("\nmml_scan_files_total ", self.metrics.render())
+
+    def test_unknown_metric(self):
+        with self.assertRaises(ValueError):
+            self.metrics.inc("unknown_total")
+
+
+class TestMetricsView(unittest.TestCase):
+    def test_metrics_endpoint(self):
+        app = Flask(__name__)
+        app.register_blueprint(metrics_view.bp)
+        client = app.test_client()
+        client.get("/metrics")
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        self.assertIn('endpoint="metrics_view.metrics_text",method="GET",status="200"', response.get_data(as_text=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from bin.song import Song
+from web.backends.playback import Playback
+
+
+class TestPlaybackAutoAdvance(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        path = Path(self.tmp_dir.name)
+        self.backend = Playback(songs_path=str(path.joinpath("songs")), pl_path=str(path.joinpath("playlists")),
+                                watch=False)
+        # nothing is decoded in advance:
+        patcher = mock.patch.object(self.backend, "_song_prefetch")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.playlist = self.backend.songs_in_repo
+        self.playlist.add_songs(Song(title=name, path="/music/{}.mp3".format(name)) for name in ("A", "B", "C"))
+        # 'B' is playing:
+        self.playlist.current_song_index = 1
+        self.player = object()
+        self.backend._song = self.player
+
+    def tearDown(self) -> None:
+        self.backend._prefetcher.shutdown()
+        self.backend._checker.shutdown()
+        self.tmp_dir.cleanup()
+
+    def _next_track(self, path):
+        next_track = self.backend._song_next_track(self.playlist, path)
+        return next_track[0] if next_track is not None else None
+
+    def test_next_track(self):
+        self.assertEqual(self._next_track("/music/B.mp3"), "/music/C.mp3")
+        self.assertIsNone(self._next_track("/music/C.mp3"))
+
+        # moved up while playing -> the Song after it now:
+        self.playlist.swap_songs(0, 1)
+        self.assertEqual(self._next_track("/music/B.mp3"), "/music/A.mp3")
+
+        # removed while playing -> nothing more is played:
+        self.playlist.remove_songs({"/music/B.mp3"})
+        self.assertIsNone(self._next_track("/music/B.mp3"))
+
+    def test_track_changed(self):
+        self.playlist.swap_songs(0, 1)
+        self.backend._song_track_changed(self.playlist, self.player, "/music/A.mp3")
+        self.assertEqual(self.playlist.current_song_index, 1)
+        self.assertEqual(self.playlist.songs[self.playlist.current_song_index].path(), "/music/A.mp3")
+
+        # a Song removed by the Watcher shifts the others:
+        self.playlist.remove_songs({"/music/B.mp3"})
+        self.backend._song_track_changed(self.playlist, self.player, "/music/C.mp3")
+        self.assertEqual(self.playlist.current_song_index, 1)
+
+        # an older StreamPlayer changes nothing:
+        self.backend._song_track_changed(self.playlist, object(), "/music/A.mp3")
+        self.assertEqual(self.playlist.current_song_index, 1)
+
+        # nor a stopped one, with a track change still pending:
+        player = self.backend._song = mock.Mock()
+        self.backend.song_stop()
+        player.stop.assert_called_once_with()
+        self.backend._song_track_changed(self.playlist, player, "/music/A.mp3")
+        self.assertEqual(self.playlist.current_song_index, 1)
+
+
+class TestPlaybackPlaylists(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        path = Path(self.tmp_dir.name)
+        self.backend = Playback(songs_path=str(path.joinpath("songs")), pl_path=str(path.joinpath("playlists")),
+                                watch=False)
+
+    def tearDown(self) -> None:
+        self.backend._prefetcher.shutdown()
+        self.backend._checker.shutdown()
+        self.tmp_dir.cleanup()
+
+    def test_unique_paths(self):
+        songs_path = Path(self.backend.songs_path)
+        songs_path.mkdir()
+        paths = [str(songs_path.joinpath(name)) for name in ("a.mp3", "b.mp3")]
+        for path in paths:
+            Path(path).write_bytes(b"the same audio")
+        self.assertEqual(self.backend._unique_paths(paths), paths[:1])
+
+        # changed in place -> its duplicate is added again:
+        Path(paths[0]).write_bytes(b"another audio")
+        stat = os.stat(paths[0])
+        os.utime(paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.backend._unique_paths(paths[:1]), paths)
+
+    def test_delete_after_switching(self):
+        self.backend.playlist = self.backend.playlist_add("Mine")
+        self.backend.playlist.add_song(Song(title="A", path="/music/A.mp3"))
+        self.backend.playlist_save()
+        saved_path = self.backend.lists_meta["Mine"]["path"]
+        journal_path = saved_path.with_suffix(".journal")
+        self.assertTrue(journal_path.is_file())
+
+        self.backend.playlist = self.backend.playlist_change(self.backend.songs_in_repo.name())
+        self.backend.playlist = self.backend.playlist_change("Mine")
+        self.assertEqual(self.backend.playlist.path, saved_path)
+
+        self.backend.playlist_delete()
+        self.assertIs(self.backend.playlist, self.backend.songs_in_repo)
+        self.assertNotIn("Mine", self.backend.lists_in_repo)
+        self.assertFalse(saved_path.exists())
+        self.assertFalse(journal_path.exists())
+
+    def test_checked_once(self):
+        self.backend.playlist_add("Favourites")
+        with mock.patch.object(self.backend, "_checker") as checker:
+            playlist = self.backend.playlist_change("Favourites")
+            self.assertEqual(playlist.name(), "Favourites")
+            self.assertEqual(checker.submit.call_count, 1)
+            # cached -> already checked:
+            self.assertIs(self.backend.playlist_change("Favourites"), playlist)
+            self.assertEqual(checker.submit.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,307 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from bin._playlist_binary import PlaylistBinary
+from bin.playlist import Playlist
+from bin.song import Song
+
+
+class TestPlaylistSongs(unittest.TestCase):
+    def setUp(self) -> None:
+        self.songs = [Song(title="Song {}".format(index), path="/music/song_{}.mp3".format(index))
+                      for index in range(5)]
+        self.playlist = Playlist("Test")
+        self.playlist.add_songs(self.songs)
+
+    def tearDown(self) -> None:
+        del self.playlist
+
+    def assertIndexed(self):
+        for index, song in enumerate(self.playlist.songs):
+            self.assertEqual(self.playlist.index(song), index)
+
+    def test_add_song_type(self):
+        self.assertRaises(TypeError, self.playlist.add_song, song="/music/song_0.mp3")
+        self.assertRaises(TypeError, self.playlist.add_songs, songs_list=["/music/song_0.mp3"])
+
+    def test_add_song_duplicate(self):
+        self.assertFalse(self.playlist.add_song(Song(title="Other", path="/music/song_0.mp3")))
+        self.assertFalse(self.playlist.add_songs(self.songs))
+        self.assertEqual(len(self.playlist), 5)
+
+    def test_contains(self):
+        self.assertIn(Song(path="/music/song_3.mp3"), self.playlist)
+        self.assertNotIn(Song(path="/music/other.mp3"), self.playlist)
+        self.assertNotIn("/music/song_3.mp3", self.playlist)
+
+    def test_index(self):
+        self.assertIndexed()
+        self.assertRaises(ValueError, self.playlist.index, Song(path="/music/other.mp3"))
+
+    def test_index_of(self):
+        self.assertEqual(self.playlist.index_of("/music/song_3.mp3"), 3)
+        self.assertEqual(self.playlist.index_of("/music/other.mp3"), -1)
+
+    def test_remove_song(self):
+        self.assertTrue(self.playlist.remove_song(1))
+        self.assertNotIn(self.songs[1], self.playlist)
+        self.assertIndexed()
+        self.assertTrue(self.playlist.add_song(self.songs[1]))
+        self.assertEqual(self.playlist.index(self.songs[1]), 4)
+
+    def test_remove_songs(self):
+        self.playlist.current_song_index = 3
+        self.assertEqual(self.playlist.remove_songs({"/music/song_0.mp3", "/music/song_2.mp3"}), 2)
+        self.assertEqual(self.playlist.songs, [self.songs[1], self.songs[3], self.songs[4]])
+        self.assertEqual(self.playlist.current_song_index, 1)
+        self.assertIndexed()
+
+    def test_remove_songs_current(self):
+        self.playlist.current_song_index = 4
+        self.assertEqual(self.playlist.remove_songs({"/music/song_4.mp3"}), 1)
+        self.assertEqual(self.playlist.current_song_index, 3)
+
+        # the Song which took its place:
+        self.playlist.current_song_index = 1
+        self.assertEqual(self.playlist.remove_songs({"/music/song_1.mp3", "/music/song_0.mp3"}), 2)
+        self.assertEqual(self.playlist.current_song_index, 0)
+        self.assertEqual(self.playlist.songs[0], self.songs[2])
+
+    def test_remove_songs_from_first(self):
+        with mock.patch.object(self.playlist, "_reindex", wraps=self.playlist._reindex) as reindex:
+            self.assertEqual(self.playlist.remove_songs({"/music/song_4.mp3", "/music/song_3.mp3",
+                                                         "/music/missing.mp3"}), 2)
+            self.assertEqual(self.playlist.remove_songs({"/music/missing.mp3"}), 0)
+        # only the Songs after the first removed one are re-indexed:
+        reindex.assert_called_once_with(3)
+        self.assertEqual(self.playlist.songs, self.songs[:3])
+        self.assertIndexed()
+
+    def test_total_seconds(self):
+        playlist = Playlist("Lengths")
+        playlist.add_songs(Song(length=index * 10, path="/music/song_{}.mp3".format(index)) for index in range(5))
+        playlist.add_song(Song(length=7, path="/music/new.mp3"))
+        playlist.remove_song(0)
+        playlist.remove_songs({"/music/song_1.mp3", "/music/song_3.mp3"})
+        playlist.replace_song(Song(length=5, path="/music/song_4.mp3"))
+        playlist.swap_songs(0, 1)
+        self.assertEqual(playlist.total_seconds(), sum(int(song.length()) for song in playlist.songs))
+        self.assertEqual(playlist.total_seconds(), 20 + 5 + 7)
+
+    def test_replace_song(self):
+        new_song = Song(title="New", path="/music/song_2.mp3")
+        self.assertTrue(self.playlist.replace_song(new_song))
+        self.assertEqual(self.playlist.songs[2].title(), "New")
+        self.assertFalse(self.playlist.replace_song(Song(path="/music/other.mp3")))
+
+    def test_swap_songs(self):
+        self.assertTrue(self.playlist.swap_songs(0, 4))
+        self.assertEqual(self.playlist.songs[0], self.songs[4])
+        self.assertIndexed()
+
+
+class TestPlaylistLoadMeta(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).resolve()
+        self.playlist = Playlist("Meta")
+        self.playlist.add_songs([Song(length=length, path="/music/song_{}.mp3".format(length))
+                                 for length in (100, 200, 30)])
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_load_meta_header(self):
+        self.playlist.save(self.path)
+        self.assertEqual(Playlist.load_meta(self.path.joinpath("Meta.json")),
+                         {"name": "Meta", "path": self.path.joinpath("Meta.json"), "songs": 3, "length": 330})
+
+    def test_load_meta_without_counts(self):
+        self.playlist.save(self.path)
+        file = self.path.joinpath("Meta.json")
+        data = json.loads(file.read_text())
+        del data["meta"]["Songs"]
+        del data["meta"]["Length"]
+        file.write_text(json.dumps(data))
+        self.assertEqual(Playlist.load_meta(file)["songs"], 3)
+        self.assertEqual(Playlist.load_meta(file)["length"], 330)
+
+    def test_load_meta_invalid(self):
+        self.path.joinpath("other.json").write_text(json.dumps({"meta": {}, "songs": []}))
+        self.path.joinpath("broken.json").write_text("{")
+        self.assertIsNone(Playlist.load_meta(self.path.joinpath("other.json")))
+        self.assertIsNone(Playlist.load_meta(self.path.joinpath("broken.json")))
+        self.assertIsNone(Playlist.load_meta(self.path.joinpath("missing.json")))
+
+
+class TestPlaylistJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).resolve()
+        self.file = self.path.joinpath("Journal.json")
+        self.journal = self.path.joinpath("Journal.journal")
+        self.playlist = Playlist("Journal")
+        self.playlist.add_songs([Song(length=10, path="/music/song_{}.mp3".format(index)) for index in range(4)])
+        self.playlist.save(self.path)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _paths(self, playlist):
+        return [song.path() for song in playlist.songs]
+
+    def test_save_appends_changes(self):
+        json_content = self.file.read_text()
+        self.playlist.add_song(Song(length=10, path="/music/new.mp3"))
+        self.playlist.swap_songs(0, 4)
+        self.playlist.remove_song(2)
+        self.playlist.save(self.path)
+
+        self.assertEqual(self.file.read_text(), json_content)
+        self.assertEqual(len(self.journal.read_text().splitlines()), 3)
+        self.assertEqual(self._paths(Playlist.load(self.file)), self._paths(self.playlist))
+        self.assertEqual(Playlist.load_meta(self.file)["songs"], 4)
+        self.assertEqual(Playlist.load_meta(self.file)["length"], 40)
+
+    def test_save_after_load(self):
+        loaded = Playlist.load(self.file)
+        loaded.remove_songs({"/music/song_0.mp3"})
+        loaded.save(self.path)
+        self.assertEqual(self._paths(Playlist.load(self.file)), self._paths(loaded))
+
+    def test_save_compacts(self):
+        self.playlist.compact_after = 2
+        self.playlist.remove_song(0)
+        self.playlist.save(self.path)
+        self.assertTrue(self.journal.exists())
+        self.playlist.remove_song(0)
+        self.playlist.save(self.path)
+        self.assertFalse(self.journal.exists())
+        self.assertEqual(self._paths(Playlist.load(self.file)), self._paths(self.playlist))
+
+    def test_outdated_journal_ignored(self):
+        self.playlist.remove_song(0)
+        self.playlist.save(self.path)
+        outdated = self.journal.read_text()
+        self.playlist.save(self.path, compact=True)
+        # a crash after the .json file was replaced, before the journal was removed:
+        self.journal.write_text(outdated)
+        self.assertEqual(self._paths(Playlist.load(self.file)), self._paths(self.playlist))
+        self.assertEqual(Playlist.load_meta(self.file)["songs"], 3)
+
+    def test_torn_write_ignored(self):
+        self.playlist.remove_song(0)
+        self.playlist.save(self.path)
+        with open(self.journal, 'a') as journal_file:
+            journal_file.write('{"op": "remove", "ind')
+        loaded = Playlist.load(self.file)
+        self.assertEqual(self._paths(loaded), self._paths(self.playlist))
+
+        loaded.remove_song(0)
+        loaded.save(self.path)
+        self.assertEqual(self._paths(Playlist.load(self.file)), self._paths(loaded))
+
+
+class TestPlaylistLoadTrusted(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).resolve()
+        self.existing = self.path.joinpath("existing.mp3")
+        self.existing.write_bytes(b"")
+        self.playlist = Playlist("Trusted")
+        self.playlist.add_songs([Song(title="Existing", artist="Artist", length=10, path=self.existing),
+                                 Song(title="Missing", length=20, path=self.path.joinpath("missing.mp3"))])
+        self.file = self.playlist.save(self.path)
+        self.playlist.add_song(Song(title="Journal", length=30, path=self.path.joinpath("journal.mp3")))
+        self.playlist.save(self.path)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_load_trusted(self):
+        trusted = Playlist.load(self.file, trusted=True)
+        checked = Playlist.load(self.file)
+        for trusted_song, song in zip(trusted.songs, checked.songs):
+            self.assertEqual((trusted_song.title(), trusted_song.artist(), trusted_song.album(),
+                              trusted_song.length(), trusted_song.path()),
+                             (song.title(), song.artist(), song.album(), song.length(), song.path()))
+        self.assertEqual(len(trusted), 3)
+
+    def test_check_songs(self):
+        trusted = Playlist.load(self.file, trusted=True)
+        self.assertEqual(trusted.check_songs(), [str(self.path.joinpath("missing.mp3")),
+                                                 str(self.path.joinpath("journal.mp3"))])
+
+
+class TestPlaylistBinary(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).resolve()
+        self.playlist = Playlist("Binary")
+        self.playlist.add_songs([Song(title="Song {}".format(index), artist="Artist {}".format(index % 2),
+                                      album="Album", length=index * 10,
+                                      path="/music/album/s\u00f6ng_{}.mp3".format(index)) for index in range(5)])
+        self.file = self.playlist.save(self.path, binary=True)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _records(self, playlist):
+        return [(song.title(), song.artist(), song.album(), song.length(), song.path()) for song in playlist.songs]
+
+    def test_save_binary(self):
+        self.assertEqual(self.file, self.path.joinpath("Binary.mmlp"))
+        self.assertFalse(self.path.joinpath("Binary.json").exists())
+
+    def test_load_binary(self):
+        for trusted in (False, True):
+            loaded = Playlist.load(self.file, trusted=trusted)
+            self.assertEqual(loaded.name(), "Binary")
+            self.assertEqual(loaded.path, self.file)
+            self.assertEqual(self._records(loaded), self._records(self.playlist))
+
+    def test_load_meta_binary(self):
+        self.assertEqual(Playlist.load_meta(self.file),
+                         {"name": "Binary", "path": self.file, "songs": 5, "length": 100})
+
+    def test_load_meta_binary_without_counts(self):
+        path = self.file.with_name("Old.mmlp")
+        PlaylistBinary.write(path, {"Is MyLibrary Playlist": "yes"}, [])
+        self.assertIsNone(Playlist.load_meta(path))
+        PlaylistBinary.write(path, {"Is MyLibrary Playlist": "yes", "Songs": "many", "Length": 0}, [])
+        self.assertIsNone(Playlist.load_meta(path))
+
+    def test_journal_binary(self):
+        self.playlist.remove_song(0)
+        content = self.file.read_bytes()
+        self.playlist.save(self.path, binary=True)
+        self.assertEqual(self.file.read_bytes(), content)
+        self.assertEqual(self._records(Playlist.load(self.file)), self._records(self.playlist))
+        self.assertEqual(Playlist.load_meta(self.file)["songs"], 4)
+
+    def test_same_as_json(self):
+        json_file = self.playlist.save(self.path)
+        self.assertEqual(self._records(Playlist.load(json_file)), self._records(Playlist.load(self.file)))
+
+    def test_load_invalid(self):
+        self.path.joinpath("broken.mmlp").write_bytes(self.file.read_bytes()[:-3])
+        self.path.joinpath("other.mmlp").write_bytes(b"not a playlist")
+        self.assertIsNone(Playlist.load(self.path.joinpath("broken.mmlp")))
+        self.assertIsNone(Playlist.load(self.path.joinpath("other.mmlp")))
+        self.assertIsNone(Playlist.load_meta(self.path.joinpath("other.mmlp")))
+
+
+class TestSongHash(unittest.TestCase):
+    def test_hash_matches_eq(self):
+        song_1 = Song(title="One", path="/music/song.mp3")
+        song_2 = Song(title="Two", path="/music/song.mp3")
+        self.assertEqual(song_1, song_2)
+        self.assertEqual(hash(song_1), hash(song_2))
+        self.assertEqual(len({song_1, song_2}), 1)
+        self.assertNotEqual(song_1, "/music/song.mp3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from bin.metrics import Metrics
+from bin.playlist import Playlist
+from bin.playlist_cache import PlaylistCache
+from bin.song import Song
+
+
+class TestPlaylistCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).resolve()
+        for name in ("One", "Two", "Three"):
+            playlist = Playlist(name)
+            playlist.add_song(Song(path="/music/{}.mp3".format(name)))
+            playlist.save(self.path)
+        self.cache = PlaylistCache(max_size=2)
+
+    def tearDown(self) -> None:
+        del self.cache
+        self.tmp_dir.cleanup()
+
+    def test_init(self):
+        self.assertRaises(TypeError, PlaylistCache, max_size="2")
+        self.assertRaises(TypeError, PlaylistCache, max_size=True)
+        self.assertRaises(ValueError, PlaylistCache, max_size=0)
+
+    def test_get_hit(self):
+        playlist = self.cache.get(self.path.joinpath("One"))
+        self.assertIs(self.cache.get(self.path.joinpath("One.json")), playlist)
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "size": 1, "max_size": 2})
+
+    def test_load(self):
+        with mock.patch("bin.playlist_cache.metrics", Metrics()) as metrics:
+            playlist, loaded = self.cache.load(self.path.joinpath("One"))
+            self.assertTrue(loaded)
+            self.assertEqual(self.cache.load(self.path.joinpath("One")), (playlist, False))
+            self.cache.load(self.path.joinpath("Two"))
+            text = metrics.render()
+        self.assertIn("mml_playlist_cache_hits_total 1\n", text)
+        self.assertIn("mml_playlist_cache_misses_total 2\n", text)
+
+    def test_get_lru(self):
+        self.cache.get(self.path.joinpath("One"))
+        self.cache.get(self.path.joinpath("Two"))
+        self.cache.get(self.path.joinpath("One"))
+        self.cache.get(self.path.joinpath("Three"))
+        self.assertEqual(len(self.cache), 2)
+        self.cache.get(self.path.joinpath("One"))
+        self.cache.get(self.path.joinpath("Two"))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 4))
+
+    def test_get_modified(self):
+        playlist = self.cache.get(self.path.joinpath("One"))
+        file = self.path.joinpath("One.json")
+        stat = file.stat()
+        os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        self.assertIsNot(self.cache.get(file), playlist)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_put(self):
+        playlist = self.cache.get(self.path.joinpath("One"))
+        playlist.add_song(Song(path="/music/new.mp3"))
+        saved_path = playlist.save(self.path)
+        self.cache.put(playlist, saved_path)
+        self.assertIs(self.cache.get(saved_path), playlist)
+        self.assertRaises(TypeError, self.cache.put, "One", saved_path)
+
+    def test_invalidate(self):
+        self.cache.get(self.path.joinpath("One"))
+        self.assertTrue(self.cache.invalidate(self.path.joinpath("One")))
+        self.assertFalse(self.cache.invalidate(self.path.joinpath("One")))
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import threading
+import time
+import unittest
+from bin.rw_lock import RWLock
+
+
+class TestRWLock(unittest.TestCase):
+    def setUp(self) -> None:
+        self.lock = RWLock()
+
+    def test_readers_in_parallel(self):
+        both_reading = threading.Barrier(2, timeout=2)
+
+        def reader():
+            with self.lock.read():
+                both_reading.wait()
+
+        threads = [threading.Thread(target=reader) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(both_reading.broken)
+
+    def test_writer_excludes_readers(self):
+        events = []
+        writing = threading.Event()
+
+        def writer():
+            with self.lock.write():
+                writing.set()
+                time.sleep(0.1)
+                events.append("write done")
+
+        def reader():
+            writing.wait()
+            with self.lock.read():
+                events.append("read")
+
+        threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(events, ["write done", "read"])
+
+    def test_waiting_writer_preferred(self):
+        events = []
+        reading = threading.Event()
+        release_reader = threading.Event()
+
+        def first_reader():
+            with self.lock.read():
+                reading.set()
+                release_reader.wait()
+
+        def writer():
+            with self.lock.write():
+                events.append("write")
+
+        def second_reader():
+            with self.lock.read():
+                events.append("read")
+
+        threads = [threading.Thread(target=first_reader)]
+        threads[0].start()
+        reading.wait()
+        threads.append(threading.Thread(target=writer))
+        threads[1].start()
+        # the writer is waiting for the first reader:
+        while not self.lock._writers_waiting:
+            time.sleep(0.01)
+        threads.append(threading.Thread(target=second_reader))
+        threads[2].start()
+        time.sleep(0.05)
+        release_reader.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(events, ["write", "read"])
+
+    def test_writer_reentrant(self):
+        with self.lock.write():
+            with self.lock.write():
+                with self.lock.read():
+                    pass
+        # released -> can be taken by another thread:
+        taken = []
+
+        def writer():
+            with self.lock.write():
+                taken.append(True)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        thread.join(timeout=1)
+        self.assertEqual(taken, [True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from bin.search_index import SearchIndex
+from bin.song import Song
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.yellow = Song(title="Yellow", artist="Coldplay", album="Parachutes", path="/music/yellow.mp3")
+        self.clocks = Song(title="Clocks", artist="Coldplay", album="A Rush of Blood", path="/music/clocks.mp3")
+        self.creep = Song(title="Creep", artist="Radiohead", album="Pablo Honey", path="/music/creep.mp3")
+        self.index = SearchIndex([self.yellow, self.clocks, self.creep])
+
+    def test_search_word(self):
+        self.assertEqual(self.index.search("coldplay"), [self.clocks, self.yellow])
+        self.assertEqual(self.index.search("RADIOHEAD"), [self.creep])
+
+    def test_search_prefix(self):
+        self.assertEqual(self.index.search("cl"), [self.clocks])
+        self.assertEqual(self.index.search("c"), [self.clocks, self.creep, self.yellow])
+
+    def test_search_all_terms(self):
+        self.assertEqual(self.index.search("cold para"), [self.yellow])
+        self.assertEqual(self.index.search("coldplay honey"), [])
+
+    def test_search_limit(self):
+        self.assertEqual(self.index.search("c", limit=2), [self.clocks, self.creep])
+
+    def test_search_sorted(self):
+        # 'clock' and 'clocks' start with 'cl' -> the Song is found once:
+        clock = Song(title="Clock Clocks", artist="Clutch", path="/music/clock.mp3")
+        self.index.add_songs([clock, Song(title="Zombie", artist="Cranberries", path="/music/zombie.mp3")])
+        self.assertEqual(self.index.search("cl"), [clock, self.clocks])
+        self.assertEqual([song.title() for song in self.index.search("c", limit=4)],
+                         ["Clock Clocks", "Clocks", "Creep", "Yellow"])
+        self.assertEqual(self.index.search("c", limit=0), [])
+
+    def test_search_empty(self):
+        self.assertEqual(self.index.search(""), [])
+        self.assertEqual(self.index.search("  ,. "), [])
+        self.assertEqual(self.index.search("xyz"), [])
+
+    def test_remove_songs(self):
+        self.index.remove_songs(["/music/yellow.mp3", "/music/missing.mp3"])
+        self.assertEqual(self.index.search("coldplay"), [self.clocks])
+        self.assertEqual(self.index.search("parachutes"), [])
+        self.assertEqual(len(self.index), 2)
+
+    def test_replace_song(self):
+        self.index.add_song(Song(title="Yellow (Live)", artist="Coldplay", album="Live 2003",
+                                 path="/music/yellow.mp3"))
+        self.assertEqual(self.index.search("parachutes"), [])
+        self.assertEqual([song.title() for song in self.index.search("live")], ["Yellow (Live)"])
+        self.assertEqual(len(self.index), 3)
+
+    def test_replace_song_same_batch(self):
+        index = SearchIndex([Song(title="Intro Demo", path="/music/intro.mp3"),
+                             Song(title="Outro", path="/music/outro.mp3"),
+                             Song(title="Intro", path="/music/intro.mp3")])
+        self.assertEqual([song.title() for song in index.search("intro")], ["Intro"])
+        self.assertEqual(index.search("demo"), [])
+        self.assertEqual([song.title() for song in index.search("outro")], ["Outro"])
+
+    def test_add_wrong_type(self):
+        with self.assertRaises(TypeError):
+            self.index.add_song("/music/yellow.mp3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,13 @@
+import struct
+import tempfile
 import unittest
+from pathlib import Path
+from mutagen.easyid3 import EasyID3
+from mutagen.mp3 import MPEGInfo
 from bin.song import Song
+from bin.decoders import decoders
+from bin._mpeg_header import SeekIndex, read_length
+from _audio_files import FRAME, FRAME_HEADER, make_mp3
 
 
 class TestSongAlbum(unittest.TestCase):
@@ -142,6 +150,112 @@ class TestSongTitle(unittest.TestCase):
         self.assertTrue(self.song.set_title("None"))
 
 
+class TestSongFromRecord(unittest.TestCase):
+    def test_from_record(self):
+        song = Song.from_record("Title", "Artist", "Album", "75", "/music/song.mp3")
+        self.assertEqual((song.title(), song.artist(), song.album(), song.length(), song.path()),
+                         ("Title", "Artist", "Album", "75", "/music/song.mp3"))
+        self.assertEqual(song.length_pretty(minutes=True, seconds=True), "01:15")
+        self.assertEqual(song, Song(path="/music/song.mp3"))
+
+
+class TestSongLoadLength(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).resolve()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _write(self, name, audio):
+        return make_mp3(self.path.joinpath(name), title=name, audio=audio)
+
+    def _lengths(self, path):
+        # the length read from the headers and the one from mutagen:
+        tags = EasyID3(path)
+        with open(path, 'rb') as audio_file:
+            return read_length(audio_file, tags.size), MPEGInfo(audio_file, tags.size).length
+
+    def test_cbr(self):
+        path = self._write("cbr.mp3", FRAME * 400)
+        length, expected = self._lengths(path)
+        self.assertAlmostEqual(length, expected)
+        self.assertEqual(Song.load(path).length(), "10")
+
+    def test_xing_lame(self):
+        # 1000 frames, delay 576 + padding 1000 samples:
+        xing = (FRAME_HEADER + bytes(32) + b"Xing" + struct.pack(">III", 0x3, 1000, 1000 * 417) +
+                b"LAME3.99r" + bytes(12) + bytes.fromhex("2403e8"))
+        path = self._write("xing.mp3", xing + bytes(417 - len(xing)) + FRAME * 10)
+        length, expected = self._lengths(path)
+        self.assertAlmostEqual(length, (1000 * 1152 - 576 - 1000) / 44100)
+        self.assertAlmostEqual(length, expected)
+        self.assertEqual(Song.load(path).length(), "26")
+
+    def test_vbri(self):
+        vbri = FRAME_HEADER + bytes(32) + b"VBRI" + struct.pack(">HHHIIHHHH", 1, 0, 75, 500 * 417, 500, 0, 1, 2, 0)
+        path = self._write("vbri.mp3", vbri + bytes(417 - len(vbri)) + FRAME * 10)
+        length, expected = self._lengths(path)
+        self.assertAlmostEqual(length, 500 * 1152 / 44100)
+        self.assertAlmostEqual(length, expected)
+
+    def test_fallback(self):
+        # no frame in the bounded read -> the stream is parsed by mutagen:
+        path = self._write("junk.mp3", bytes(10000) + FRAME * 400)
+        length, expected = self._lengths(path)
+        self.assertIsNone(length)
+        self.assertEqual(Song.load(path).length(), str(int(expected)))
+
+    def test_no_frames(self):
+        path = self._write("empty.mp3", bytes(2000))
+        with open(path, 'rb') as audio_file:
+            self.assertIsNone(read_length(audio_file, EasyID3(path).size))
+        self.assertIsNone(Song.load(path))
+
+
+class TestSeekIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).resolve()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _index(self, name, audio):
+        path = make_mp3(self.path.joinpath(name), title=name, audio=audio)
+        return decoders["mp3"].seek_index(str(path)), EasyID3(path).size
+
+    def test_cbr(self):
+        # 1000 frames + an ID3v1 tag at the end:
+        index, start = self._index("cbr.mp3", FRAME * 1000 + b"TAG" + bytes(125))
+        self.assertEqual(len(index.offsets), 1000 // SeekIndex.INDEX_FRAMES + 1)
+        self.assertEqual(index.offsets[1], start + SeekIndex.INDEX_FRAMES * len(FRAME))
+
+        step_seconds = SeekIndex.INDEX_FRAMES * 1152 / 44100
+        self.assertEqual(index.locate(0), (start, 0.0))
+        self.assertEqual(index.locate(step_seconds * 10.5), (index.offsets[10], step_seconds * 10))
+        # the last indexed frame for anything after it:
+        self.assertEqual(index.locate(10 ** 6)[0], index.offsets[-1])
+
+    def test_xing(self):
+        # the Xing/Info frame has no audio -> the first indexed frame is after it:
+        xing = FRAME_HEADER + bytes(32) + b"Xing" + struct.pack(">III", 0x3, 100, 100 * 417)
+        index, start = self._index("xing.mp3", xing + bytes(417 - len(xing)) + FRAME * 100)
+        self.assertEqual(index.offsets[0], start + len(FRAME))
+        self.assertEqual(len(index.offsets), 100 // SeekIndex.INDEX_FRAMES + 1)
+
+    def test_bytes(self):
+        index, start = self._index("cbr.mp3", FRAME * 100)
+        loaded = SeekIndex.from_bytes(index.to_bytes())
+        self.assertEqual((loaded.sample_rate, loaded.samples, loaded.step, loaded.offsets),
+                         (index.sample_rate, index.samples, index.step, index.offsets))
+        self.assertIsNone(SeekIndex.from_bytes(b"abc"))
+
+    def test_no_frames(self):
+        index, start = self._index("empty.mp3", bytes(2000))
+        self.assertIsNone(index)
+
+
 if __name__ == "__main__":
     unittest.main()
 
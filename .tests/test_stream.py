@@ -0,0 +1,139 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from bin.decoders import BYTES_PER_SECOND, PCM_FORMAT
+from web.backends import _stream
+from web.backends._stream import FRAME_SIZE, StreamPlayer
+
+# the delay of opening an output stream:
+LATENCY = 0.02
+
+
+class FakeSource:
+    pcm_format = PCM_FORMAT
+    zero_copy = False
+
+    def __init__(self, size):
+        self._pcm = bytes(size)
+
+    def read(self, size):
+        chunk, self._pcm = self._pcm[:size], self._pcm[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+class FakePlayObject:
+    def __init__(self, sink, chunk, duration):
+        self.sink = sink
+        self.chunk = chunk
+        self.called = time.monotonic()
+        self.ends = self.called + LATENCY + duration
+        self.stopped = False
+
+    def is_playing(self):
+        return not self.stopped and time.monotonic() < self.ends
+
+    def stop(self):
+        self.stopped = True
+
+    def wait_done(self):
+        self.sink.waited.append(self)
+        while self.is_playing():
+            time.sleep(0.001)
+
+
+class FakeSink:
+    def __init__(self):
+        self.play_objects = []
+        self.waited = []
+        self._lock = threading.Lock()
+
+    def __call__(self, chunk, channels, sample_width, sample_rate):
+        play_obj = FakePlayObject(self, bytes(chunk), len(chunk) / (channels * sample_width * sample_rate))
+        with self._lock:
+            self.play_objects.append(play_obj)
+        return play_obj
+
+    def chunks(self):
+        return [play_obj.chunk for play_obj in self.play_objects]
+
+
+class TestStreamPlayer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.opened = []
+        patcher = mock.patch.object(_stream, "open_pcm", side_effect=self._open_pcm)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _open_pcm(self, path, seconds=0, index=None):
+        self.opened.append((path, seconds))
+        return FakeSource(FRAME_SIZE * 10)
+
+    def test_continues_after_head(self):
+        sink = FakeSink()
+        # 0.1 seconds per chunk:
+        player = StreamPlayer("/music/song.mp3", sink=sink, chunk_size=BYTES_PER_SECOND // 10,
+                              head=(bytes(BYTES_PER_SECOND), False))
+        player.start()
+        player.wait_done()
+        # the decoder continues after the 1 second of the head:
+        self.assertEqual(self.opened, [("/music/song.mp3", 1)])
+        self.assertEqual(sum(map(len, sink.chunks())), BYTES_PER_SECOND + FRAME_SIZE * 10)
+
+    def test_start(self):
+        player = StreamPlayer("/music/song.mp3", sink=FakeSink(), head=(bytes(BYTES_PER_SECOND), False), start=2.5)
+        player.start()
+        player.wait_done()
+        # the head is not played:
+        self.assertEqual(self.opened, [("/music/song.mp3", 2.5)])
+
+    def test_no_gaps(self):
+        chunk_size = BYTES_PER_SECOND // 10
+        sink = FakeSink()
+        player = StreamPlayer("/music/song.mp3", sink=sink, chunk_size=chunk_size,
+                              head=(bytes(5 * chunk_size), True))
+        player.start()
+        player.wait_done()
+
+        play_objects = sink.play_objects
+        self.assertEqual(len(play_objects), 5)
+        for previous, play_obj in zip(play_objects, play_objects[1:]):
+            # each chunk is passed to the sink while the previous one is still playing:
+            self.assertLess(play_obj.called, previous.ends)
+            # ... at the pace they are played -> never more than 2 at once:
+            self.assertGreater(play_obj.called, previous.called + 0.09)
+        # the chunks are not waited for, only the end of the last one:
+        self.assertEqual(sink.waited, [play_objects[-1]])
+        self.assertFalse(play_objects[-1].is_playing())
+
+    def test_stop(self):
+        sink = FakeSink()
+        player = StreamPlayer("/music/song.mp3", sink=sink, chunk_size=BYTES_PER_SECOND // 10,
+                              head=(bytes(BYTES_PER_SECOND), True))
+        player.start()
+        while len(sink.play_objects) < 2:
+            time.sleep(0.01)
+        player.stop()
+        self.assertFalse(player.is_playing())
+        self.assertLess(len(sink.play_objects), 10)
+        self.assertTrue(all(play_obj.stopped for play_obj in sink.play_objects[-2:]))
+
+    def test_track_change(self):
+        changes = []
+        tracks = [("/music/next.mp3", (bytes(FRAME_SIZE * 10), True))]
+        sink = FakeSink()
+        player = StreamPlayer("/music/song.mp3", sink=sink, head=(bytes(FRAME_SIZE * 10), True),
+                              next_track=lambda path: tracks.pop() if tracks else None,
+                              on_track_change=lambda path: changes.append((path, len(sink.play_objects))))
+        player.start()
+        player.wait_done()
+        # called when the first chunk of the next audio file is played:
+        self.assertEqual(changes, [("/music/next.mp3", 2)])
+        self.assertEqual(player.path, "/music/next.mp3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from bin.tag_cache import TagCache
+
+
+class TestTagCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = TagCache(self.tmp_dir.name)
+
+    def tearDown(self) -> None:
+        del self.cache
+        self.tmp_dir.cleanup()
+
+    def test_init_type(self):
+        self.assertRaises(TypeError, TagCache, path=None)
+        self.assertRaises(TypeError, TagCache, path=3)
+
+    def test_records_empty(self):
+        self.assertEqual(self.cache.records(), {})
+
+    def test_update_and_records(self):
+        self.cache.update([("/a.mp3", (1, 10, "Title", "Artist", "Album", "3")),
+                           ("/b.mp3", (2, 20, None, None, None, None))])
+        self.assertEqual(self.cache.records(), {"/a.mp3": (1, 10, "Title", "Artist", "Album", "3"),
+                                                "/b.mp3": (2, 20, None, None, None, None)})
+
+    def test_records_paths(self):
+        self.cache.update([("/{}.mp3".format(index), (index, 10, "Title", "Artist", "Album", "3"))
+                           for index in range(1200)])
+        records = self.cache.records(["/5.mp3", "/1100.mp3", "/not_cached.mp3"])
+        self.assertEqual(sorted(records), ["/1100.mp3", "/5.mp3"])
+        self.assertEqual(len(self.cache.records(["/{}.mp3".format(index) for index in range(1200)])), 1200)
+
+    def test_update_replaces(self):
+        self.cache.update([("/a.mp3", (1, 10, "Title", "Artist", "Album", "3"))])
+        self.cache.update([("/a.mp3", (5, 50, "New", "Artist", "Album", "4"))])
+        self.assertEqual(self.cache.records(), {"/a.mp3": (5, 50, "New", "Artist", "Album", "4")})
+
+    def test_records_persist(self):
+        self.cache.update([("/a.mp3", (1, 10, "Title", "Artist", "Album", "3"))])
+        self.assertEqual(TagCache(self.tmp_dir.name).records(), self.cache.records())
+
+    def test_evict(self):
+        self.cache.update([("/a.mp3", (1, 10, "Title", "Artist", "Album", "3")),
+                           ("/b.mp3", (2, 20, "Title", "Artist", "Album", "3"))])
+        self.cache.evict(["/a.mp3", "/not_cached.mp3"])
+        self.assertEqual(list(self.cache.records()), ["/b.mp3"])
+
+    def test_write_errors(self):
+        with mock.patch.object(TagCache, "_connect", side_effect=sqlite3.OperationalError("database is locked")):
+            with self.assertLogs(level="ERROR") as logs:
+                self.cache.update([("/a.mp3", (1, 10, "Title", "Artist", "Album", "3"))])
+                self.cache.update_hashes([("/a.mp3", (1, 10, "partial", None))])
+                self.cache.update_seek_index("/a.mp3", 1, 10, b"index")
+                self.cache.replace_dirs("/music", {"/music": 1})
+                self.cache.evict(["/a.mp3"])
+        self.assertEqual(len(logs.records), 5)
+        self.assertEqual(self.cache.records(), {})
+
+    def test_dirs(self):
+        self.cache.replace_dirs("/music", {"/music": 1, "/music/Artist": 2})
+        self.cache.replace_dirs("/other", {"/other": 3})
+        self.assertEqual(self.cache.dirs("/music"), {"/music": 1, "/music/Artist": 2})
+
+        self.cache.replace_dirs("/music", {"/music": 4})
+        self.assertEqual(self.cache.dirs("/music"), {"/music": 4})
+        self.assertEqual(self.cache.dirs("/other"), {"/other": 3})
+
+    def test_hashes(self):
+        self.cache.update_hashes([("/a.mp3", (1, 10, "partial", None))])
+        self.assertEqual(self.cache.hashes(), {"/a.mp3": (1, 10, "partial", None)})
+        self.cache.evict(["/a.mp3"])
+        self.assertEqual(self.cache.hashes(), {})
+
+    def test_seek_index(self):
+        self.assertIsNone(self.cache.seek_index("/a.mp3"))
+        self.cache.update_seek_index("/a.mp3", 1, 10, b"index")
+        self.assertEqual(self.cache.seek_index("/a.mp3"), (1, 10, b"index"))
+        self.cache.evict(["/a.mp3"])
+        self.assertIsNone(self.cache.seek_index("/a.mp3"))
+
+
+if __name__ == "__main__":
+    unittest.main()
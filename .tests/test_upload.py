@@ -0,0 +1,78 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from werkzeug.datastructures import FileStorage
+from bin.content_hash import ContentIndex
+from web.backends._upload import UploadQueue
+from _audio_files import make_mp3
+
+
+def mp3_bytes(path, title):
+    data = make_mp3(path, title).read_bytes()
+    path.unlink()
+    return data
+
+
+class TestUploadQueue(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).resolve()
+        self.songs = []
+        self.uploads = UploadQueue(self.path, self.songs.append)
+
+    def tearDown(self) -> None:
+        self.uploads.shutdown()
+        self.tmp_dir.cleanup()
+
+    def test_submit(self):
+        files = [FileStorage(io.BytesIO(mp3_bytes(self.path.joinpath("tmp.mp3"), "Title")), filename="good.mp3"),
+                 FileStorage(io.BytesIO(b"not an mp3"), filename="../bad.mp3")]
+        job_id = self.uploads.submit(files)
+        self.uploads.shutdown()
+
+        self.assertEqual(self.uploads.status(job_id), {"files": {"good.mp3": "added", "bad.mp3": "failed"},
+                                                       "done": True})
+        self.assertEqual([song.title() for song in self.songs], ["Title"])
+        self.assertEqual(self.songs[0].path(), str(self.path.joinpath("good.mp3")))
+        self.assertEqual(sorted(path.name for path in self.path.iterdir()), ["good.mp3"])
+
+    def test_same_name(self):
+        self.path.joinpath("good.mp3").write_bytes(b"an existing file")
+        job_id = self.uploads.submit([FileStorage(io.BytesIO(mp3_bytes(self.path.joinpath("tmp.mp3"), "Title")),
+                                                  filename="good.mp3")])
+        self.uploads.shutdown()
+
+        self.assertEqual(self.uploads.status(job_id)["files"], {"good.mp3": "added"})
+        self.assertEqual(self.songs[0].path(), str(self.path.joinpath("good (1).mp3")))
+        self.assertEqual(self.path.joinpath("good.mp3").read_bytes(), b"an existing file")
+
+    def test_duplicate(self):
+        data = mp3_bytes(self.path.joinpath("tmp.mp3"), "Title")
+        self.path.joinpath("existing.mp3").write_bytes(data)
+        index = ContentIndex()
+        stat = self.path.joinpath("existing.mp3").stat()
+        index.add(self.path.joinpath("existing.mp3"), stat.st_mtime_ns, stat.st_size)
+
+        uploads = UploadQueue(self.path, self.songs.append, index=index)
+        job_id = uploads.submit([FileStorage(io.BytesIO(data), filename="copy.mp3"),
+                                 FileStorage(io.BytesIO(data + b"\0"), filename="other.mp3")])
+        uploads.shutdown()
+
+        self.assertEqual(uploads.status(job_id), {"files": {"copy.mp3": "duplicate", "other.mp3": "added"},
+                                                  "done": True})
+        self.assertEqual(sorted(path.name for path in self.path.iterdir()), ["existing.mp3", "other.mp3"])
+
+    def test_status_unknown(self):
+        self.assertIsNone(self.uploads.status("missing"))
+
+    def test_max_jobs(self):
+        uploads = UploadQueue(self.path, self.songs.append, max_jobs=2)
+        job_ids = [uploads.submit([]) for _ in range(3)]
+        self.assertIsNone(uploads.status(job_ids[0]))
+        self.assertEqual(uploads.status(job_ids[2]), {"files": {}, "done": True})
+        uploads.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
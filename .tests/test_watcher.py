@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from bin.watcher import Watcher
+
+
+class TestWatcher(unittest.TestCase):
+    use_inotify = True
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).resolve()
+        self.path.joinpath("old.mp3").write_bytes(b"old")
+        self.path.joinpath("keep.mp3").write_bytes(b"keep")
+        self.path.joinpath("Artist", "Album").mkdir(parents=True)
+        self.path.joinpath("Artist", "Album", "nested.mp3").write_bytes(b"nested")
+        self.changes = []
+        self.changed = threading.Event()
+        self.watcher = Watcher(self.path, self._callback, interval=0.05, use_inotify=self.use_inotify).start()
+
+    def tearDown(self) -> None:
+        self.watcher.stop()
+        self.tmp_dir.cleanup()
+
+    def _callback(self, added, removed, modified):
+        self.changes.append((added, removed, modified))
+        self.changed.set()
+
+    def _merged_changes(self):
+        added, removed, modified = set(), set(), set()
+        for change in list(self.changes):
+            added |= change[0]
+            removed |= change[1]
+            modified |= change[2]
+        return added, removed, modified
+
+    def _wait_changes(self, files=1):
+        # the changes could be reported in more than one batch:
+        deadline = time.monotonic() + 5
+        while sum(map(len, self._merged_changes())) < files and time.monotonic() < deadline:
+            self.changed.wait(timeout=0.05)
+            self.changed.clear()
+        return self._merged_changes()
+
+    def test_added(self):
+        self.path.joinpath("new.mp3").write_bytes(b"new")
+        self.path.joinpath("new.txt").write_bytes(b"not watched")
+        self.assertEqual(self._wait_changes(), ({str(self.path.joinpath("new.mp3"))}, set(), set()))
+
+    def test_removed(self):
+        os.unlink(self.path.joinpath("old.mp3"))
+        self.assertEqual(self._wait_changes(), (set(), {str(self.path.joinpath("old.mp3"))}, set()))
+
+    def test_modified(self):
+        self.path.joinpath("old.mp3").write_bytes(b"modified")
+        self.assertEqual(self._wait_changes(), (set(), set(), {str(self.path.joinpath("old.mp3"))}))
+
+    def test_nested(self):
+        nested = self.path.joinpath("Artist", "Album")
+        nested.joinpath("new.mp3").write_bytes(b"new")
+        nested.joinpath("nested.mp3").write_bytes(b"modified")
+        self.assertEqual(self._wait_changes(files=2), ({str(nested.joinpath("new.mp3"))}, set(),
+                                                       {str(nested.joinpath("nested.mp3"))}))
+
+    def test_nested_removed(self):
+        shutil.rmtree(self.path.joinpath("Artist"))
+        self.assertEqual(self._wait_changes(),
+                         (set(), {str(self.path.joinpath("Artist", "Album", "nested.mp3"))}, set()))
+
+    def test_new_dir(self):
+        new_dir = self.path.joinpath("Other", "Album")
+        new_dir.mkdir(parents=True)
+        new_dir.joinpath("first.mp3").write_bytes(b"first")
+        self.assertEqual(self._wait_changes(), ({str(new_dir.joinpath("first.mp3"))}, set(), set()))
+
+        # the new directory is watched too:
+        self.changes.clear()
+        new_dir.joinpath("second.mp3").write_bytes(b"second")
+        self.assertEqual(self._wait_changes(), ({str(new_dir.joinpath("second.mp3"))}, set(), set()))
+
+
+class TestWatcherPolling(TestWatcher):
+    use_inotify = False
+
+    def test_mode(self):
+        self.assertEqual(self.watcher.mode, "polling")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,11 +4,32 @@
     Contains the core modules used for the application
 
     Exports Classes:
+        ContentIndex from content_hash.py
         Crawler  from crawler.py
+        Decoder  from decoders.py
+        Metrics  from metrics.py
         Playlist from playlist.py
+        PlaylistCache from playlist_cache.py
+        RWLock   from rw_lock.py
+        SearchIndex from search_index.py
         Song     from song.py
+        TagCache from tag_cache.py
+        Watcher  from watcher.py
+
+    Exports:
+        find_decoder       from decoders.py
+        metrics            from metrics.py (the Metrics instance used by the whole App)
+        supported_suffixes from decoders.py
 """
 
+from bin.content_hash import ContentIndex
 from bin.crawler import Crawler
+from bin.decoders import Decoder, find_decoder, supported_suffixes
+from bin.metrics import Metrics, metrics
 from bin.playlist import Playlist
+from bin.playlist_cache import PlaylistCache
+from bin.rw_lock import RWLock
+from bin.search_index import SearchIndex
 from bin.song import Song
+from bin.tag_cache import TagCache
+from bin.watcher import Watcher
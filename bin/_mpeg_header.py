@@ -0,0 +1,352 @@
+import os
+import re
+import struct
+from array import array
+
+# how much of the file (after the ID3v2 tag) is read, looking for the first frame:
+READ_SIZE = 8192
+
+# consecutive frames, which must be found, when there is no Xing/VBRI header:
+CHECK_FRAMES = 3
+
+# (version, layer) -> kbps for every bitrate index (0 and 15 are invalid):
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_BITRATES[(2, 3)] = _BITRATES[(2, 2)]
+
+# version -> Hz for every sample rate index (3 is invalid):
+_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+
+_VERSIONS = (2.5, None, 2, 1)
+
+_header = struct.Struct(">I")
+
+_XING_FRAMES = 0x1
+_XING_BYTES = 0x2
+_XING_TOC = 0x4
+_XING_VBR_SCALE = 0x8
+
+# e.g. "LAME3.99r" or "L3.99r" -> (3, 99):
+_lame_version = re.compile(rb"(\d)\.?(\d+)")
+
+
+class FrameHeader:
+    """
+        A parsed MPEG audio frame header (for read_length())
+    """
+
+    __slots__ = ("version", "layer", "sample_rate", "bitrate", "mono", "samples", "size")
+
+    def __init__(self, data, offset):
+        """
+        :raise ValueError if there is no valid frame header at 'offset'
+        """
+
+        if offset + 4 > len(data):
+            raise ValueError("Truncated frame header")
+        header, = struct.unpack_from(">I", data, offset)
+        if header >> 21 != 0x7ff:
+            raise ValueError("Invalid frame sync")
+
+        self.version = _VERSIONS[(header >> 19) & 0x3]
+        self.layer = 4 - ((header >> 17) & 0x3)
+        bitrate_index = (header >> 12) & 0xf
+        sample_rate_index = (header >> 10) & 0x3
+        if self.version is None or self.layer == 4 or bitrate_index in (0, 0xf) or sample_rate_index == 3:
+            raise ValueError("Invalid frame header")
+
+        padding = (header >> 9) & 0x1
+        self.mono = (header >> 6) & 0x3 == 3
+        self.bitrate = _BITRATES[(int(self.version), self.layer)][bitrate_index] * 1000
+        self.sample_rate = _SAMPLE_RATES[self.version][sample_rate_index]
+
+        if self.layer == 1:
+            self.samples = 384
+            self.size = (12 * self.bitrate // self.sample_rate + padding) * 4
+        elif self.layer == 3 and self.version != 1:
+            self.samples = 576
+            self.size = 72 * self.bitrate // self.sample_rate + padding
+        else:
+            self.samples = 1152
+            self.size = 144 * self.bitrate // self.sample_rate + padding
+
+    def same_stream(self, other):
+        """
+        :return True if 'other' can be the next frame of the same stream
+        :rtype  Bool
+        """
+
+        return (self.version, self.layer, self.sample_rate) == (other.version, other.layer, other.sample_rate)
+
+
+def read_length(file, offset=0):
+    """
+    Reads the length of an MPEG audio stream from its first frame only:
+    the Xing/Info (with the LAME encoder delay and padding) or VBRI header,
+    or, for CBR files without them, from the bitrate and the file size
+
+    A single read of READ_SIZE bytes, at 'offset' (the end of the ID3v2 tag)
+
+    :param file:       opened in binary mode
+    :param int offset:
+
+    :return the length in seconds or None, if it can't be read this way
+            (no valid frame near 'offset', inconsistent headers) -> parse the whole stream
+    :rtype  float
+    """
+
+    file.seek(offset)
+    data = file.read(READ_SIZE)
+    if data[:3] == b"ID3":
+        # one more ID3v2 tag, e.g. written by WMP:
+        return None
+    file_size = os.fstat(file.fileno()).st_size
+
+    start = data.find(b"\xff")
+    while start != -1:
+        try:
+            frame = FrameHeader(data, start)
+        except ValueError:
+            start = data.find(b"\xff", start + 1)
+            continue
+
+        if frame.layer == 3:
+            vbr_samples = _vbr_samples(data, start, frame)
+            if vbr_samples is not None:
+                if not _frames_follow(data, start, frame, 1):
+                    return None
+                return max(0, vbr_samples) / frame.sample_rate
+
+        if _frames_follow(data, start, frame, CHECK_FRAMES - 1):
+            # CBR -> every frame has the same size:
+            return 8 * (file_size - offset - start) / frame.bitrate
+        start = data.find(b"\xff", start + 1)
+    return None
+
+
+def _frames_follow(data, start, frame, count):
+    """
+    Internal use
+
+    :return True if 'count' frames of the same stream follow the frame at 'start'
+            (or the file ends after 'frame', when they are all in 'data')
+    :rtype  Bool
+    """
+
+    offset = start + frame.size
+    for _ in range(count):
+        if offset == len(data) and len(data) < READ_SIZE:
+            # the end of the file:
+            return True
+        try:
+            next_frame = FrameHeader(data, offset)
+        except ValueError:
+            return False
+        if not frame.same_stream(next_frame):
+            return False
+        offset += next_frame.size
+    return True
+
+
+def _vbr_samples(data, start, frame):
+    """
+    Internal use
+
+    :return the number of samples from the Xing/Info or VBRI header of the first
+            frame or None, if there is no such header (or without a frame count)
+    :rtype  int
+    """
+
+    if frame.version == 1:
+        xing_offset = start + (21 if frame.mono else 36)
+    else:
+        xing_offset = start + (13 if frame.mono else 21)
+
+    tag = data[xing_offset:xing_offset + 4]
+    if tag in (b"Xing", b"Info"):
+        if xing_offset + 12 > len(data):
+            return None
+        flags, = struct.unpack_from(">I", data, xing_offset + 4)
+        if not flags & _XING_FRAMES:
+            return None
+        frames, = struct.unpack_from(">I", data, xing_offset + 8)
+        lame_offset = xing_offset + 12
+        for flag, size in ((_XING_BYTES, 4), (_XING_TOC, 100), (_XING_VBR_SCALE, 4)):
+            if flags & flag:
+                lame_offset += size
+        return frames * frame.samples - _lame_delay(data, lame_offset)
+
+    vbri_offset = start + 36
+    if data[vbri_offset:vbri_offset + 4] == b"VBRI" and vbri_offset + 26 <= len(data):
+        version, frames, toc_entry_size = struct.unpack_from(">H8xI4xH", data, vbri_offset + 4)
+        if version != 1 or toc_entry_size not in (2, 4):
+            return None
+        return frames * frame.samples
+    return None
+
+
+def _lame_delay(data, offset):
+    """
+    Internal use
+
+    :return the encoder delay + padding (in samples) from the LAME tag at 'offset', 0 without one
+    :rtype  int
+    """
+
+    version = data[offset:offset + 9]
+    if not version.startswith((b"LAME", b"L3.99")) or offset + 24 > len(data):
+        return 0
+    # the extended LAME tag was added in LAME 3.90:
+    match = _lame_version.match(version.lstrip(b"EMAL"))
+    if match is None:
+        return 0
+    major, minor = int(match.group(1)), int(match.group(2))
+    if (major, minor) < (3, 90) or data[offset + 9] >> 4 != 0:
+        return 0
+    delay_padding = int.from_bytes(data[offset + 21:offset + 24], "big")
+    return (delay_padding >> 12) + (delay_padding & 0xfff)
+
+
+def id3_size(header):
+    """
+    :param bytes header: the first 10 bytes of the file
+
+    :return the size of the ID3v2 tag at the start of the file (with its footer), 0 without one
+    :rtype  int
+    """
+
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    # 4 x 7 bits ("syncsafe"):
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    return 10 + size + (10 if header[5] & 0x10 else 0)
+
+
+class SeekIndex:
+    """
+        The byte offset of every INDEX_FRAMES-th frame of an MPEG audio stream,
+        built by a single scan of the frame headers (see build()),
+        so decoding can start near any position without decoding the frames before it
+
+        Serialized by to_bytes() / from_bytes() (cached by a TagCache)
+    """
+
+    __slots__ = ("sample_rate", "samples", "step", "offsets")
+
+    # every N-th frame is indexed (~0.4 s for MPEG-1 Layer III):
+    INDEX_FRAMES = 16
+    # the size of a single read, while scanning:
+    SCAN_SIZE = 2 ** 16
+
+    _head = struct.Struct("<IHH")
+
+    def __init__(self, sample_rate, samples, step, offsets):
+        """
+        :param int   sample_rate:
+        :param int   samples:     samples per frame
+        :param int   step:        frames between two indexed frames
+        :param array offsets:     array("Q") of the byte offsets of the indexed frames
+        """
+
+        self.sample_rate = sample_rate
+        self.samples = samples
+        self.step = step
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, file, offset=0):
+        """
+        :param file:       opened in binary mode
+        :param int offset: the end of the ID3v2 tag
+
+        :return the index of the stream or None, if there is no valid frame near 'offset'
+        :rtype  SeekIndex
+        """
+
+        file.seek(offset)
+        data = file.read(READ_SIZE)
+        start = data.find(b"\xff")
+        while start != -1:
+            try:
+                first = FrameHeader(data, start)
+                if _frames_follow(data, start, first, CHECK_FRAMES - 1 if first.layer == 3 else 1):
+                    break
+            except ValueError:
+                pass
+            start = data.find(b"\xff", start + 1)
+        else:
+            return None
+
+        position = offset + start
+        if first.layer == 3 and _vbr_samples(data, start, first) is not None:
+            # the Xing/Info/VBRI frame has no audio:
+            position += first.size
+
+        offsets = array("Q")
+        frames = 0
+        # header -> frame size, the same few headers repeat (bitrates, padding):
+        sizes = {}
+        data, data_start = b"", position
+        while True:
+            relative = position - data_start
+            if relative + 4 > len(data):
+                # only the 4 bytes of every header are needed, the frames are skipped:
+                file.seek(position)
+                data, data_start = file.read(cls.SCAN_SIZE), position
+                relative = 0
+                if len(data) < 4:
+                    break
+            header, = _header.unpack_from(data, relative)
+            size = sizes.get(header)
+            if size is None:
+                try:
+                    frame = FrameHeader(data, relative)
+                except ValueError:
+                    # the end of the stream (e.g. an ID3v1 tag) or a broken frame:
+                    break
+                if not first.same_stream(frame):
+                    break
+                size = sizes[header] = frame.size
+            if frames % cls.INDEX_FRAMES == 0:
+                offsets.append(position)
+            frames += 1
+            position += size
+        return cls(first.sample_rate, first.samples, cls.INDEX_FRAMES, offsets)
+
+    def locate(self, seconds):
+        """
+        :return (byte offset, seconds) of the last indexed frame at or before 'seconds'
+        :rtype  tuple
+        """
+
+        if not self.offsets:
+            return 0, 0.0
+        frame_seconds = self.samples * self.step / self.sample_rate
+        entry = min(max(0, int(seconds / frame_seconds)), len(self.offsets) - 1)
+        return self.offsets[entry], entry * frame_seconds
+
+    def to_bytes(self):
+        """
+        :rtype bytes
+        """
+
+        return self._head.pack(self.sample_rate, self.samples, self.step) + self.offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        :return the index or None, if 'data' is not a valid one
+        :rtype  SeekIndex
+        """
+
+        if len(data) < cls._head.size or (len(data) - cls._head.size) % 8:
+            return None
+        sample_rate, samples, step = cls._head.unpack_from(data)
+        offsets = array("Q")
+        offsets.frombytes(data[cls._head.size:])
+        return cls(sample_rate, samples, step, offsets)
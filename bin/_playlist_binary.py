@@ -0,0 +1,143 @@
+import json
+import mmap
+import os
+import struct
+from itertools import accumulate
+from bin._playlist_journal import write_bytes_atomic
+
+
+class PlaylistBinary:
+    """
+        Compact binary Playlist file (for class Playlist)
+
+        Layout (little-endian):
+            magic "MMLP", version (u8)
+            the "meta" header as JSON: size (u32) + UTF-8
+            string table: count (u32), size of the text (u32),
+                          the length (in characters) of every string (count x u32),
+                          the text - all strings one after another, UTF-8
+            Songs: count (u32), then 6 x u32 for every Song -> title, artist,
+                   album, directory, file name (indexes in the string table), length
+
+        Every string (e.g. an artist, an album or a directory shared by
+        many Songs) is stored only once and the whole text is decoded at once.
+        The Songs are fixed-size records, read straight from the memory-mapped file.
+    """
+
+    suffix = ".mmlp"
+
+    _magic = b"MMLP"
+    _version = 1
+    _head = struct.Struct("<4sBI")
+    _size = struct.Struct("<I")
+    _song = struct.Struct("<IIIIII")
+
+    @classmethod
+    def write(cls, path, meta, records):
+        """
+        Writes the file atomically (see write_bytes_atomic())
+
+        :param Path path:
+        :param dict meta:    the "meta" header
+        :param list records: (title, artist, album, length, path) of every Song
+        """
+
+        strings = {}
+        songs = bytearray()
+        for title, artist, album, length, song_path in records:
+            # the directory keeps its separator -> joined back by a simple '+':
+            split = song_path.rfind(os.sep) + 1
+            directory, file_name = song_path[:split], song_path[split:]
+            songs += cls._song.pack(strings.setdefault(title, len(strings)),
+                                    strings.setdefault(artist, len(strings)),
+                                    strings.setdefault(album, len(strings)),
+                                    strings.setdefault(directory, len(strings)),
+                                    strings.setdefault(file_name, len(strings)),
+                                    int(length))
+
+        meta = json.dumps(meta).encode()
+        # the dict keeps the order, in which the strings were indexed:
+        text = "".join(strings).encode("utf-8", "surrogateescape")
+        parts = [cls._head.pack(cls._magic, cls._version, len(meta)), meta,
+                 cls._size.pack(len(strings)), cls._size.pack(len(text)),
+                 struct.pack("<{}I".format(len(strings)), *map(len, strings)), text,
+                 cls._size.pack(len(records)), bytes(songs)]
+
+        write_bytes_atomic(path, b"".join(parts))
+
+    @classmethod
+    def read_meta(cls, path):
+        """
+        Reads only the "meta" header
+
+        :return the "meta" header
+        :rtype  dict
+
+        :raise ValueError if it's not a valid file
+        """
+
+        with open(path, 'rb') as binary_file:
+            head = binary_file.read(cls._head.size)
+            meta_size = cls._check_head(head)
+            return json.loads(binary_file.read(meta_size))
+
+    @classmethod
+    def read(cls, path):
+        """
+        :return (meta, records) - 'records' as passed to write()
+        :rtype  tuple
+
+        :raise ValueError if it's not a valid file
+        """
+
+        with open(path, 'rb') as binary_file:
+            with mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                view = memoryview(data)
+                try:
+                    meta_size = cls._check_head(view[:cls._head.size])
+                    offset = cls._head.size
+                    meta = json.loads(bytes(view[offset:offset + meta_size]))
+                    offset += meta_size
+
+                    strings_count, text_size = struct.unpack_from("<II", view, offset)
+                    offset += 2 * cls._size.size
+                    lengths = struct.unpack_from("<{}I".format(strings_count), view, offset)
+                    offset += strings_count * cls._size.size
+                    text = str(view[offset:offset + text_size], "utf-8", "surrogateescape")
+                    offset += text_size
+                    ends = list(accumulate(lengths))
+                    if ends and ends[-1] != len(text):
+                        raise ValueError("Invalid string table in MML-Playlist file: {}".format(path))
+                    strings = [text[end - length:end] for end, length in zip(ends, lengths)]
+
+                    songs_count, = cls._size.unpack_from(view, offset)
+                    offset += cls._size.size
+                    end = offset + songs_count * cls._song.size
+                    if end > len(view):
+                        raise ValueError("Truncated MML-Playlist file: {}".format(path))
+
+                    records = [(strings[title], strings[artist], strings[album], length,
+                                strings[directory] + strings[file_name])
+                               for title, artist, album, directory, file_name, length
+                               in cls._song.iter_unpack(view[offset:end])]
+                except (struct.error, IndexError) as e:
+                    raise ValueError("Invalid MML-Playlist file: {} Error: {}".format(path, e))
+                finally:
+                    view.release()
+        return meta, records
+
+    @classmethod
+    def _check_head(cls, head):
+        """
+        Internal use
+
+        :return the size of the "meta" header
+        :rtype  int
+        """
+
+        if len(head) < cls._head.size:
+            raise ValueError("Not an MML-Playlist file")
+        magic, version, meta_size = cls._head.unpack(head)
+        if magic != cls._magic or version != cls._version:
+            raise ValueError("Not an MML-Playlist file")
+        return meta_size
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+
+class PlaylistJournal:
+    """
+        Append-only journal of the changes made to a saved Playlist (for class Playlist)
+
+        Every line is a JSON object - a single change ("op") and the
+        "generation" of the .json file it was made on. Lines of any other
+        generation are left over from before the last full save and are skipped.
+    """
+
+    suffix = ".journal"
+
+    # how much of the end of the journal is read, looking for its last line:
+    _tail_read_size = 4096
+
+    def __init__(self, playlist_path):
+        """
+        :param playlist_path: the .json file of the Playlist
+        :type  playlist_path: Path
+        """
+
+        self.path = Path(playlist_path).with_suffix(self.suffix)
+
+    def append(self, ops, generation, songs, length):
+        """
+        Appends the changes to the journal and flushes them to the disk
+
+        :param list ops:        the changes, see Playlist._apply()
+        :param int  generation: the generation of the .json file
+        :param int  songs:      number of Songs after the changes
+        :param int  length:     total length of the Songs after the changes
+        """
+
+        lines = []
+        for op in ops:
+            line = dict(op)
+            line.update({"generation": generation, "songs": songs, "length": length})
+            lines.append(json.dumps(line) + "\n")
+
+        with open(self.path, 'a+b') as journal_file:
+            # after a torn write, the new lines must not be glued to the incomplete one:
+            if journal_file.tell() > 0:
+                journal_file.seek(-1, os.SEEK_END)
+                if journal_file.read(1) != b"\n":
+                    journal_file.write(b"\n")
+            journal_file.write("".join(lines).encode())
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def last_meta(self, generation):
+        """
+        :return (songs, length) from the last complete line of 'generation'
+             or None if there is no such line
+        :rtype  tuple
+        """
+
+        try:
+            with open(self.path, 'rb') as journal_file:
+                journal_file.seek(0, os.SEEK_END)
+                journal_file.seek(max(0, journal_file.tell() - self._tail_read_size))
+                tail = journal_file.read()
+        except OSError:
+            return None
+
+        for line in reversed(tail.splitlines()):
+            try:
+                op = json.loads(line)
+            except ValueError:
+                # an incomplete line (the first one of the tail or a torn write):
+                continue
+            if op.get("generation") == generation:
+                return op["songs"], op["length"]
+            return None
+        return None
+
+    def read(self, generation):
+        """
+        :return the changes of 'generation', in the order they were made
+        :rtype  list
+        """
+
+        ops = []
+        try:
+            with open(self.path, 'r') as journal_file:
+                for line in journal_file:
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        # a torn write, the change was never applied to the loaded Playlist:
+                        logging.warning("Incomplete line in Playlist journal: {}".format(self.path))
+                        continue
+                    if op.get("generation") == generation:
+                        ops.append(op)
+        except FileNotFoundError:
+            pass
+        return ops
+
+    def remove(self):
+        """
+        Deletes the journal, if it exists
+        """
+
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def write_json_atomic(path, data):
+    """
+    Writes 'data' to a temporary file next to 'path' and renames it to 'path',
+    so a crash can never leave a partially written 'path'
+
+    :param Path path:
+    :param dict data:
+    """
+
+    write_bytes_atomic(path, json.dumps(data, indent=2).encode())
+
+
+def write_bytes_atomic(path, data):
+    """
+    Same as write_json_atomic(), for already encoded data
+
+    :param Path  path:
+    :param bytes data:
+    """
+
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=".{}.".format(path.name), suffix=".tmp")
+    try:
+        # 'mkstemp()' creates the file readable only by its owner:
+        try:
+            mode = os.stat(str(path)).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'wb') as out_file:
+            out_file.write(data)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        os.replace(tmp_path, str(path))
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,332 @@
+"""
+    Part of MML-client
+
+    Content-addressed identity of the audio files, so the same audio
+    saved under another name is found without reading whole files
+
+    Exports:
+        class ContentHasher
+        class ContentIndex
+        full_hash(path)
+        partial_hash(path)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from bin.metrics import metrics
+
+# the size of the head and of the tail of a file in its partial hash:
+PARTIAL_SIZE = 64 * 1024
+
+# the size of a single read, while hashing a whole file:
+BLOCK_SIZE = 2 ** 20
+
+
+def _partial_digest(size, head, tail):
+    """
+    Internal use
+
+    The same digest for a file read by partial_hash() and streamed to a ContentHasher
+    """
+
+    digest = hashlib.blake2b(size.to_bytes(8, "little"), digest_size=16)
+    digest.update(head)
+    digest.update(tail)
+    return digest.hexdigest()
+
+
+def partial_hash(path):
+    """
+    Reads only the first and the last PARTIAL_SIZE bytes of the file
+
+    :param path:
+    :type  path: str
+    :type  path: Path
+
+    :return the hash of the size, the head and the tail of the file (hex)
+    :rtype  str
+
+    :raise OSError
+    """
+
+    with open(path, 'rb') as audio_file:
+        size = os.fstat(audio_file.fileno()).st_size
+        head = audio_file.read(PARTIAL_SIZE)
+        if size > PARTIAL_SIZE:
+            audio_file.seek(size - PARTIAL_SIZE)
+            tail = audio_file.read()
+        else:
+            tail = head
+    metrics.inc("mml_hashed_bytes_total", min(size, 2 * PARTIAL_SIZE))
+    return _partial_digest(size, head, tail)
+
+
+def full_hash(path):
+    """
+    Reads the whole file, BLOCK_SIZE bytes at a time
+
+    :param path:
+    :type  path: str
+    :type  path: Path
+
+    :return the hash of the whole file (hex)
+    :rtype  str
+
+    :raise OSError
+    """
+
+    digest = hashlib.blake2b()
+    size = 0
+    with open(path, 'rb') as audio_file:
+        for block in iter(lambda: audio_file.read(BLOCK_SIZE), b""):
+            digest.update(block)
+            size += len(block)
+    metrics.inc("mml_hashed_bytes_total", size)
+    return digest.hexdigest()
+
+
+class ContentHasher:
+    """
+        Part of MML-client
+
+        Computes both the partial and the full hash of a file,
+        while it is written (e.g. an upload), so it's never read again
+
+        Instance methods:
+            full()
+            partial()
+            update(data)
+    """
+
+    def __init__(self):
+        self.size = 0
+        self._full = hashlib.blake2b()
+        self._head = bytearray()
+        self._tail = bytearray()
+
+    def update(self, data):
+        """
+        :param bytes data: the next part of the file
+        """
+
+        self._full.update(data)
+        self.size += len(data)
+        if len(self._head) < PARTIAL_SIZE:
+            self._head += data[:PARTIAL_SIZE - len(self._head)]
+        self._tail += data[-PARTIAL_SIZE:]
+        del self._tail[:-PARTIAL_SIZE]
+
+    def full(self):
+        """
+        :return the same as full_hash() of the written file
+        :rtype  str
+        """
+
+        return self._full.hexdigest()
+
+    def partial(self):
+        """
+        :return the same as partial_hash() of the written file
+        :rtype  str
+        """
+
+        return _partial_digest(self.size, bytes(self._head), bytes(self._tail))
+
+
+class ContentIndex:
+    """
+        Part of MML-client
+
+        Thread-safe index of the audio files in the repo by their content
+
+        The files are compared by size first, only the ones with the same size
+        are hashed (see partial_hash()), only the ones with the same partial hash
+        are hashed as a whole (see full_hash()) -> most files are never read.
+        The hashes are kept by a TagCache, valid while the mtime and the size are the same
+
+        Instance methods:
+            add(path, mtime_ns, size, partial=None, full=None, orphans=None)
+            duplicates()
+            remove(paths)
+            save()
+    """
+
+    def __init__(self, cache=None):
+        """
+        :param TagCache cache: keeps the computed hashes between runs
+        """
+
+        self._cache = cache
+        # path -> (mtime_ns, size, partial, full) from the cache:
+        self._cached = cache.hashes() if cache is not None else {}
+        # path -> [mtime_ns, size, partial, full] of the indexed files and the duplicates:
+        self._entries = {}
+        # size -> {partial hash -> paths} of the indexed files,
+        # None for the ones not hashed yet (the only one of their size, when added):
+        self._sizes = {}
+        # path of a duplicate -> the indexed file with the same content:
+        self._duplicates = {}
+        # paths with new hashes, see save():
+        self._changed = set()
+        self._lock = threading.Lock()
+
+    def _hash(self, path, field, hash_file):
+        """
+        Internal use
+
+        :return the partial (field 2) or the full (field 3) hash of the file,
+                from the cache if its mtime and size are the same
+        :rtype  str
+        """
+
+        entry = self._entries[path]
+        if entry[field] is None:
+            cached = self._cached.get(path)
+            if cached is not None and tuple(cached[:2]) == tuple(entry[:2]) and cached[field] is not None:
+                entry[field] = cached[field]
+            else:
+                entry[field] = hash_file(path)
+                self._changed.add(path)
+        return entry[field]
+
+    def add(self, path, mtime_ns, size, partial=None, full=None, orphans=None):
+        """
+        Indexes the file, unless an indexed file has the same content
+
+        :param str path:
+        :param int mtime_ns:
+        :param int size:
+        :param str partial: if already known, see ContentHasher
+        :param str full:    if already known, see ContentHasher
+
+        :param list orphans: if the file was changed since it was added, its duplicates
+                             are appended -> no longer duplicates, removed from the index
+                             too, to be added again (see remove())
+
+        :return the path of the indexed file with the same content or None, if there is none
+        :rtype  str
+        """
+
+        path = str(path)
+        with self._lock:
+            indexed = self._entries.get(path)
+            if indexed is not None and indexed[:2] == [mtime_ns, size]:
+                # not changed since it was added:
+                return self._duplicates.get(path)
+            if indexed is not None:
+                # changed in place (e.g. re-tagged) -> its duplicates could differ now:
+                changed_orphans = self._orphans({path})
+                for orphan in changed_orphans:
+                    self._remove(orphan)
+                if orphans is not None:
+                    orphans.extend(changed_orphans)
+            self._remove(path)
+            self._entries[path] = [mtime_ns, size, partial, full]
+            if partial is not None or full is not None:
+                self._changed.add(path)
+
+            same_size = self._sizes.setdefault(size, {})
+            if not same_size:
+                # the only file of this size -> nothing is read:
+                same_size[None] = [path]
+                return None
+
+            for other_path in same_size.pop(None, []):
+                try:
+                    same_size.setdefault(self._hash(other_path, 2, partial_hash), []).append(other_path)
+                except OSError as e:
+                    # removed since it was added -> reported by the Watcher:
+                    logging.error("Could not hash audio-file: {} "
+                                  "Error: {}".format(other_path, e))
+                    del self._entries[other_path]
+
+            try:
+                partial = self._hash(path, 2, partial_hash)
+                for other_path in same_size.get(partial, []):
+                    if self._hash(other_path, 3, full_hash) == self._hash(path, 3, full_hash):
+                        self._duplicates[path] = other_path
+                        metrics.inc("mml_duplicates_total")
+                        return other_path
+            except OSError as e:
+                # removed or not readable -> compared again, when it's changed:
+                logging.error("Could not hash audio-file: {} "
+                              "Error: {}".format(path, e))
+                partial = None
+
+            same_size.setdefault(partial, []).append(path)
+            return None
+
+    def _remove(self, path):
+        """
+        Internal use
+        """
+
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return
+        if self._duplicates.pop(path, None) is not None:
+            return
+        same_size = self._sizes[entry[1]]
+        for partial in (entry[2], None):
+            paths = same_size.get(partial, [])
+            if path in paths:
+                paths.remove(path)
+                if not paths:
+                    del same_size[partial]
+                break
+        if not same_size:
+            del self._sizes[entry[1]]
+
+    def remove(self, paths):
+        """
+        Removes the files from the index (e.g. deleted ones)
+
+        :param paths:
+        :type  paths: iterable of str
+
+        :return the duplicates of the removed files -> no longer duplicates,
+                removed from the index too, to be added again
+        :rtype  list of str
+        """
+
+        paths = {str(path) for path in paths}
+        with self._lock:
+            orphans = self._orphans(paths)
+            for path in paths.union(orphans):
+                self._remove(path)
+        return orphans
+
+    def _orphans(self, paths):
+        """
+        Internal use
+
+        :return the duplicates of the files in 'paths', which are not in 'paths' themselves
+        :rtype  list of str
+        """
+
+        return sorted(duplicate for duplicate, original in self._duplicates.items()
+                      if original in paths and duplicate not in paths)
+
+    def duplicates(self):
+        """
+        :return path of a duplicate -> the indexed file with the same content
+        :rtype  dict
+        """
+
+        with self._lock:
+            return dict(self._duplicates)
+
+    def save(self):
+        """
+        Saves the hashes computed since the last call in the TagCache
+        """
+
+        if self._cache is None:
+            return
+        with self._lock:
+            entries = [(path, tuple(self._entries[path])) for path in self._changed if path in self._entries]
+            self._cached.update(entries)
+            self._changed.clear()
+        self._cache.update_hashes(entries)
@@ -1,5 +1,11 @@
 import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from stat import S_ISDIR, S_ISREG
+from bin.decoders import supported_suffixes
+from bin.metrics import metrics
 from bin.playlist import Playlist
 from bin.song import Song
 
@@ -8,10 +14,42 @@ class Crawler:
     def __init__(self):
         pass
 
+    # the pools, which can be used by 'find_songs()':
+    pool_types = {"thread": ThreadPoolExecutor,
+                  "process": ProcessPoolExecutor}
+
+    # the number of audio files sent to a worker process at once, while the scan is still running:
+    scan_chunk_size = 32
+
+    # a directory modified this close (in ns) to a scan is listed again by the next one,
+    # its mtime could stay the same after another change (a coarse mtime resolution):
+    racy_mtime_ns = 2 * 10 ** 9
+
     @classmethod
-    def find_songs(cls, path, file_type=None):
-        """ Scans the specified 'path'' and returns a list
-            of Song-objects of supported types
+    def find_songs(cls, path, file_type=None, workers=1, pool="thread", cache=None, skip_unchanged=False,
+                   index=None):
+        """ Scans the specified 'path'' and its subdirectories (see 'walk()') and returns
+            a list of Song-objects of supported types, sorted by their path in 'path'
+
+            With 'workers' > 1, the audio files are loaded in parallel
+            by a "thread" or a "process" pool (see 'pool'),
+            the order of the returned Songs stays the same
+
+            With a TagCache passed as 'cache', only the audio files
+            with a changed mtime or size (or new ones) are loaded,
+            the cache is updated and the deleted files are evicted from it
+
+            With a cache and 'skip_unchanged', the directories with the same
+            mtime as in the last scan are not listed again -> their files are
+            taken from the cache. Files modified in place (the same name,
+            e.g. by a tag editor) in such a directory are NOT noticed
+
+            With a ContentIndex passed as 'index', every audio file is added to it
+            in the order of its path, the ones with the same content as an earlier
+            one are NOT loaded (see ContentIndex.duplicates())
+
+            The files are checked and loaded as 'walk()' yields them -> loading
+            starts with the first directory, while the rest are still listed
 
             USAGE:  pl = Playlist(pl_name)
                     pl.add_songs(crawler.find_songs(path_to_songs))"""
@@ -20,7 +58,8 @@ class Crawler:
         found_songs = list()
 
         if path.exists() and path.is_dir():
-            supported_types = [".mp3"]
+            # see bin/decoders.py:
+            supported_types = supported_suffixes()
 
             # if "file_type" is not specified,
             # all supported types are checked:
@@ -29,17 +68,271 @@ class Crawler:
             elif file_type not in supported_types:
                 logging.error("Supplied file-type not supported by MML_client: {}".format(file_type))
 
-            # Get all the 'objects' in the specified 'path'
-            # which are 'files' (not dirs) and iterate over them
-            # it is NON-Recursive and with dept==1:
-            for file in [obj for obj in path.iterdir() if obj.is_file()]:
-                if file.suffix in file_type:
-                    temp_song = Song().load(file)
-                    if temp_song is not None:
-                        found_songs.append(temp_song)
+            suffixes = (file_type,) if isinstance(file_type, str) else tuple(file_type)
+
+            with metrics.timer("mml_scan_seconds"):
+                scan_start_ns = time.time_ns()
+                # directory -> mtime_ns of every directory in 'path', filled by 'walk()':
+                dirs = {}
+                records = cache.records() if cache is not None else None
+                last_scan = None
+                if cache is not None and skip_unchanged:
+                    last_scan = cls._last_scan(cache.dirs(str(path)), records, suffixes)
+
+                # all of the audio files, including any duplicates, filled while they are walked:
+                present = set()
+                # (file, mtime_ns, size) of the audio files in 'path' and its subdirectories,
+                # NOT a list -> consumed by the loading below, one file at a time:
+                files = cls._collect(cls.walk(path, suffixes, dirs, last_scan), present)
+
+                if index is not None:
+                    files = cls._unique_files(files, index)
+
+                if cache is None:
+                    loaded_songs = cls._load_songs((file for file, mtime_ns, size in files), workers, pool)
+                else:
+                    loaded_songs = cls._load_songs_cached(files, workers, pool, cache, records)
+
+                    # the cached files from 'path', which are no longer there:
+                    prefix = os.path.join(str(path), "")
+                    cache.evict(file for file in records if file.startswith(prefix) and file not in present)
+                    cache.replace_dirs(str(path), {directory: mtime_ns for directory, mtime_ns in dirs.items()
+                                                   if mtime_ns < scan_start_ns - cls.racy_mtime_ns})
+
+                metrics.inc("mml_scan_files_total", len(present))
+                found_songs = [song for song in loaded_songs if song is not None]
 
         return found_songs
 
+    @classmethod
+    def walk(cls, path, suffixes, dirs=None, last_scan=None):
+        """ Generator - yields (file, mtime_ns, size) of the regular files under 'path'
+            (recursively) ending with one of 'suffixes', in the order of their sorted
+            path in 'path' -> a directory is listed only when the files before it are consumed
+
+            Uses 'os.scandir()' -> the type of every entry comes with the listing,
+            only the matching files and the directories are stat-ed
+            Symbolic links to directories are NOT followed (no loops)
+
+            'dirs' (a dict) is filled with directory -> mtime_ns of the visited directories
+            'last_scan' (see '_last_scan()') has the entries of the directories from the
+            last scan -> a directory with the same mtime is not listed again """
+
+        path = str(path)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError as e:
+            logging.error("Could not open the path: {} Error: {}".format(path, e))
+            return
+        yield from cls._walk(path, mtime_ns, tuple(suffixes),
+                             {} if dirs is None else dirs, {} if last_scan is None else last_scan)
+
+    @classmethod
+    def _walk(cls, directory, mtime_ns, suffixes, dirs, last_scan):
+        """ Internal use
+            See 'walk()' """
+
+        dirs[directory] = mtime_ns
+        known = last_scan.get(directory)
+        if known is not None and known[0] == mtime_ns:
+            # nothing was added, removed or renamed in the directory since the last scan:
+            entries = known[1]
+        else:
+            entries = cls._list_dir(directory, suffixes)
+
+        for name, is_dir, entry_mtime_ns, size in entries:
+            full_path = os.path.join(directory, name)
+            if not is_dir:
+                yield full_path, entry_mtime_ns, size
+                continue
+            if entry_mtime_ns is None:
+                # taken from the last scan, could be changed or removed since then:
+                try:
+                    stat = os.stat(full_path, follow_symlinks=False)
+                except OSError:
+                    continue
+                if not S_ISDIR(stat.st_mode):
+                    continue
+                entry_mtime_ns = stat.st_mtime_ns
+            yield from cls._walk(full_path, entry_mtime_ns, suffixes, dirs, last_scan)
+
+    @staticmethod
+    def _list_dir(directory, suffixes):
+        """ Internal use
+            Returns (name, is_dir, mtime_ns, size) of the subdirectories
+            and the matching files in 'directory', sorted by name """
+
+        entries = []
+        try:
+            with os.scandir(directory) as dir_entries:
+                for entry in dir_entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            entries.append((entry.name, True, entry.stat(follow_symlinks=False).st_mtime_ns, None))
+                        elif entry.name.endswith(suffixes):
+                            stat = entry.stat()
+                            if S_ISREG(stat.st_mode):
+                                entries.append((entry.name, False, stat.st_mtime_ns, stat.st_size))
+                    except OSError:
+                        # removed while listing:
+                        continue
+        except OSError as e:
+            logging.error("Could not list the directory: {} Error: {}".format(directory, e))
+        entries.sort()
+        return entries
+
+    @staticmethod
+    def _last_scan(dirs, records, suffixes):
+        """ Internal use
+            Returns directory -> (mtime_ns, entries as returned by '_list_dir()')
+            from the directories saved by the last scan and the cached files in them """
+
+        last_scan = {directory: (mtime_ns, []) for directory, mtime_ns in dirs.items()}
+        for directory in dirs:
+            parent, name = os.path.split(directory)
+            if parent in last_scan and parent != directory:
+                last_scan[parent][1].append((name, True, None, None))
+        for file, record in records.items():
+            parent, name = os.path.split(file)
+            if parent in last_scan and name.endswith(suffixes):
+                last_scan[parent][1].append((name, False, record[0], record[1]))
+        for mtime_ns, entries in last_scan.values():
+            entries.sort()
+        return last_scan
+
+    @classmethod
+    def load_songs(cls, files, workers=1, pool="thread", cache=None):
+        """ Loads the given audio files (e.g. the changed ones reported by a Watcher)
+            and returns a Song (or None) for every file, in the order of 'files'
+
+            With a TagCache passed as 'cache', the files with
+            an unchanged mtime and size are not parsed again"""
+
+        files = [Path(file).absolute() for file in files]
+        existing = []
+        for file in files:
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            if S_ISREG(stat.st_mode):
+                existing.append((file, stat.st_mtime_ns, stat.st_size))
+
+        if cache is None:
+            loaded_songs = cls._load_songs([file for file, mtime_ns, size in existing], workers, pool)
+        else:
+            records = cache.records(str(file) for file, mtime_ns, size in existing)
+            loaded_songs = cls._load_songs_cached(existing, workers, pool, cache, records)
+
+        songs = {file: song for (file, mtime_ns, size), song in zip(existing, loaded_songs)}
+        return [songs.get(file) for file in files]
+
+    @staticmethod
+    def _collect(files, present):
+        """ Internal use
+            Generator - yields the (file, mtime_ns, size) of 'files',
+            adding every file to the set 'present' """
+
+        for file, mtime_ns, size in files:
+            present.add(file)
+            yield file, mtime_ns, size
+
+    @staticmethod
+    def _unique_files(files, index):
+        """ Internal use
+            Generator - yields the (file, mtime_ns, size) of 'files' added to the 'index',
+            without the duplicates of an already indexed file """
+
+        for file, mtime_ns, size in files:
+            original = index.add(file, mtime_ns, size)
+            if original is None:
+                yield file, mtime_ns, size
+            else:
+                logging.info("Duplicate audio file: {} (the same as {})".format(file, original))
+        index.save()
+
+    @classmethod
+    def _load_songs(cls, files, workers, pool):
+        """ Internal use
+            Returns a Song (or None) for every file, in the order of 'files'
+            'files' can be a generator (see 'find_songs()') -> every file is
+            loaded (or sent to the pool) as soon as it is yielded """
+
+        if isinstance(files, list):
+            if len(files) < 2:
+                workers = 1
+            chunk_size = cls._chunk_size(len(files), workers)
+        else:
+            chunk_size = cls.scan_chunk_size
+
+        if workers > 1:
+            if pool not in cls.pool_types:
+                raise ValueError("Crawler pool must be one of: {}".format(", ".join(cls.pool_types)))
+            # 'map()' submits the files while iterating over them,
+            # and returns the results in the order of 'files':
+            with cls.pool_types[pool](max_workers=workers) as executor:
+                return list(executor.map(cls._load_song, files, chunksize=chunk_size))
+        return [cls._load_song(file) for file in files]
+
+    @staticmethod
+    def _load_song(file):
+        """ Internal use
+            The file could be removed after the directory was scanned """
+
+        try:
+            return Song.load(file)
+        except ValueError:
+            logging.warning("Audio file removed while loading: {}".format(file))
+            return None
+
+    @classmethod
+    def _load_songs_cached(cls, files, workers, pool, cache, records):
+        """ Internal use
+            Same as '_load_songs()', but only the files changed
+            since their 'records' in the 'cache' are loaded
+            'files' are (file, mtime_ns, size), can be a generator """
+
+        songs = []
+        # (index in 'songs', file, mtime_ns, size) of the changed files:
+        changed = []
+
+        def changed_files():
+            # the cached files are taken while the changed ones are loaded:
+            for file, mtime_ns, size in files:
+                record = records.get(str(file))
+                if record is not None and record[0] == mtime_ns and record[1] == size:
+                    # 'title' is None for files, which could not be loaded last time:
+                    # ('file' is already resolved, the tags were validated when cached)
+                    songs.append(Song.from_record(*record[2:], path=str(file)) if record[2] is not None else None)
+                else:
+                    changed.append((len(songs), file, mtime_ns, size))
+                    songs.append(None)
+                    yield file
+
+        loaded_songs = cls._load_songs(changed_files() if not isinstance(files, list) else list(changed_files()),
+                                       workers, pool)
+
+        entries = []
+        for (index, file, mtime_ns, size), song in zip(changed, loaded_songs):
+            songs[index] = song
+            if song is None:
+                entries.append((file, (mtime_ns, size, None, None, None, None)))
+            else:
+                entries.append((file, (mtime_ns, size,
+                                       song.title(), song.artist(), song.album(), song.length())))
+        cache.update(entries)
+
+        logging.info("Tag cache: {} audio files loaded, {} from the cache".format(len(changed),
+                                                                                  len(songs) - len(changed)))
+        return songs
+
+    @staticmethod
+    def _chunk_size(files_count, workers):
+        """ Internal use
+            Bigger chunks save inter-process communication,
+            while still giving every worker a few chunks """
+        return max(1, files_count // (workers * 4))
+
     @classmethod
     def find_playlist(cls, path):
         """ Scans the specified 'path' and returns a list
@@ -54,11 +347,51 @@ class Crawler:
             # Get all the 'objects' in the specified 'path'
             # which are 'files' (not dirs) and iterate over them
             # it is NON-Recursive and with dept==1:
-            for file in [obj for obj in path.iterdir() if obj.is_file()]:
-                if file.suffix == ".json":
-                    tmp_playlist = Playlist.load(file)
-                    if tmp_playlist.name() != "":
-                        playlists.append(tmp_playlist)
+            for file in cls._playlist_files(path):
+                tmp_playlist = Playlist.load(file)
+                if tmp_playlist.name() != "":
+                    playlists.append(tmp_playlist)
+        else:
+            logging.error("Could not open the path: {}".format(path))
+        return playlists
+
+    @classmethod
+    def find_playlist_meta(cls, path):
+        """ Scans the specified 'path' and returns a list of the "meta"
+            headers (see Playlist.load_meta()) of the Playlist files,
+            sorted by file name, WITHOUT loading their Songs """
+
+        path = Path(path).absolute().resolve()
+        playlists = list()
+
+        if path.exists() and path.is_dir():
+            logging.info("Searching for MML-Playlists in {}: ".format(path))
+
+            # it is NON-Recursive and with dept==1:
+            for file in sorted(cls._playlist_files(path), key=lambda obj: obj.name):
+                meta = Playlist.load_meta(file)
+                if meta is not None and meta["name"] != "":
+                    playlists.append(meta)
         else:
             logging.error("Could not open the path: {}".format(path))
         return playlists
+
+    @staticmethod
+    def _playlist_files(path):
+        """
+        Internal use
+
+        :return the Playlist files in 'path' - a binary .mmlp file
+                takes the place of a .json file with the same name
+        :rtype  list of Path
+        """
+
+        files = {}
+        # the type of every entry comes with the listing, no 'stat()' for each of them:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                stem, suffix = os.path.splitext(entry.name)
+                if suffix in Playlist.suffixes and entry.is_file():
+                    if stem not in files or suffix != ".json":
+                        files[stem] = path.joinpath(entry.name)
+        return list(files.values())
@@ -0,0 +1,458 @@
+"""
+    Part of MML-client
+
+    The supported audio formats, used by the Crawler (Song.load())
+    and the playback (see web/backends/_stream.py)
+
+    Exports:
+        class Decoder
+        class FfmpegSource
+        class SeekIndex (from _mpeg_header.py)
+        class WavSource
+        decoders - format name -> Decoder of the supported formats
+        find_decoder(path)
+        open_pcm(path, seconds=0, index=None)
+        register(decoder)
+        supported_suffixes()
+"""
+
+import mmap
+import os
+import struct
+import subprocess
+from mutagen.easyid3 import EasyID3
+from mutagen.flac import FLAC
+from mutagen.id3 import ID3NoHeaderError
+from mutagen.mp3 import MPEGInfo
+from mutagen.oggvorbis import OggVorbis
+from mutagen.wave import WAVE
+from bin._mpeg_header import SeekIndex, id3_size, read_length
+
+# the PCM format, in which 'ffmpeg' decodes every audio file:
+SAMPLE_RATE = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+PCM_FORMAT = (CHANNELS, SAMPLE_WIDTH, SAMPLE_RATE)
+BYTES_PER_SECOND = SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH
+
+
+class FfmpegSource:
+    """
+        Part of MML-client
+
+        PCM (in PCM_FORMAT) of an audio file, decoded by 'ffmpeg' (or 'avconv',
+        as configured by pydub) in a separate process, read as it is decoded
+
+        Instance attributes:
+            pcm_format - (channels, sample_width, sample_rate)
+            zero_copy  - False, the audio is decoded
+
+        Instance methods:
+            close()
+            read(size)
+    """
+
+    pcm_format = PCM_FORMAT
+    zero_copy = False
+
+    def __init__(self, path, seconds=0, skip_bytes=0):
+        """
+        :param path: The path of the audio file
+        :type  path: str
+        :type  path: Path
+
+        :param seconds: skipped from the start of the audio file (after 'skip_bytes')
+        :type  seconds: int
+        :type  seconds: float
+
+        :param int skip_bytes: not read at all, the start of a frame (see SeekIndex)
+
+        :raise OSError if the decoder can't be started
+        """
+
+        # 'ffmpeg' as found and configured by pydub, imported only when needed
+        # (pydub warns on import, when 'ffmpeg' is missing):
+        from pydub import AudioSegment
+
+        command = [AudioSegment.converter, "-v", "quiet"]
+        if skip_bytes:
+            # an input option -> decoding starts at the frame, nothing before it is read:
+            command += ["-skip_initial_bytes", str(skip_bytes)]
+        command += ["-i", str(path)]
+        if seconds:
+            # as an output option -> sample accurate, the skipped audio is decoded and dropped:
+            command += ["-ss", str(seconds)]
+        command += ["-f", "s16le",
+                    "-acodec", "pcm_s16le",
+                    "-ac", str(CHANNELS),
+                    "-ar", str(SAMPLE_RATE),
+                    "-"]
+        self._process = subprocess.Popen(command,
+                                         stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL)
+
+    def read(self, size):
+        """
+        :return up to 'size' bytes of PCM, b"" at the end of the audio file
+        :rtype  bytes
+        """
+
+        return self._process.stdout.read(size)
+
+    def close(self):
+        """
+        Stops the decoder, can be called from any thread
+        """
+
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+
+class WavSource:
+    """
+        Part of MML-client
+
+        PCM of an uncompressed (PCM) WAV file, memory-mapped and returned
+        as views of the mapping -> nothing is decoded, read or copied in advance,
+        the PCM is played in the format of the file
+
+        Instance attributes:
+            pcm_format - (channels, sample_width, sample_rate)
+            zero_copy  - True
+
+        Instance methods:
+            close()
+            read(size)
+    """
+
+    zero_copy = True
+
+    _format_pcm = 0x0001
+    _format_extensible = 0xfffe
+
+    def __init__(self, path, seconds=0):
+        """
+        :param path: The path of the WAV file
+        :type  path: str
+        :type  path: Path
+
+        :param seconds: skipped from the start of the WAV file
+        :type  seconds: int
+        :type  seconds: float
+
+        :raise ValueError if it's not a WAV file with integer PCM of 8-32 bits
+        :raise OSError
+        """
+
+        with open(path, 'rb') as wav_file:
+            size = os.fstat(wav_file.fileno()).st_size
+            if size == 0:
+                raise ValueError("Empty WAV file: {}".format(path))
+            self._mmap = mmap.mmap(wav_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.pcm_format, data_start, data_end = self._parse(self._mmap)
+        except (ValueError, struct.error) as e:
+            self._mmap.close()
+            raise ValueError("Not a supported WAV file: {} Error: {}".format(path, e))
+
+        channels, sample_width, sample_rate = self.pcm_format
+        frame_size = channels * sample_width
+        self._view = memoryview(self._mmap)[data_start:data_end - (data_end - data_start) % frame_size]
+        self._position = min(int(seconds * sample_rate) * frame_size, len(self._view))
+        if hasattr(self._mmap, "madvise"):
+            # read ahead, the PCM is played from the start to the end:
+            self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+
+    @classmethod
+    def _parse(cls, data):
+        """
+        Internal use
+
+        :return (channels, sample_width, sample_rate), the start and the end of the PCM
+        :rtype  tuple
+        """
+
+        riff, wave = struct.unpack_from("<4s4x4s", data, 0)
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError("no RIFF/WAVE header")
+
+        pcm_format = None
+        offset = 12
+        while offset + 8 <= len(data):
+            chunk_id, chunk_size = struct.unpack_from("<4sI", data, offset)
+            offset += 8
+            if chunk_id == b"fmt ":
+                tag, channels, sample_rate, block_align, bits = struct.unpack_from("<HHI4xHH", data, offset)
+                if tag == cls._format_extensible and chunk_size >= 40:
+                    # WAVE_FORMAT_EXTENSIBLE -> the first 2 bytes of the sub-format GUID:
+                    tag, = struct.unpack_from("<H", data, offset + 24)
+                if tag != cls._format_pcm or bits not in (8, 16, 24, 32) or \
+                        channels == 0 or block_align != channels * bits // 8:
+                    raise ValueError("not integer PCM")
+                pcm_format = (channels, bits // 8, sample_rate)
+            elif chunk_id == b"data":
+                if pcm_format is None:
+                    raise ValueError("no 'fmt ' chunk before the 'data' chunk")
+                # a streamed WAV file could have a wrong (or 0xffffffff) size:
+                return pcm_format, offset, min(offset + chunk_size, len(data))
+            # the chunks are padded to an even size:
+            offset += chunk_size + chunk_size % 2
+        raise ValueError("no 'data' chunk")
+
+    def read(self, size):
+        """
+        :return a view of up to 'size' bytes of PCM, empty at the end of the file
+        :rtype  memoryview
+        """
+
+        chunk = self._view[self._position:self._position + size]
+        self._position += len(chunk)
+        return chunk
+
+    def close(self):
+        """
+        Unmaps the file, can be called from any thread
+        (the next read() returns an empty view)
+        """
+
+        self._view = self._view[:0]
+        try:
+            self._mmap.close()
+        except BufferError:
+            # a chunk is still buffered or played -> unmapped, once its view is garbage collected:
+            pass
+
+
+class Decoder:
+    """
+        Part of MML-client
+
+        The tags, the length and the PCM of the audio files of one format,
+        see 'decoders' for the supported ones
+
+        Instance methods:
+            open(path, seconds=0, index=None)
+            read_info(path)
+            seek_index(path)
+    """
+
+    # e.g. "mp3" (the key in 'decoders'):
+    name = ""
+    suffixes = ()
+
+    def read_info(self, path):
+        """
+        :param str path: The path of the audio file
+
+        :return (tags, length) - tags: dict with any of "title", "artist", "album"
+                                 or None if the file has no tags and can't be loaded without them
+                                 length: float, in seconds
+        :rtype  tuple
+
+        :raise mutagen.MutagenError or OSError if the file can't be read
+        """
+
+        raise NotImplementedError
+
+    def open(self, path, seconds=0, index=None):
+        """
+        :param str path: The path of the audio file
+
+        :param seconds: skipped from the start of the audio file
+        :type  seconds: int
+        :type  seconds: float
+
+        :param index: as returned by seek_index(), decoding starts at
+                      the indexed frame closest to 'seconds'
+        :type  index: SeekIndex
+
+        :return the PCM of the audio file
+        :rtype  FfmpegSource or WavSource
+
+        :raise OSError
+        """
+
+        return FfmpegSource(path, seconds)
+
+    def seek_index(self, path):
+        """
+        :param str path: The path of the audio file
+
+        :return the index for open(), None for the formats seeking without one
+        :rtype  SeekIndex
+
+        :raise OSError
+        """
+
+        return None
+
+
+class Mp3Decoder(Decoder):
+    """
+        Part of MML-client
+
+        MP3 files, only the ones with ID3 tags are loaded
+    """
+
+    name = "mp3"
+    suffixes = (".mp3",)
+
+    def read_info(self, path):
+        with open(path, 'rb') as audio_file:
+            try:
+                tags = EasyID3(audio_file)
+            except ID3NoHeaderError:
+                return None, 0
+            # the length from the headers of the first frame (a single, small read),
+            # only without them (or when they don't make sense) the audio stream is parsed:
+            length = read_length(audio_file, tags.size)
+            if length is None:
+                length = MPEGInfo(audio_file, tags.size).length
+        # NOTE: the '[0]' is because the tags are single-item LISTS:
+        return {key: str(tags[key][0]) for key in ("title", "artist", "album") if key in tags}, length
+
+    def open(self, path, seconds=0, index=None):
+        if not seconds or index is None or not index.offsets:
+            return FfmpegSource(path, seconds)
+        skip_bytes, frame_seconds = index.locate(seconds)
+        # only the rest (< 1 indexed step) is decoded and dropped:
+        return FfmpegSource(path, round(seconds - frame_seconds, 3), skip_bytes)
+
+    def seek_index(self, path):
+        with open(path, 'rb') as audio_file:
+            return SeekIndex.build(audio_file, id3_size(audio_file.read(10)))
+
+
+class VorbisDecoder(Decoder):
+    """
+        Part of MML-client
+
+        FLAC and Ogg Vorbis files, tagged with Vorbis comments (optional)
+    """
+
+    def __init__(self, name, suffixes, file_type):
+        """
+        :param str   name:
+        :param tuple suffixes:
+        :param type  file_type: mutagen.flac.FLAC or mutagen.oggvorbis.OggVorbis
+        """
+
+        self.name = name
+        self.suffixes = suffixes
+        self._file_type = file_type
+
+    def read_info(self, path):
+        audio_file = self._file_type(path)
+        tags = audio_file.tags or {}
+        return {key: str(tags[key][0]) for key in ("title", "artist", "album") if tags.get(key)}, \
+            audio_file.info.length
+
+
+class WavDecoder(Decoder):
+    """
+        Part of MML-client
+
+        WAV files, tagged with an ID3 chunk (optional),
+        integer PCM is played without decoding (see WavSource)
+    """
+
+    name = "wav"
+    suffixes = (".wav", ".wave")
+
+    _id3_keys = {"title": "TIT2", "artist": "TPE1", "album": "TALB"}
+
+    def read_info(self, path):
+        audio_file = WAVE(path)
+        tags = audio_file.tags or {}
+        return {key: str(tags[frame].text[0]) for key, frame in self._id3_keys.items()
+                if frame in tags and tags[frame].text}, audio_file.info.length
+
+    def open(self, path, seconds=0, index=None):
+        # the position of any sample is known -> no index:
+        try:
+            return WavSource(path, seconds)
+        except ValueError:
+            # e.g. float or compressed samples:
+            return FfmpegSource(path, seconds)
+
+
+# format name -> Decoder:
+decoders = {}
+# suffix -> Decoder:
+_by_suffix = {}
+
+
+def register(decoder):
+    """
+    Adds (or replaces) the Decoder of a format and its suffixes,
+    the suffixes are matched in any case (see find_decoder())
+
+    :param Decoder decoder:
+
+    :raise TypeError if 'decoder' is not a Decoder object
+    """
+
+    if not isinstance(decoder, Decoder):
+        raise TypeError("Only MML-Decoder objects can be registered!!!")
+    old_decoder = decoders.pop(decoder.name, None)
+    if old_decoder is not None:
+        for suffix in old_decoder.suffixes:
+            _by_suffix.pop(suffix.lower(), None)
+    decoders[decoder.name] = decoder
+    for suffix in decoder.suffixes:
+        _by_suffix[suffix.lower()] = decoder
+
+
+def find_decoder(path):
+    """
+    :param path: The path of an audio file
+    :type  path: str
+    :type  path: Path
+
+    :return the Decoder for its suffix (in any case) or None, if it's not supported
+    :rtype  Decoder
+    """
+
+    return _by_suffix.get(os.path.splitext(str(path))[1].lower())
+
+
+def open_pcm(path, seconds=0, index=None):
+    """
+    :param path: The path of an audio file
+    :type  path: str
+    :type  path: Path
+
+    :param seconds: skipped from the start of the audio file
+    :type  seconds: int
+    :type  seconds: float
+
+    :param SeekIndex index: see Decoder.seek_index()
+
+    :return its PCM, by the Decoder for its suffix ('ffmpeg' for unknown ones)
+    :rtype  FfmpegSource or WavSource
+
+    :raise OSError
+    """
+
+    decoder = find_decoder(path)
+    if decoder is None:
+        return FfmpegSource(path, seconds)
+    return decoder.open(str(path), seconds, index)
+
+
+def supported_suffixes():
+    """
+    :return the suffixes of the supported audio files
+    :rtype  tuple of str
+    """
+
+    return tuple(_by_suffix)
+
+
+for _decoder in (Mp3Decoder(),
+                 VorbisDecoder("flac", (".flac",), FLAC),
+                 VorbisDecoder("ogg", (".ogg", ".oga"), OggVorbis),
+                 WavDecoder()):
+    register(_decoder)
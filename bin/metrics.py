@@ -0,0 +1,179 @@
+"""
+    Part of MML-client
+
+    Exports:
+        class Metrics
+        metrics - the Metrics instance used by the whole App
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+
+class Metrics:
+    """
+        Part of MML-client
+
+        Thread-safe counters and histograms of the time spent in the
+        hot paths of the App, rendered in the Prometheus text format
+
+        Every metric must be defined in 'definitions'. When disabled
+        ('enabled' is False), nothing is recorded and timer() returns
+        an already created, empty context manager
+
+        Instance methods:
+            inc(name, value=1, **labels)
+            observe(name, value, **labels)
+            render()
+            reset()
+            timer(name, **labels)
+    """
+
+    # name -> (type, help):
+    definitions = {
+        "mml_scan_seconds": ("histogram", "Time to scan the songs directory"),
+        "mml_scan_files_total": ("counter", "Audio files found by the scans of the songs directory"),
+        "mml_tag_parse_seconds": ("histogram", "Time to load the tags of a single audio file"),
+        "mml_tag_parse_failures_total": ("counter", "Audio files, whose tags could not be loaded"),
+        "mml_playlist_load_seconds": ("histogram", "Time to load a Playlist file"),
+        "mml_playlist_save_seconds": ("histogram", "Time to save a Playlist file"),
+        "mml_playlist_cache_hits_total": ("counter", "Playlists switched to from the PlaylistCache"),
+        "mml_playlist_cache_misses_total": ("counter", "Playlists loaded from their file by the PlaylistCache"),
+        "mml_decode_head_seconds": ("histogram", "Time to decode the start of an audio file in advance"),
+        "mml_decoded_bytes_total": ("counter", "PCM bytes decoded for playback"),
+        "mml_seek_index_seconds": ("histogram", "Time to build the seek index of an audio file"),
+        "mml_hashed_bytes_total": ("counter", "Bytes of audio files read to compare their content"),
+        "mml_duplicates_total": ("counter", "Audio files skipped as duplicates of another one"),
+        "mml_request_seconds": ("histogram", "Time to handle an HTTP request"),
+    }
+
+    # the upper bounds of the histogram buckets, in seconds:
+    buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+    _null_timer = nullcontext()
+
+    def __init__(self, enabled=True):
+        """
+        :param Bool enabled: Record the metrics or not
+        """
+
+        self.enabled = enabled
+        # (name, labels) -> value:
+        self._counters = {}
+        # (name, labels) -> [count of every bucket + "+Inf"], sum:
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        """
+        Internal use
+        """
+
+        if name not in Metrics.definitions:
+            raise ValueError("Unknown metric: {}!".format(name))
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increases a counter
+        """
+
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Adds a value (in seconds) to a histogram
+        """
+
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][bisect_left(self.buckets, value)] += 1
+            histogram[1] += value
+
+    def timer(self, name, **labels):
+        """
+        :return a context manager, adding the time spent in its 'with' block to a histogram
+        """
+
+        if not self.enabled:
+            return self._null_timer
+        return self._timer(name, labels)
+
+    @contextmanager
+    def _timer(self, name, labels):
+        """
+        Internal use
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        """
+        Clears all recorded values
+        """
+
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        """
+        Internal use
+        """
+
+        labels = tuple(labels) + tuple(extra)
+        if not labels:
+            return ""
+        return "{" + ",".join('{}="{}"'.format(label, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                              for label, value in labels) + "}"
+
+    def render(self):
+        """
+        :return all recorded metrics in the Prometheus text format (version 0.0.4)
+        :rtype  str
+        """
+
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(counts), total) for key, (counts, total) in self._histograms.items()}
+
+        lines = []
+        for name, (metric_type, help_text) in sorted(self.definitions.items()):
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            if metric_type == "counter":
+                for (key_name, labels), value in sorted(counters.items()):
+                    if key_name == name:
+                        lines.append("{}{} {}".format(name, self._labels(labels), value))
+            else:
+                for (key_name, labels), (counts, total) in sorted(histograms.items()):
+                    if key_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + ("+Inf",), counts):
+                        cumulative += count
+                        lines.append("{}_bucket{} {}".format(name, self._labels(labels, [("le", bound)]),
+                                                             cumulative))
+                    lines.append("{}_sum{} {}".format(name, self._labels(labels), total))
+                    lines.append("{}_count{} {}".format(name, self._labels(labels), cumulative))
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
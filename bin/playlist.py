@@ -6,9 +6,16 @@
 
 import json
 import logging
+import os
+import re
+import time
+from bisect import bisect_left
 from pathlib import Path
+from bin.metrics import metrics
 from bin.song import Song
+from bin._playlist_binary import PlaylistBinary
 from bin._playlist_iter import PlaylistIterator
+from bin._playlist_journal import PlaylistJournal, write_json_atomic
 
 
 class Playlist:
@@ -18,19 +25,39 @@ class Playlist:
         Instance methods:
             add_song(song)
             add_songs(songs_list)
+            check_songs()
+            index(song)
+            index_of(path)
             name()
             next_song()
             prev_song()
             remove_song(index)
-            save(path)
+            remove_songs(paths)
+            replace_song(song)
+            save(path, compact=False, binary=False)
             set_name(name)
             swap_songs(index_1, index_2)
             total_length()
+            total_seconds()
 
         Static methods:
-            load(path)
+            delete(path)
+            file_path(path)
+            length_pretty(total_seconds)
+            load(path, trusted=False)
+            load_meta(path)
     """
 
+    # how much of a Playlist file is read, looking for its "meta" header:
+    _meta_read_size = 4096
+    _meta_start = re.compile(r'\s*{\s*"meta"\s*:\s*')
+
+    # after this many changes in the journal, save() rewrites the whole .json file:
+    compact_after = 500
+
+    # the suffixes of the Playlist files - JSON and the compact binary format (see save()):
+    suffixes = (".json", PlaylistBinary.suffix)
+
     def __init__(self, name="Unknown"):
         """
         :param str name: The name of the Playlist.  default="Unknown"
@@ -41,6 +68,29 @@ class Playlist:
         self.songs = []
         self.current_song_index = -1
 
+        # Song path -> its index in 'songs', kept in sync by every method
+        # modifying 'songs', so looking up a Song is O(1):
+        self._index = {}
+
+        # the total length of the Songs in seconds, kept in sync like '_index',
+        # so total_seconds() (e.g. on every save()) is O(1):
+        self._total_seconds = 0
+
+        # the changes since the last save(), only tracked once the Playlist
+        # is saved or loaded, so save() can append them to the journal:
+        self._changes = None
+        self._saved_path = None
+        self._generation = 0
+        self._journal_size = 0
+
+    def __contains__(self, song):
+        """
+        :return True if a Song with the same path is in the Playlist
+        :rtype  Bool
+        """
+
+        return isinstance(song, Song) and song.path() in self._index
+
     def __eq__(self, other):
         """Two Playlist objects are equal, when their OS Paths are equal (they point to the same .json file)"""
 
@@ -78,8 +128,11 @@ class Playlist:
         """
 
         if isinstance(song, Song):
-            if song not in self.songs:
+            if song.path() not in self._index:
+                self._index[song.path()] = len(self.songs)
                 self.songs.append(song)
+                self._total_seconds += int(song.length())
+                self._track({"op": "add", "song": self._song_record(song)})
                 return True
             return False
         else:
@@ -104,25 +157,193 @@ class Playlist:
         added = False
         for song in songs_list:
             if isinstance(song, Song):
-                if song not in self.songs:
+                if song.path() not in self._index:
+                    self._index[song.path()] = len(self.songs)
                     self.songs.append(song)
+                    self._total_seconds += int(song.length())
+                    if self._changes is not None:
+                        self._track({"op": "add", "song": self._song_record(song)})
                     added = True
             else:
                 raise TypeError("Only MML-Song objects can be added to the Playlist!!!")
         return added
 
     @staticmethod
-    def load(path):
+    def delete(path):
+        """
+        Deletes a Playlist file and its journal (see save())
+        The journal is deleted, even if the file does not exist
+
+        :param path: the .json (or .mmlp) file of the Playlist
+        :type  path: Path
+        :type  path: str
+
+        :raise FileNotFoundError if the file does not exist
+        """
+
+        path = Path(path)
+        try:
+            Path.unlink(path)
+        finally:
+            PlaylistJournal(path).remove()
+
+    def check_songs(self):
+        """
+        Checks if the audio files of the Songs still exist,
+        e.g. in the background, after a Playlist.load(trusted=True)
+
+        :return the paths of the Songs, whose audio files are missing
+        :rtype  list of str
+        """
+
+        # a snapshot -> safe to call while the Playlist is being modified:
+        return [song.path() for song in list(self.songs) if not os.path.isfile(song.path())]
+
+    def index(self, song):
+        """
+        :param song:
+        :type  song: Song object
+
+        :return the index of the Song with the same path
+        :rtype  int
+
+        :raise ValueError if the Song is not in the Playlist
         """
-        Loads a PlayList from a specified JSON-Playlist file
+
+        try:
+            return self._index[song.path()]
+        except (KeyError, AttributeError):
+            raise ValueError("The Song is not in the Playlist!!!")
+
+    def index_of(self, path):
+        """
+        :param str path: the path of an audio file
+
+        :return the index of the Song with this path or -1 if it's not in the Playlist
+        :rtype  int
+        """
+
+        return self._index.get(str(path), -1)
+
+    def _reindex(self, start=0):
+        """
+        Internal use
+
+        Rebuilds the index of the Songs from 'start' to the end of 'songs'
+        """
+
+        for index in range(start, len(self.songs)):
+            self._index[self.songs[index].path()] = index
+
+    def _track(self, change):
+        """
+        Internal use
+
+        Remembers a change, to be appended to the journal by save()
+        """
+
+        if self._changes is not None:
+            self._changes.append(change)
+
+    def _apply(self, change, trusted=False):
+        """
+        Internal use
+
+        Repeats a change read from the journal
+        """
+
+        op = change["op"]
+        if op == "add":
+            self.add_song(self._song_from_record(change["song"], trusted))
+        elif op == "remove":
+            self.remove_song(change["index"])
+        elif op == "remove_paths":
+            self.remove_songs(change["paths"])
+        elif op == "replace":
+            self.replace_song(self._song_from_record(change["song"], trusted))
+        elif op == "swap":
+            self.swap_songs(change["index_1"], change["index_2"])
+        else:
+            logging.warning("Unknown change in Playlist journal: {}".format(op))
+
+    @staticmethod
+    def _song_record(song):
+        """
+        Internal use
+
+        :return the Song, as saved in a Playlist file
+        :rtype  dict
+        """
+
+        return {"title": song.title(),
+                "artist": song.artist(),
+                "album": song.album(),
+                "length": song.length(),
+                "path": song.path()}
+
+    @staticmethod
+    def _song_from_record(record, trusted=False):
+        """
+        Internal use
+        """
+
+        if trusted:
+            return Song.from_record(record["title"],
+                                    record["artist"],
+                                    record["album"],
+                                    record["length"],
+                                    record["path"])
+        return Song(record["title"],
+                    record["artist"],
+                    record["album"],
+                    record["length"],
+                    record["path"])
+
+    @staticmethod
+    def _song_from_tuple(record, trusted=False):
+        """
+        Internal use
+
+        Same as _song_from_record(), for the records of a binary Playlist file
+        """
+
+        if trusted:
+            return Song.from_record(*record)
+        return Song(*record)
+
+    @staticmethod
+    def file_path(path):
+        """
+        :param path: can be absolute or relative, with or without a suffix
+        :type  path: Path
+        :type  path: str
+
+        :return the full OS-path of the Playlist file, as used by load()
+                -> '.mmlp' is kept, any other suffix becomes '.json'
+        :rtype  Path
+        """
+
+        path = Path(path).absolute().resolve()
+        if path.suffix == PlaylistBinary.suffix:
+            return path
+        return path.with_suffix(".json")
+
+    @staticmethod
+    def load(path, trusted=False):
+        """
+        Loads a PlayList from a specified JSON-Playlist (or binary .mmlp) file
 
         The file has to exists and should have an entry, indicating
         it's an MML-Playlist file (added by the Playlist.save() method)
 
-        :param path: can be absolute or relative, but must point to a valid .json
+        :param path: can be absolute or relative, but must point to a valid .json or .mmlp
         :type  path: Path
         :type  path: str
 
+        :param Bool trusted: the file was written by Playlist.save() -> its Songs
+                             are created with Song.from_record(), without checking
+                             their paths (see check_songs())
+
         :return a new Playlist or None
         :rtype  Playlist object or Bool
 
@@ -130,42 +351,133 @@ class Playlist:
         """
 
         # full OS-path to the Playlist file:
-        path = Path(path).absolute().resolve().with_suffix(".json")
+        path = Playlist.file_path(path)
 
         new_playlist = Playlist("")
 
         if path.exists() and path.is_file():
-            try:
-                with open(path, 'r') as json_file:
-                    data = json.load(json_file)
+            with metrics.timer("mml_playlist_load_seconds"):
+                try:
+                    if path.suffix == PlaylistBinary.suffix:
+                        meta, records = PlaylistBinary.read(path)
+                        songs = [Playlist._song_from_tuple(record, trusted) for record in records]
+                    else:
+                        with open(path, 'r') as json_file:
+                            data = json.load(json_file)
+                        meta = data.get("meta", {}) if isinstance(data, dict) else {}
+                        songs = None
 
-                    if "meta" in data and \
-                            "Is MyLibrary Playlist" in data["meta"] and \
-                            data["meta"]["Is MyLibrary Playlist"] == "yes":
+                    if "Is MyLibrary Playlist" in meta and \
+                            meta["Is MyLibrary Playlist"] == "yes":
                         logging.info("Loading MML-Playlist from: {}".format(path))
 
+                        if songs is None:
+                            songs = [Playlist._song_from_record(tmp_song, trusted) for tmp_song in data["songs"]]
+
                         # to get rid of the PATH and from the '.json' part of the NAME:
                         new_playlist.set_name(path.stem)
                         new_playlist.path = path
-                        for tmp_song in data["songs"]:
-                            new_song = Song(tmp_song["title"],
-                                            tmp_song["artist"],
-                                            tmp_song["album"],
-                                            tmp_song["length"],
-                                            tmp_song["path"])
-                            new_playlist.add_song(new_song)
+                        new_playlist.add_songs(songs)
+
+                        # the changes saved after the last full save:
+                        generation = meta.get("Generation", 0)
+                        changes = PlaylistJournal(path).read(generation)
+                        for change in changes:
+                            new_playlist._apply(change, trusted)
+                        new_playlist._start_tracking(path, generation, len(changes))
                     else:
                         logging.warning("Not a valid MML-Playlist file: {}".format(path))
                         return None
-            except Exception as e:
-                logging.error("Could not read file: {}".format(path))
-                return None
+                except Exception as e:
+                    logging.error("Could not read file: {}".format(path))
+                    return None
 
             logging.info("Playlist loaded successfully!")
             return new_playlist
         else:
             raise TypeError("Playlist.path must be a valid OS Path!")
 
+    @staticmethod
+    def load_meta(path):
+        """
+        Reads only the "meta" header of a JSON-Playlist (or binary .mmlp) file,
+        without creating any of its Songs
+
+        The header is written by Playlist.save() at the start of the file,
+        for JSON files without "Songs" and "Length" in it (older ones),
+        the whole file is parsed to count them
+
+        :param path: can be absolute or relative, but must point to a valid .json or .mmlp
+        :type  path: Path
+        :type  path: str
+
+        :return {"name": str, "path": Path, "songs": int, "length": int (seconds)}
+             or None if the file is not a valid MML-Playlist file
+        :rtype  dict
+        """
+
+        path = Playlist.file_path(path)
+
+        try:
+            if path.suffix == PlaylistBinary.suffix:
+                meta = PlaylistBinary.read_meta(path)
+            else:
+                meta = Playlist._load_json_meta(path)
+        except Exception as e:
+            logging.error("Could not read file: {} "
+                          "Error: {}".format(path, e))
+            return None
+
+        if not isinstance(meta, dict) or meta.get("Is MyLibrary Playlist") != "yes":
+            logging.warning("Not a valid MML-Playlist file: {}".format(path))
+            return None
+
+        # the header is outdated, if there are changes in the journal:
+        journal_meta = PlaylistJournal(path).last_meta(meta.get("Generation", 0))
+        if journal_meta is not None:
+            meta["Songs"], meta["Length"] = journal_meta
+
+        # always written to a .mmlp file (the Songs are counted for a JSON file without them):
+        try:
+            songs, length = int(meta["Songs"]), int(meta["Length"])
+        except (KeyError, TypeError, ValueError):
+            logging.warning("Not a valid MML-Playlist file: {}".format(path))
+            return None
+
+        return {"name": path.stem,
+                "path": path,
+                "songs": songs,
+                "length": length}
+
+    @staticmethod
+    def _load_json_meta(path):
+        """
+        Internal use
+
+        :return the "meta" header of a JSON-Playlist file (see load_meta())
+        :rtype  dict
+        """
+
+        with open(path, 'r') as json_file:
+            head = json_file.read(Playlist._meta_read_size)
+            meta = None
+            match = Playlist._meta_start.match(head)
+            if match:
+                try:
+                    meta = json.JSONDecoder().raw_decode(head, match.end())[0]
+                except ValueError:
+                    # the header is bigger than what was read:
+                    pass
+
+            if meta is None or "Songs" not in meta or "Length" not in meta:
+                json_file.seek(0)
+                data = json.load(json_file)
+                meta = dict(data.get("meta", {}))
+                songs = data.get("songs", [])
+                meta["Songs"] = len(songs)
+                meta["Length"] = sum(int(float(song["length"])) for song in songs)
+        return meta
+
     def name(self):
         """
         :return name
@@ -225,7 +537,11 @@ class Playlist:
 
         if isinstance(index, int):
             if 0 <= index < len(self):
+                del self._index[self.songs[index].path()]
+                self._total_seconds -= int(self.songs[index].length())
                 del self.songs[index]
+                self._reindex(index)
+                self._track({"op": "remove", "index": index})
                 # if the last Song was previously marked and is now deleted:
                 if self.current_song_index == len(self):
                     self.current_song_index -= 1
@@ -234,54 +550,162 @@ class Playlist:
         else:
             raise TypeError("An index must be of type int!!!")
 
-    def save(self, path):
+    def remove_songs(self, paths):
+        """
+        Remove all Songs with the given paths at once
+
+        The Songs are found by their paths (see index_of()),
+        only the Songs after the first removed one are moved and re-indexed
+
+        'current_song_index' stays on the same Song, if it's not removed
+        Else -> it's moved to the Song which took its place
+
+        :param paths: the paths of the audio files
+        :type  paths: set of str
+
+        :return number of removed Songs
+        :rtype  int
+        """
+
+        paths = set(str(path) for path in paths)
+        positions = sorted(self._index.pop(path) for path in paths if path in self._index)
+        if not positions:
+            return 0
+
+        first = positions[0]
+        kept_songs = []
+        for song in self.songs[first:]:
+            if song.path() in paths:
+                self._total_seconds -= int(song.length())
+            else:
+                kept_songs.append(song)
+        self.songs[first:] = kept_songs
+        self._reindex(first)
+        self._track({"op": "remove_paths", "paths": sorted(paths)})
+
+        # the removed Songs before it:
+        self.current_song_index -= bisect_left(positions, self.current_song_index)
+        self.current_song_index = min(self.current_song_index, len(self) - 1)
+        return len(positions)
+
+    def replace_song(self, song):
+        """
+        Replace the Song with the same path (e.g. with its re-read tags)
+
+        :param song:
+        :type  song: Song object
+
+        :return True if a Song was replaced
+        :rtype  Bool
+
+        :raise TypeError if 'song' is not a Song object
+        """
+
+        if isinstance(song, Song):
+            if song.path() in self._index:
+                index = self._index[song.path()]
+                self._total_seconds += int(song.length()) - int(self.songs[index].length())
+                self.songs[index] = song
+                self._track({"op": "replace", "song": self._song_record(song)})
+                return True
+            return False
+        else:
+            raise TypeError("Only MML-Song objects can be added to the Playlist!!!")
+
+    def save(self, path, compact=False, binary=False):
         """
         Saves the Playlist to a specified DIRECTORY in a .json format
 
         Creates the .json file, its directory and their parents, if needed
 
+        With 'binary' -> in a compact binary format ('playlist_name.mmlp')
+        instead, faster to save and load and smaller for big Playlists.
+        Every string shared by many Songs (an artist, an album, a directory)
+        is stored only once. JSON stays the format to import and export.
+
+        If the Playlist was already saved to (or loaded from) the same file,
+        only the changes since then are appended to its journal
+        ('playlist_name.journal'). The whole .json file is rewritten,
+        when 'compact' is True or the journal has 'compact_after' changes.
+        The .json file is replaced atomically, it's never partially written.
+
         :param path:
         :type  path: Path
         :type  path: str
 
+        :param Bool compact: always rewrite the whole .json file
+        :param Bool binary:  save a .mmlp file instead of a .json
+
+        :return the path of the saved .json (or .mmlp) file
+        :rtype  Path
+
         :raise  TypeError
         """
 
         if isinstance(path, (str, Path)):
             path = Path(path).absolute().resolve()
-            data = {"meta": {}, "songs": []}
 
             # create the os-PATH with any possible Parents, if not existent already:
             path.mkdir(parents=True, exist_ok=True)
 
             # create the string-PATH 'path/playlist_name.json':"""
-            file_name = str(self._name).replace(' ', '-') + ".json"
+            file_name = str(self._name).replace(' ', '-') + (PlaylistBinary.suffix if binary else ".json")
             path = path.joinpath(file_name)
 
-            # create the FILE 'path/playlist_name.json, if not existent already:
-            path.touch(exist_ok=True)
-
-            data["meta"].update({"Is MyLibrary Playlist": "yes"})
-            # TODO: maybe not necessary?:
-            data["meta"].update({"Path": str(path)})
-
-            for song in self.songs:
-                data["songs"].append({
-                    "title": song.title(),
-                    "artist": song.artist(),
-                    "album": song.album(),
-                    "length": song.length(),
-                    "path": song.path()
-                })
+            if not compact and self._changes is not None and self._saved_path == path and \
+                    self._journal_size + len(self._changes) < self.compact_after and path.is_file():
+                if self._changes:
+                    logging.info("Saving {} changes of MML-Playlist to: {}".format(len(self._changes), path))
+                    with metrics.timer("mml_playlist_save_seconds", mode="journal"):
+                        PlaylistJournal(path).append(self._changes, self._generation,
+                                                     len(self.songs), self.total_seconds())
+                    self._journal_size += len(self._changes)
+                    self._changes = []
+                return path
+
+            with metrics.timer("mml_playlist_save_seconds", mode="full"):
+                # a new, unique generation makes any lines left in the journal outdated,
+                # even if the journal could not be removed after the rename:
+                generation = time.time_ns()
+                data = {"meta": {}, "songs": []}
+
+                data["meta"].update({"Is MyLibrary Playlist": "yes"})
+                # TODO: maybe not necessary?:
+                data["meta"].update({"Path": str(path)})
+                # read by Playlist.load_meta(), without loading the Songs:
+                data["meta"].update({"Songs": len(self.songs)})
+                data["meta"].update({"Length": self.total_seconds()})
+                data["meta"].update({"Generation": generation})
 
-            with open(path, 'w') as json_file:
                 logging.info("Saving MML-Playlist to: {}".format(path))
-                json.dump(data, json_file, indent=2)
-                logging.info("Playlist saved successfully!")
+                if binary:
+                    PlaylistBinary.write(path, data["meta"],
+                                         [(song.title(), song.artist(), song.album(), song.length(), song.path())
+                                          for song in self.songs])
+                else:
+                    for song in self.songs:
+                        data["songs"].append(self._song_record(song))
+                    write_json_atomic(path, data)
+                PlaylistJournal(path).remove()
+                self._start_tracking(path, generation, 0)
+            logging.info("Playlist saved successfully!")
+            return path
 
         else:
             raise TypeError("Playlist.path must be a valid OS Path!")
 
+    def _start_tracking(self, path, generation, journal_size):
+        """
+        Internal use
+
+        The Playlist is now in sync with 'path' and its journal
+        """
+
+        self._changes = []
+        self._saved_path = path
+        self._generation = generation
+        self._journal_size = journal_size
+
     def set_name(self, name):
         """
         Sets a new name for the current Playlist object
@@ -324,6 +748,9 @@ class Playlist:
             else:
                 songs_tuple = self.songs[index_1], self.songs[index_2]
                 self.songs[index_2], self.songs[index_1] = songs_tuple
+                self._index[self.songs[index_1].path()] = index_1
+                self._index[self.songs[index_2].path()] = index_2
+                self._track({"op": "swap", "index_1": index_1, "index_2": index_2})
                 return True
         else:
             raise TypeError("An index must be of type int!!!")
@@ -339,11 +766,29 @@ class Playlist:
         :rtype  str
         """
 
-        pretty_str = ""
-        total_seconds = 0
+        return self.length_pretty(self.total_seconds())
+
+    def total_seconds(self):
+        """
+        :return the total length of the Songs in seconds
+        :rtype  int
+        """
 
-        for song in self.songs:
-            total_seconds += int(song.length())
+        return self._total_seconds
+
+    @staticmethod
+    def length_pretty(total_seconds):
+        """
+        Convert a length in seconds in a pretty-string (see total_length())
+
+        :param int total_seconds:
+
+        :return hours:minutes:seconds
+             or       minutes:seconds
+        :rtype  str
+        """
+
+        pretty_str = ""
 
         hours = total_seconds // 3600
         if hours > 0:
@@ -0,0 +1,204 @@
+"""
+    Part of MML-client
+
+    Exports class: PlaylistCache
+"""
+
+import logging
+from collections import OrderedDict
+from bin.metrics import metrics
+from bin.playlist import Playlist
+
+
+class PlaylistCache:
+    """
+        Part of MML-client
+
+        In-memory LRU cache of loaded Playlist objects,
+        keyed by the path of their .json file
+
+        A cached Playlist is loaded again, when the mtime
+        of its file is different from the one it was loaded with
+
+        The hits and misses are counted on /metrics too
+        ("mml_playlist_cache_hits_total", "mml_playlist_cache_misses_total")
+
+        Instance attributes:
+            hits
+            misses
+            max_size
+
+        Instance methods:
+            clear()
+            get(path)
+            invalidate(path)
+            load(path)
+            put(playlist, path)
+            stats()
+    """
+
+    def __init__(self, max_size=8, trusted=False):
+        """
+        :param int max_size: Max number of cached Playlists.   default = 8
+
+        :param Bool trusted: the Playlist files were written by Playlist.save(),
+                             see Playlist.load(trusted=True)
+        """
+
+        if not isinstance(max_size, int) or isinstance(max_size, bool):
+            raise TypeError("PlaylistCache.max_size must be a valid Int!")
+        elif max_size < 1:
+            raise ValueError("PlaylistCache.max_size must be a positive Int!")
+
+        self.max_size = max_size
+        self.trusted = trusted
+        self.hits = 0
+        self.misses = 0
+        # path -> (mtime_ns, Playlist), the least recently used first:
+        self._playlists = OrderedDict()
+
+    def __len__(self):
+        """
+        :return number of cached Playlists
+        :rtype  int
+        """
+
+        return len(self._playlists)
+
+    @staticmethod
+    def _key(path):
+        """
+        Internal use
+
+        The same path, as used by Playlist.load()
+        """
+
+        return Playlist.file_path(path)
+
+    @staticmethod
+    def _mtime(path):
+        """
+        Internal use
+        """
+
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def clear(self):
+        """
+        Removes all cached Playlists, the counters are NOT reset
+        """
+
+        self._playlists.clear()
+
+    def get(self, path):
+        """
+        Returns the cached Playlist, or loads it with Playlist.load()
+
+        :param path: can be absolute or relative, with or without the .json (or .mmlp) suffix
+        :type  path: Path
+        :type  path: str
+
+        :return the Playlist or None (see Playlist.load())
+        :rtype  Playlist object
+
+        :raise TypeError (see Playlist.load())
+        """
+
+        return self.load(path)[0]
+
+    def load(self, path):
+        """
+        Same as get(), but also tells if the Playlist was loaded from its file
+
+        :param path: can be absolute or relative, with or without the .json (or .mmlp) suffix
+        :type  path: Path
+        :type  path: str
+
+        :return (Playlist or None, loaded) - 'loaded' is True on a cache miss
+        :rtype  tuple
+
+        :raise TypeError (see Playlist.load())
+        """
+
+        key = self._key(path)
+        mtime = self._mtime(key)
+        cached = self._playlists.get(key)
+
+        if cached is not None and mtime is not None and cached[0] == mtime:
+            self.hits += 1
+            metrics.inc("mml_playlist_cache_hits_total")
+            self._playlists.move_to_end(key)
+            return cached[1], False
+
+        self.misses += 1
+        metrics.inc("mml_playlist_cache_misses_total")
+        if cached is not None:
+            # the file was modified (or deleted) by someone else:
+            logging.info("Cached Playlist is outdated: {}".format(key))
+            del self._playlists[key]
+
+        playlist = Playlist.load(key, trusted=self.trusted)
+        if playlist is not None and mtime is not None:
+            self._store(key, mtime, playlist)
+        return playlist, True
+
+    def invalidate(self, path):
+        """
+        Removes a Playlist from the cache (e.g. when its file is deleted)
+
+        :return True if the Playlist was cached
+        :rtype  Bool
+        """
+
+        return self._playlists.pop(self._key(path), None) is not None
+
+    def put(self, playlist, path):
+        """
+        Caches a Playlist, which was just saved to 'path' (see Playlist.save()),
+        with the new mtime of the file, so it's not loaded again
+
+        :param playlist:
+        :type  playlist: Playlist object
+
+        :param path: the saved .json (or .mmlp) file
+        :type  path: Path
+        :type  path: str
+
+        :raise TypeError if 'playlist' is not a Playlist object
+        """
+
+        if not isinstance(playlist, Playlist):
+            raise TypeError("Only MML-Playlist objects can be cached!!!")
+
+        key = self._key(path)
+        mtime = self._mtime(key)
+        if mtime is None:
+            self._playlists.pop(key, None)
+        else:
+            self._store(key, mtime, playlist)
+
+    def _store(self, key, mtime, playlist):
+        """
+        Internal use
+
+        Evicts the least recently used Playlist, when the cache is full
+        """
+
+        self._playlists[key] = (mtime, playlist)
+        self._playlists.move_to_end(key)
+        while len(self._playlists) > self.max_size:
+            self._playlists.popitem(last=False)
+
+    def stats(self):
+        """
+        :return {"hits": int, "misses": int, "size": int, "max_size": int}
+        :rtype  dict
+        """
+
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._playlists),
+                "max_size": self.max_size}
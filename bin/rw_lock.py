@@ -0,0 +1,94 @@
+"""
+    Part of MML-client
+
+    Exports class: RWLock
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    """
+        Part of MML-client
+
+        Reader-writer lock - any number of threads can hold it for reading
+        at the same time, a thread holding it for writing excludes all others
+
+        Waiting writers are preferred -> new readers wait for them,
+        so a steady stream of readers can not starve a writer
+
+        The thread holding it for writing can take it again (for reading
+        or writing), a thread holding it only for reading can NOT take it again
+
+        Instance methods:
+            read()
+            write()
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        """
+        Holds the lock for reading, for the duration of a 'with' block
+        """
+
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                # already held for writing by this thread:
+                self._writer_depth += 1
+            else:
+                while self._writer is not None or self._writers_waiting:
+                    self._condition.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            self._release(me)
+
+    @contextmanager
+    def write(self):
+        """
+        Holds the lock for writing, for the duration of a 'with' block
+        """
+
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+            else:
+                self._writers_waiting += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._condition.wait()
+                finally:
+                    self._writers_waiting -= 1
+                self._writer = me
+                self._writer_depth = 1
+        try:
+            yield
+        finally:
+            self._release(me)
+
+    def _release(self, me):
+        """
+        Internal use
+        """
+
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth -= 1
+                if self._writer_depth == 0:
+                    self._writer = None
+                    self._condition.notify_all()
+            else:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
@@ -0,0 +1,221 @@
+"""
+    Part of MML-client
+
+    Exports class: SearchIndex
+"""
+
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from bin.song import Song
+
+
+class SearchIndex:
+    """
+        Part of MML-client
+
+        In-memory inverted index over the title, artist and album of Songs
+
+        Every word of a query matches the Songs with a word starting
+        with it (case-insensitive), a Song must match all words of the query
+
+        The Songs of every word are kept sorted by title -> a search reads
+        them in the order they are returned and stops after 'limit' Songs
+
+        Instance methods:
+            add_song(song)
+            add_songs(songs_list)
+            remove_songs(paths)
+            search(query, limit=50)
+
+        Static methods:
+            tokenize(text)
+    """
+
+    _word = re.compile(r"\w+")
+
+    def __init__(self, songs_list=()):
+        """
+        :param songs_list: Songs to be indexed
+        :type  songs_list: list of Song objects
+        """
+
+        # Song path -> Song:
+        self._songs = {}
+        # Song path -> the words of the Song:
+        self._song_words = {}
+        # Song path -> the key, by which the found Songs are sorted:
+        self._sort_keys = {}
+        # word -> sort keys of the Songs with this word, sorted:
+        self._postings = {}
+        # all indexed words, sorted -> the words with a prefix are next to each other:
+        self._words = []
+        self._lock = threading.Lock()
+
+        self.add_songs(songs_list)
+
+    def __len__(self):
+        """
+        :return number of indexed Songs
+        :rtype  int
+        """
+
+        return len(self._songs)
+
+    @staticmethod
+    def tokenize(text):
+        """
+        :return the lower case words in 'text'
+        :rtype  list of str
+        """
+
+        return SearchIndex._word.findall(text.lower())
+
+    def add_song(self, song):
+        """
+        Indexes a Song, a Song with the same path is replaced
+
+        :raise TypeError if 'song' is not a Song object
+        """
+
+        self.add_songs([song])
+
+    def add_songs(self, songs_list):
+        """
+        Indexes the Songs, Songs with the same paths are replaced
+
+        :raise TypeError if anything from the 'songs_list' is not a Song object
+        """
+
+        with self._lock:
+            new_words = set()
+            # the words, whose Songs were appended (not inserted in order) in this batch:
+            unsorted = set()
+            try:
+                for song in songs_list:
+                    if not isinstance(song, Song):
+                        raise TypeError("Only MML-Song objects can be indexed!!!")
+                    path = song.path()
+                    if path in self._songs:
+                        self._remove(path, unsorted)
+
+                    words = frozenset(self.tokenize(" ".join((song.title(), song.artist(), song.album()))))
+                    sort_key = (song.title().lower(), path)
+                    self._songs[path] = song
+                    self._song_words[path] = words
+                    self._sort_keys[path] = sort_key
+                    for word in words:
+                        sort_keys = self._postings.get(word)
+                        if sort_keys is None:
+                            self._postings[word] = [sort_key]
+                            new_words.add(word)
+                        else:
+                            sort_keys.append(sort_key)
+                            unsorted.add(word)
+            finally:
+                # a single sort per word (nearly sorted -> linear), instead of inserting the Songs one by one:
+                # (a word of a Song replaced within the same batch could be gone already)
+                for word in unsorted:
+                    if word in self._postings:
+                        self._postings[word].sort()
+
+                # a single sort of all new words, instead of inserting them one by one:
+                new_words = [word for word in new_words if word in self._postings]
+                if new_words:
+                    self._words.extend(new_words)
+                    self._words.sort()
+
+    def remove_songs(self, paths):
+        """
+        Removes the Songs with the given paths from the index
+
+        :param paths: the paths of the audio files
+        :type  paths: iterable of str
+        """
+
+        with self._lock:
+            for path in paths:
+                if str(path) in self._songs:
+                    self._remove(str(path))
+
+    def _remove(self, path, unsorted=()):
+        """
+        Internal use
+
+        'unsorted' - the words, whose Songs are not sorted yet (see add_songs())
+        """
+
+        del self._songs[path]
+        sort_key = self._sort_keys.pop(path)
+        for word in self._song_words.pop(path):
+            sort_keys = self._postings[word]
+            if word in unsorted:
+                sort_keys.remove(sort_key)
+            else:
+                del sort_keys[bisect_left(sort_keys, sort_key)]
+            if not sort_keys:
+                del self._postings[word]
+                # a word added by the running add_songs() is not in '_words' yet:
+                position = bisect_left(self._words, word)
+                if position < len(self._words) and self._words[position] == word:
+                    del self._words[position]
+
+    def _prefix_range(self, prefix):
+        """
+        Internal use
+
+        :return (start, end) of the words starting with 'prefix' in '_words'
+        :rtype  tuple
+        """
+
+        start = bisect_left(self._words, prefix)
+        # every word starting with 'prefix' sorts before 'prefix' + the max char:
+        end = bisect_left(self._words, prefix + "\U0010ffff", start)
+        return start, end
+
+    def search(self, query, limit=50):
+        """
+        :param str query: words, or starts of words, to be found
+        :param int limit: max number of returned Songs
+
+        :return the matching Songs, sorted by title
+        :rtype  list of Song objects
+        """
+
+        terms = set(self.tokenize(query))
+        if not terms or limit < 1:
+            return []
+
+        with self._lock:
+            # the term matching the fewest Songs is looked up in the index,
+            # the Songs found for it are then checked for the rest of the terms:
+            matches = {term: [self._postings[word] for word in self._words[slice(*self._prefix_range(term))]]
+                       for term in terms}
+            rarest = min(terms, key=lambda term: sum(map(len, matches[term])))
+            other_terms = terms - {rarest}
+
+            found = []
+            last_key = None
+            # the Songs of all words starting with the term, sorted by title
+            # -> the lists are merged, only until 'limit' Songs are found:
+            heap = [(sort_keys[0], number, 0, sort_keys) for number, sort_keys in enumerate(matches[rarest])]
+            heapq.heapify(heap)
+            while heap:
+                sort_key, number, position, sort_keys = heap[0]
+                if position + 1 < len(sort_keys):
+                    heapq.heapreplace(heap, (sort_keys[position + 1], number, position + 1, sort_keys))
+                else:
+                    heapq.heappop(heap)
+
+                # a Song with more than one word starting with the term:
+                if sort_key == last_key:
+                    continue
+                last_key = sort_key
+                # the sort key ends with the path of the Song:
+                path = sort_key[-1]
+                if all(any(word.startswith(term) for word in self._song_words[path]) for term in other_terms):
+                    found.append(self._songs[path])
+                    if len(found) == limit:
+                        break
+            return found
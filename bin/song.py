@@ -4,11 +4,12 @@
     Exports class: Song
 """
 
-from datetime import time
 import logging
+import sys
 from pathlib import Path
 from mutagen import MutagenError
-from mutagen.mp3 import EasyMP3
+from bin.decoders import find_decoder
+from bin.metrics import metrics
 
 
 class Song:
@@ -17,6 +18,10 @@ class Song:
 
         Does NOT contain the actual audio file, only its Path
 
+        Uses '__slots__', the length in seconds as an 'int' and the path
+        as a 'str' and interns the artist and album strings (shared by
+        many Songs), to keep big libraries small in memory
+
         Instance methods:
             album()
             artist()
@@ -31,9 +36,12 @@ class Song:
             set_title(title)
 
         Static methods:
+            from_record(title, artist, album, length, path)
             load(path)
     """
 
+    __slots__ = ("_title", "_artist", "_album", "_length", "_path")
+
     def __init__(self, title="Unknown", artist="Unknown", album="Unknown", length="0", path=""):
         """
         :param str title:  The title of the Song.               default = "Unknown"
@@ -59,22 +67,28 @@ class Song:
         self.set_artist(artist)
         self._album = ""
         self.set_album(album)
-        self._length = time(hour=0, minute=0, second=0)
+        self._length = 0
         self.set_length(length)
-        self._path = Path(path).absolute().resolve()
+        self._path = str(Path(path).absolute().resolve())
 
     def __bool__(self):
         """
         Currently only checks if all of the attributes are set.
         """
 
-        if self._title and self._artist and self._album and self._length and self._path:
+        if self._title and self._artist and self._album and self._path:
             return True
         return False
 
     def __eq__(self, song):
         """Two Song objects are equal, when their OS Paths are equal (they point to the same audio file)"""
-        return self.path() == song.path()
+        if not isinstance(song, Song):
+            return NotImplemented
+        return self._path == song._path
+
+    def __hash__(self):
+        """Matches '__eq__' -> only the OS Path is hashed (do NOT 'set_path()' while the Song is in a set)"""
+        return hash(self._path)
 
     def album(self):
         """
@@ -96,36 +110,14 @@ class Song:
         """
         For use when writing (saving) to a Playlist file
 
-        Converts the inner 'time' object representing the
+        Converts the inner 'int' representing the
         'length' attribute to a 'str' object of the length in seconds
 
         :return length
         :rtype  str
         """
 
-        seconds = 0
-        if self._length.second:
-            seconds += self._length.second
-        if self._length.minute:
-            seconds += self._length.minute * 60
-        if self._length.hour:
-            seconds += self._length.minute * 60
-        return str(seconds)
-
-    @staticmethod
-    def _length_from_str(seconds):
-        """
-        Internal use
-        """
-
-        hours = seconds // 3600
-
-        seconds %= 3600
-        minutes = seconds // 60
-
-        seconds %= 60
-
-        return time(hour=hours, minute=minutes, second=seconds)
+        return str(self._length)
 
     def length_pretty(self, hours=False, minutes=False, seconds=False):
         """
@@ -144,22 +136,55 @@ class Song:
         :rtype  str
         """
 
+        length_hours, length_seconds = divmod(self._length, 3600)
+        length_minutes, length_seconds = divmod(length_seconds, 60)
+
         str_time = ""
         if hours:
-            str_time += str(self._length.hour) + ":"
+            str_time += str(length_hours) + ":"
         if minutes:
-            if self._length.minute < 10:
+            if length_minutes < 10:
                 str_time += "0"
-            str_time += str(self._length.minute)
+            str_time += str(length_minutes)
         if seconds:
-            if self._length.second < 10:
-                str_time += ":0" + str(self._length.second)
+            if length_seconds < 10:
+                str_time += ":0" + str(length_seconds)
             else:
-                str_time += ":" + str(self._length.second)
+                str_time += ":" + str(length_seconds)
         if str_time == "":
-            str_time = "{}:{}:{}".format(self._length.hour, self._length.minute, self._length.second)
+            str_time = "{}:{}:{}".format(length_hours, length_minutes, length_seconds)
         return str_time
 
+    @staticmethod
+    def from_record(title, artist, album, length, path):
+        """
+        Creates a Song object from already validated data
+        (e.g. saved by Playlist.save() or cached by a TagCache)
+
+        Unlike the constructor, nothing is checked, converted or
+        resolved on the filesystem -> much faster for big Playlists,
+        but the audio file could be missing (see Playlist.check_songs())
+
+        :param str title:
+        :param str artist:
+        :param str album:
+        :param length: The length of the Song in whole seconds
+        :type  length: str
+        :type  length: int
+        :param str path: The absolute, resolved path of the audio file
+
+        :return the new Song
+        :rtype  Song object
+        """
+
+        song = Song.__new__(Song)
+        song._title = title
+        song._artist = sys.intern(artist)
+        song._album = sys.intern(album)
+        song._length = int(length)
+        song._path = path
+        return song
+
     @staticmethod
     def load(path):
         """
@@ -185,36 +210,38 @@ class Song:
         if not path.exists() or not path.is_file():
             raise ValueError("Song.path must be a valid OS File-Path or a Path-convertible String!")
 
-        try:
-            temp_song = Song()
-            audio_file = EasyMP3(path)
+        decoder = find_decoder(path)
+        if decoder is None:
+            logging.warning("Audio file format not supported: {}".format(path))
+            metrics.inc("mml_tag_parse_failures_total")
+            return None
+
+        with metrics.timer("mml_tag_parse_seconds"):
+            try:
+                temp_song = Song()
+                tags, length = decoder.read_info(path)
 
-            if audio_file is not None and audio_file.tags is not None:
-                # NOTE: the '[0]' in 'song_file.tags[...][0]'
-                # is because the default return value is a single-item LIST.
-                # This way, we avoid the '[...]' brackets in the Song's attributes
-                if "title" in audio_file.tags:
-                    temp_song.set_title(str(audio_file.tags["title"][0]))
-                else:
-                    temp_song.set_title(path.stem)
+                if tags is not None:
+                    temp_song.set_title(tags.get("title") or path.stem)
 
-                if "artist" in audio_file.tags:
-                    temp_song.set_artist(str(audio_file.tags["artist"][0]))
+                    if tags.get("artist"):
+                        temp_song.set_artist(tags["artist"])
 
-                if "album" in audio_file.tags:
-                    temp_song.set_album(str(audio_file.tags["album"][0]))
+                    if tags.get("album"):
+                        temp_song.set_album(tags["album"])
 
-                if temp_song.length() == "0":
-                    temp_song.set_length(audio_file.info.length)
+                    if temp_song.length() == "0":
+                        temp_song.set_length(length)
 
-                temp_song.set_path(path)
+                    temp_song.set_path(path)
 
-                logging.info("Audio file loaded: {}".format(temp_song.path()))
-                return temp_song
+                    logging.info("Audio file loaded: {}".format(temp_song.path()))
+                    return temp_song
 
-        except MutagenError as e:
-            logging.error("Audio file could NOT be loaded: {}"
-                          "Error: {}".format(path, e))
+            except (MutagenError, OSError) as e:
+                logging.error("Audio file could NOT be loaded: {}"
+                              "Error: {}".format(path, e))
+        metrics.inc("mml_tag_parse_failures_total")
         return None
 
     def path(self):
@@ -223,7 +250,7 @@ class Song:
         :rtype  str
         """
 
-        return str(self._path)
+        return self._path
 
     def title(self):
         """
@@ -251,7 +278,7 @@ class Song:
         elif album == "":
             raise ValueError("Song.album cannot be an empty String!")
         else:
-            self._album = album
+            self._album = sys.intern(album)
             return True
 
     def set_artist(self, artist):
@@ -272,7 +299,7 @@ class Song:
         elif artist == "":
             raise ValueError("Song.artist cannot be an empty String!")
         else:
-            self._artist = artist
+            self._artist = sys.intern(artist)
             return True
 
     def set_length(self, length):
@@ -301,7 +328,7 @@ class Song:
         if length < 0:
             raise ValueError("Song.length cannot be a negative value!")
         else:
-            self._length = self._length_from_str(int(length))
+            self._length = int(length)
         return True
 
     def set_path(self, path):
@@ -323,7 +350,7 @@ class Song:
         else:
             path = Path(path).absolute().resolve()
             if path.exists() and path.is_absolute() and path.is_file():
-                self._path = path
+                self._path = str(path)
                 return True
             else:
                 raise ValueError("Song.path must be a valid OS Path to a file!")
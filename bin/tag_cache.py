@@ -0,0 +1,285 @@
+"""
+    Part of MML-client
+
+    Exports class: TagCache
+"""
+
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class TagCache:
+    """
+        Part of MML-client
+
+        On-disk (SQLite) cache of the tags of already loaded audio files,
+        so they are parsed again only when their mtime or size change
+
+        An error of the database (e.g. locked, or the disk is full) is logged,
+        the App goes on without the cache (a read returns nothing, a write is lost)
+
+        A record is a tuple: (mtime_ns, size, title, artist, album, length)
+        'title' is None for files, which could NOT be loaded as a Song
+
+        Also keeps the mtime of the scanned directories (see Crawler.find_songs())
+        and the seek indexes of the played audio files (see Decoder.seek_index())
+        and the content hashes of the audio files (see ContentIndex)
+
+        Instance methods:
+            dirs(root)
+            evict(paths)
+            hashes()
+            records(paths=None)
+            replace_dirs(root, dirs)
+            seek_index(path)
+            update(entries)
+            update_hashes(entries)
+            update_seek_index(path, mtime_ns, size, data)
+    """
+
+    file_name = "tags.sqlite"
+    _max_params = 500
+
+    def __init__(self, path):
+        """
+        :param path: The directory of the cache file, created if needed
+        :type  path: str
+        :type  path: Path
+        """
+
+        if not isinstance(path, (str, Path)):
+            raise TypeError("TagCache.path must be a valid OS Path or a Path-convertible String!")
+
+        path = Path(path).absolute().resolve()
+        path.mkdir(parents=True, exist_ok=True)
+        self.path = path.joinpath(self.file_name)
+
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS songs ("
+                               "path TEXT PRIMARY KEY, "
+                               "mtime_ns INTEGER NOT NULL, "
+                               "size INTEGER NOT NULL, "
+                               "title TEXT, "
+                               "artist TEXT, "
+                               "album TEXT, "
+                               "length TEXT)")
+            connection.execute("CREATE TABLE IF NOT EXISTS dirs ("
+                               "path TEXT PRIMARY KEY, "
+                               "mtime_ns INTEGER NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS seek_indexes ("
+                               "path TEXT PRIMARY KEY, "
+                               "mtime_ns INTEGER NOT NULL, "
+                               "size INTEGER NOT NULL, "
+                               "data BLOB NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS hashes ("
+                               "path TEXT PRIMARY KEY, "
+                               "mtime_ns INTEGER NOT NULL, "
+                               "size INTEGER NOT NULL, "
+                               "partial TEXT, "
+                               "full TEXT)")
+
+    @contextmanager
+    def _connect(self):
+        """
+        Internal use
+
+        A new connection (a single transaction) for every call,
+        so the cache can be used from any thread
+        """
+
+        connection = sqlite3.connect(str(self.path))
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _under(root):
+        """
+        Internal use
+
+        :return the WHERE clause and its parameters for 'root' and the directories in it
+        :rtype  tuple
+        """
+
+        prefix = os.path.join(str(root), "")
+        return "path = ? OR substr(path, 1, ?) = ?", (str(root), len(prefix), prefix)
+
+    def dirs(self, root):
+        """
+        :param str root: the scanned directory
+
+        :return directory -> mtime_ns of 'root' and the directories in it, saved by replace_dirs()
+        :rtype  dict
+        """
+
+        where, params = self._under(root)
+        try:
+            with self._connect() as connection:
+                return dict(connection.execute("SELECT path, mtime_ns FROM dirs WHERE " + where, params))
+        except sqlite3.Error as e:
+            logging.error("Could not read the tag cache: {} "
+                          "Error: {}".format(self.path, e))
+            return {}
+
+    def replace_dirs(self, root, dirs):
+        """
+        Replaces the saved directories under 'root' in a single transaction
+
+        :param str  root: the scanned directory
+        :param dict dirs: directory -> mtime_ns
+        """
+
+        where, params = self._under(root)
+        try:
+            with self._connect() as connection:
+                connection.execute("DELETE FROM dirs WHERE " + where, params)
+                connection.executemany("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)",
+                                       ((str(path), mtime_ns) for path, mtime_ns in dirs.items()))
+        except sqlite3.Error as e:
+            logging.error("Could not write the tag cache: {} "
+                          "Error: {}".format(self.path, e))
+
+    def evict(self, paths):
+        """
+        Removes the records of the given audio files
+
+        :param paths: the paths of the audio files (e.g. deleted ones)
+        :type  paths: iterable of str
+        """
+
+        paths = [(str(path),) for path in paths]
+        if paths:
+            try:
+                with self._connect() as connection:
+                    connection.executemany("DELETE FROM songs WHERE path = ?", paths)
+                    connection.executemany("DELETE FROM seek_indexes WHERE path = ?", paths)
+                    connection.executemany("DELETE FROM hashes WHERE path = ?", paths)
+                logging.info("Evicted {} entries from the tag cache".format(len(paths)))
+            except sqlite3.Error as e:
+                logging.error("Could not write the tag cache: {} "
+                              "Error: {}".format(self.path, e))
+
+    def hashes(self):
+        """
+        Reads all content hashes with a single query
+
+        :return path -> (mtime_ns, size, partial, full), a hash is None if it was not computed
+        :rtype  dict
+        """
+
+        try:
+            with self._connect() as connection:
+                return {row[0]: row[1:] for row in
+                        connection.execute("SELECT path, mtime_ns, size, partial, full FROM hashes")}
+        except sqlite3.Error as e:
+            logging.error("Could not read the tag cache: {} "
+                          "Error: {}".format(self.path, e))
+            return {}
+
+    def records(self, paths=None):
+        """
+        Reads the whole cache with a single query,
+        or only the records of the given audio files
+
+        :param paths: the paths of the audio files, None for all of them
+        :type  paths: iterable of str
+
+        :return path -> (mtime_ns, size, title, artist, album, length)
+        :rtype  dict
+        """
+
+        query = "SELECT path, mtime_ns, size, title, artist, album, length FROM songs"
+        records = {}
+        try:
+            with self._connect() as connection:
+                if paths is None:
+                    records.update((row[0], row[1:]) for row in connection.execute(query))
+                else:
+                    paths = [str(path) for path in paths]
+                    # stay below the SQLite limit of parameters per query:
+                    for start in range(0, len(paths), self._max_params):
+                        chunk = paths[start:start + self._max_params]
+                        rows = connection.execute(query + " WHERE path IN ({})".format(", ".join("?" * len(chunk))),
+                                                  chunk)
+                        records.update((row[0], row[1:]) for row in rows)
+        except sqlite3.Error as e:
+            logging.error("Could not read the tag cache: {} "
+                          "Error: {}".format(self.path, e))
+        return records
+
+    def seek_index(self, path):
+        """
+        :param str path: the path of the audio file
+
+        :return (mtime_ns, size, data) saved by update_seek_index() or None
+        :rtype  tuple
+        """
+
+        try:
+            with self._connect() as connection:
+                return connection.execute("SELECT mtime_ns, size, data FROM seek_indexes WHERE path = ?",
+                                          (str(path),)).fetchone()
+        except sqlite3.Error as e:
+            logging.error("Could not read the tag cache: {} "
+                          "Error: {}".format(self.path, e))
+            return None
+
+    def update_hashes(self, entries):
+        """
+        Adds or replaces content hashes in a single transaction
+
+        :param entries: (path, (mtime_ns, size, partial, full))
+        :type  entries: iterable of tuples
+        """
+
+        rows = [(str(path),) + tuple(record) for path, record in entries]
+        if rows:
+            try:
+                with self._connect() as connection:
+                    connection.executemany("INSERT OR REPLACE INTO hashes (path, mtime_ns, size, partial, full) "
+                                           "VALUES (?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                logging.error("Could not write the tag cache: {} "
+                              "Error: {}".format(self.path, e))
+
+    def update_seek_index(self, path, mtime_ns, size, data):
+        """
+        Adds or replaces the seek index of an audio file
+
+        :param str   path:     the path of the audio file
+        :param int   mtime_ns: of the indexed audio file
+        :param int   size:     of the indexed audio file
+        :param bytes data:     the serialized index
+        """
+
+        try:
+            with self._connect() as connection:
+                connection.execute("INSERT OR REPLACE INTO seek_indexes (path, mtime_ns, size, data) "
+                                   "VALUES (?, ?, ?, ?)", (str(path), mtime_ns, size, data))
+        except sqlite3.Error as e:
+            logging.error("Could not write the tag cache: {} "
+                          "Error: {}".format(self.path, e))
+
+    def update(self, entries):
+        """
+        Adds or replaces records in a single transaction
+
+        :param entries: (path, (mtime_ns, size, title, artist, album, length))
+        :type  entries: iterable of tuples
+        """
+
+        rows = [(str(path),) + tuple(record) for path, record in entries]
+        if rows:
+            try:
+                with self._connect() as connection:
+                    connection.executemany("INSERT OR REPLACE INTO songs "
+                                           "(path, mtime_ns, size, title, artist, album, length) "
+                                           "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                logging.error("Could not write the tag cache: {} "
+                              "Error: {}".format(self.path, e))
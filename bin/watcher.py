@@ -0,0 +1,335 @@
+"""
+    Part of MML-client
+
+    Exports class: Watcher
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from pathlib import Path
+from stat import S_ISREG
+from bin.crawler import Crawler
+
+
+# inotify(7) event masks:
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+
+_IN_MASK = (_IN_CLOSE_WRITE | _IN_MODIFY | _IN_ATTRIB | _IN_CREATE | _IN_DELETE |
+            _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Watcher:
+    """
+        Part of MML-client
+
+        Watches a directory and its subdirectories (recursively, see Crawler.walk())
+        for added, removed and modified files of the given types. Uses inotify
+        on Linux (a watch for every directory, the new ones are watched as they
+        are created) and falls back to polling everywhere else.
+
+        The changes are batched and passed to 'callback' as three
+        sets of absolute paths (str): callback(added, removed, modified)
+        The callback is called from the Watcher's thread.
+
+        Instance methods:
+            start()
+            stop()
+    """
+
+    def __init__(self, path, callback, file_types=(".mp3",), interval=2.0, use_inotify=True):
+        """
+        :param path: The directory to be watched
+        :type  path: str
+        :type  path: Path
+
+        :param callable callback:    Called with (added, removed, modified)
+        :param tuple    file_types:  Only files with these suffixes are watched
+        :param float    interval:    Seconds between two polls / two batches of changes
+        :param Bool     use_inotify: False forces polling
+        """
+
+        self.path = Path(path).absolute().resolve()
+        self.mode = None
+        self._callback = callback
+        self._file_types = tuple(file_types)
+        self._interval = interval
+        self._use_inotify = use_inotify
+
+        # full path -> (mtime_ns, size) of the files currently in the directory tree:
+        self._files = {}
+        # inotify watch descriptor -> the full path of the watched directory:
+        self._watches = {}
+        self._root_wd = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _scan(self, path=None, dirs=None):
+        """
+        Internal use
+
+        :param str  path: the (sub)directory to scan, the watched one by default
+        :param dict dirs: filled with the full path -> mtime_ns of the directories in 'path'
+
+        :return full path -> (mtime_ns, size) of the watched files in 'path' and its subdirectories
+        :rtype  dict
+        """
+
+        path = str(self.path) if path is None else path
+        return {file: (mtime_ns, size) for file, mtime_ns, size in Crawler.walk(path, self._file_types, dirs)}
+
+    def _stat(self, file):
+        """
+        Internal use
+
+        :return (mtime_ns, size) of a single file or None if it's not there
+        :rtype  tuple
+        """
+
+        try:
+            stat = os.stat(file)
+        except OSError:
+            return None
+        if not S_ISREG(stat.st_mode):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _apply(self, files):
+        """
+        Internal use
+
+        Compares the current state of the 'files' (full paths)
+        with the known one and reports the differences
+        The cost depends only on the number of 'files'
+        """
+
+        added, removed, modified = set(), set(), set()
+        for file in files:
+            new_state = self._stat(file)
+            old_state = self._files.get(file)
+            if new_state == old_state:
+                continue
+
+            if new_state is None:
+                del self._files[file]
+                removed.add(file)
+            else:
+                self._files[file] = new_state
+                if old_state is None:
+                    added.add(file)
+                else:
+                    modified.add(file)
+        self._report(added, removed, modified)
+
+    def _report(self, added, removed, modified):
+        """
+        Internal use
+        """
+
+        if added or removed or modified:
+            logging.info("Changes in {}: {} added, {} removed, {} modified".format(self.path,
+                                                                                   len(added),
+                                                                                   len(removed),
+                                                                                   len(modified)))
+            try:
+                self._callback(added, removed, modified)
+            except Exception as e:
+                logging.error("Could not apply the changes in {} "
+                              "Error: {}".format(self.path, e))
+
+    def _inotify_init(self):
+        """
+        Internal use
+
+        :return (libc, fd) or None if inotify is not available
+        :rtype  tuple
+        """
+
+        library = ctypes.util.find_library("c")
+        if library is None:
+            return None
+        try:
+            libc = ctypes.CDLL(library, use_errno=True)
+            fd = libc.inotify_init1(_IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+
+        self._root_wd = libc.inotify_add_watch(fd, os.fsencode(str(self.path)), _IN_MASK)
+        if self._root_wd < 0:
+            os.close(fd)
+            return None
+        self._watches = {self._root_wd: str(self.path)}
+        return libc, fd
+
+    def _watch_tree(self, libc, fd, path):
+        """
+        Internal use
+
+        Adds a watch for every directory in 'path' (including it)
+
+        :return the watched files in them, see '_scan()'
+        :rtype  dict
+        """
+
+        dirs = {}
+        files = self._scan(path, dirs)
+        for directory in dirs:
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), _IN_MASK)
+            if wd < 0:
+                logging.error("Could not watch the directory: {} "
+                              "Error: {}".format(directory, os.strerror(ctypes.get_errno())))
+            else:
+                self._watches[wd] = directory
+        return files
+
+    def _unwatch_tree(self, libc, fd, path):
+        """
+        Internal use
+
+        Removes the watches of 'path' and its subdirectories (e.g. moved away)
+
+        :return the known files in them
+        :rtype  list
+        """
+
+        prefix = os.path.join(path, "")
+        for wd, directory in list(self._watches.items()):
+            if wd != self._root_wd and (directory == path or directory.startswith(prefix)):
+                del self._watches[wd]
+                libc.inotify_rm_watch(fd, wd)
+        return [file for file in self._files if file.startswith(prefix)]
+
+    def _run_inotify(self, libc, fd):
+        """
+        Internal use
+
+        Runs in the Watcher's thread
+        Collects the paths of the changed files for 'interval' seconds,
+        then checks only them
+        """
+
+        pending = set()
+        # when the collected changes are checked:
+        deadline = None
+        try:
+            while not self._stopped.is_set():
+                timeout = self._interval if deadline is None else max(0.0, deadline - time.monotonic())
+                ready, _, _ = select.select([fd], [], [], timeout)
+
+                if ready:
+                    data = os.read(fd, 64 * 1024)
+                    offset = 0
+                    while offset < len(data):
+                        wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                        offset += _EVENT_HEADER.size
+                        name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                        offset += length
+
+                        if mask & _IN_Q_OVERFLOW:
+                            # some events were lost, compare (and watch) everything once:
+                            pending.update(self._files)
+                            pending.update(self._watch_tree(libc, fd, str(self.path)))
+                        elif mask & (_IN_DELETE_SELF | _IN_MOVE_SELF) and wd == self._root_wd:
+                            logging.warning("The watched directory is gone: {}".format(self.path))
+                            self._apply(list(self._files))
+                            return
+                        elif mask & _IN_IGNORED:
+                            # the watch was removed, the directory is gone:
+                            self._watches.pop(wd, None)
+                        elif wd in self._watches and name:
+                            full_path = os.path.join(self._watches[wd], name)
+                            if mask & _IN_ISDIR:
+                                if mask & (_IN_MOVED_FROM | _IN_DELETE):
+                                    pending.update(self._unwatch_tree(libc, fd, full_path))
+                                elif mask & (_IN_CREATE | _IN_MOVED_TO):
+                                    self._watch_tree(libc, fd, full_path)
+                                    # the files added before the new directories were watched:
+                                    pending.update(self._scan(full_path))
+                            elif name.endswith(self._file_types):
+                                pending.add(full_path)
+
+                    if pending and deadline is None:
+                        deadline = time.monotonic() + self._interval
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._apply(pending)
+                    pending = set()
+                    deadline = None
+        finally:
+            os.close(fd)
+
+    def _run_polling(self):
+        """
+        Internal use
+
+        Runs in the Watcher's thread
+        """
+
+        while not self._stopped.wait(self._interval):
+            current = self._scan()
+            added, removed, modified = set(), set(), set()
+            for file, state in current.items():
+                old_state = self._files.get(file)
+                if old_state is None:
+                    added.add(file)
+                elif old_state != state:
+                    modified.add(file)
+            removed.update(self._files.keys() - current.keys())
+            self._files = current
+            self._report(added, removed, modified)
+
+    def start(self):
+        """
+        Takes a snapshot of the directory and starts watching it
+
+        :return self
+        :rtype  Watcher
+        """
+
+        if self._thread is not None:
+            return self
+
+        inotify = self._inotify_init() if self._use_inotify else None
+        if inotify is not None:
+            self.mode = "inotify"
+            # a watch for every subdirectory, the snapshot is taken by the same scan:
+            self._files = self._watch_tree(inotify[0], inotify[1], str(self.path))
+            self._thread = threading.Thread(target=self._run_inotify, args=inotify, daemon=True)
+        else:
+            self.mode = "polling"
+            self._files = self._scan()
+            self._thread = threading.Thread(target=self._run_polling, daemon=True)
+        self._thread.start()
+        logging.info("Watching {} for changes ({})".format(self.path, self.mode))
+        return self
+
+    def stop(self):
+        """
+        Stops watching, waits for the last batch of changes to be reported
+        """
+
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
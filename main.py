@@ -27,7 +27,7 @@ def init_logging(level, log_dir):
     pass
 
 
-def set_vars():
+def set_vars(argv=None):
     parser = argparse.ArgumentParser()
 
     logging_options = parser.add_argument_group(title="MML-Client Logging options")
@@ -53,11 +53,43 @@ def set_vars():
                               type=str,
                               metavar="DIR",
                               help="Directory of saved Playlist files to use")
+    path_options.add_argument("--pl-format",
+                              required=False,
+                              type=str,
+                              choices=["json", "binary"],
+                              metavar="FORMAT",
+                              help="Format of the saved Playlist files - 'json' or 'binary' (compact .mmlp)")
     path_options.add_argument("--songs-dir",
                               required=False,
                               type=str,
                               metavar="DIR",
                               help="Directory of saved audio files to use")
+    path_options.add_argument("--cache-dir",
+                              required=False,
+                              type=str,
+                              metavar="DIR",
+                              help="Directory to store the cached tags of the audio files")
+
+    library_options = parser.add_argument_group(title="MML-Client library options")
+    library_options.add_argument("--scan-workers",
+                                 required=False,
+                                 type=int,
+                                 choices=iter(range(1, 257)),
+                                 metavar="N",
+                                 help="Number of workers loading the audio files at startup")
+    library_options.add_argument("--scan-pool",
+                                 required=False,
+                                 type=str,
+                                 choices=["thread", "process"],
+                                 metavar="POOL",
+                                 help="Type of the workers loading the audio files at startup")
+    library_options.add_argument("--scan-dirs",
+                                 required=False,
+                                 type=str,
+                                 choices=["all", "changed"],
+                                 metavar="DIRS",
+                                 help="List 'all' directories of the songs at startup, "
+                                      "or only the 'changed' ones since the last scan (needs the tag cache)")
 
     web_server_options = parser.add_argument_group(title="MML-Client web server options")
     web_server_options.add_argument("--port",
@@ -66,8 +98,26 @@ def set_vars():
                                     choices=iter(range(1025, 65536)),
                                     metavar="PORT",
                                     help="The local port from which to access the App")
+    web_server_options.add_argument("--server",
+                                    required=False,
+                                    type=str,
+                                    choices=["flask", "waitress"],
+                                    metavar="SERVER",
+                                    help="'flask' (development) or 'waitress' (production) web server")
+    web_server_options.add_argument("--threads",
+                                    required=False,
+                                    type=int,
+                                    choices=iter(range(1, 257)),
+                                    metavar="N",
+                                    help="Number of threads serving the requests (only for 'waitress')")
+    web_server_options.add_argument("--metrics",
+                                    required=False,
+                                    type=str,
+                                    choices=["on", "off"],
+                                    metavar="on|off",
+                                    help="Record timings and counters and serve them on /metrics")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     if args.log_level:
         # if set by the CLI:
@@ -100,6 +150,15 @@ def set_vars():
     # export to the ENV:
     environ["MML_CLIENT_PLAYLISTS_PATH"] = pl_dir
 
+    if args.pl_format:
+        # if set by the CLI:
+        pl_format = args.pl_format
+    else:
+        # if not set by the CLI, use the ENV:
+        pl_format = environ.get("MML_CLIENT_PLAYLISTS_FORMAT", default="json")
+    # export to the ENV:
+    environ["MML_CLIENT_PLAYLISTS_FORMAT"] = pl_format
+
     if args.songs_dir:
         # if set by the CLI:
         songs_dir = args.songs_dir
@@ -111,6 +170,44 @@ def set_vars():
     # export to the ENV:
     environ["MML_CLIENT_SONGS_PATH"] = songs_dir
 
+    if args.cache_dir:
+        # if set by the CLI:
+        cache_dir = args.cache_dir
+    else:
+        # if not set by the CLI, use the ENV:
+        cache_dir = environ.get("MML_CLIENT_CACHE_PATH", default="./data/cache/")
+    # if necessary, create the directory:
+    makedirs(cache_dir, exist_ok=True)
+    # export to the ENV:
+    environ["MML_CLIENT_CACHE_PATH"] = cache_dir
+
+    if args.scan_workers:
+        # if set by the CLI:
+        scan_workers = str(args.scan_workers)
+    else:
+        # if not set by the CLI, use the ENV:
+        scan_workers = environ.get("MML_CLIENT_SCAN_WORKERS", default="1")
+    # export to the ENV:
+    environ["MML_CLIENT_SCAN_WORKERS"] = scan_workers
+
+    if args.scan_pool:
+        # if set by the CLI:
+        scan_pool = args.scan_pool
+    else:
+        # if not set by the CLI, use the ENV:
+        scan_pool = environ.get("MML_CLIENT_SCAN_POOL", default="thread")
+    # export to the ENV:
+    environ["MML_CLIENT_SCAN_POOL"] = scan_pool
+
+    if args.scan_dirs:
+        # if set by the CLI:
+        scan_dirs = args.scan_dirs
+    else:
+        # if not set by the CLI, use the ENV:
+        scan_dirs = environ.get("MML_CLIENT_SCAN_DIRS", default="all")
+    # export to the ENV:
+    environ["MML_CLIENT_SCAN_DIRS"] = scan_dirs
+
     if args.port:
         # export the ENV:
         environ["FLASK_RUN_PORT"] = str(args.port)
@@ -118,6 +215,52 @@ def set_vars():
         # export the ENV:
         environ["FLASK_RUN_PORT"] = "5000"
 
+    if args.server:
+        # if set by the CLI:
+        server = args.server
+    else:
+        # if not set by the CLI, use the ENV:
+        server = environ.get("MML_CLIENT_SERVER", default="flask")
+    # export to the ENV:
+    environ["MML_CLIENT_SERVER"] = server
+
+    if args.threads:
+        # if set by the CLI:
+        threads = str(args.threads)
+    else:
+        # if not set by the CLI, use the ENV:
+        threads = environ.get("MML_CLIENT_THREADS", default="8")
+    # export to the ENV:
+    environ["MML_CLIENT_THREADS"] = threads
+
+    if args.metrics:
+        # if set by the CLI:
+        metrics = args.metrics
+    else:
+        # if not set by the CLI, use the ENV:
+        metrics = environ.get("MML_CLIENT_METRICS", default="on")
+    # export to the ENV:
+    environ["MML_CLIENT_METRICS"] = metrics
+
+
+def serve(app, debug_server):
+    # the audio is played by this process and every request must see the same
+    # Playlists and playing Song -> a single process, serving the requests
+    # with threads (the state shared by them is guarded by 'Playback.lock'):
+    if environ["MML_CLIENT_SERVER"] == "waitress":
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            logging.critical("'waitress' is not installed, run: pip install waitress")
+            raise SystemExit("'waitress' is not installed, run: pip install waitress")
+        logging.info("Serving with waitress, threads: {}".format(environ["MML_CLIENT_THREADS"]))
+        waitress_serve(app, host="0.0.0.0", port=int(environ["FLASK_RUN_PORT"]),
+                       threads=int(environ["MML_CLIENT_THREADS"]))
+    else:
+        # TODO: host="0.0.0.0" is required by Docker
+        # start the Web-Server:
+        app.run(debug=debug_server, host="0.0.0.0", port=environ["FLASK_RUN_PORT"], threaded=True)
+
 
 if __name__ == "__main__":
     # if '-h' or '--help' is passed, the script exits:
@@ -137,6 +280,4 @@ if __name__ == "__main__":
     else:
         debug_server = False
 
-    # TODO: host="0.0.0.0" is required by Docker
-    # start the Web-Server:
-    app.run(debug=debug_server, host="0.0.0.0", port=environ["FLASK_RUN_PORT"])
+    serve(app, debug_server)
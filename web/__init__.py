@@ -6,12 +6,23 @@ def create_app():
     # create and configure the app:
     app = Flask(__name__, instance_relative_config=True)
 
-    # Blueprint main_view:
-    from .views import main_view
+    # Blueprints main_view, api_view and metrics_view:
+    from .views import api_view, main_view, metrics_view
+    from bin import metrics
+    # when disabled, nothing is recorded and the requests are not timed:
+    metrics.enabled = environ.get("MML_CLIENT_METRICS", "on") == "on"
     from .backends.playback import Playback
-    # init the backend used by Blueprint main_view :
+    # init the backend used by Blueprints main_view and api_view:
     backend = Playback(songs_path=environ["MML_CLIENT_SONGS_PATH"],
-                       pl_path=environ["MML_CLIENT_PLAYLISTS_PATH"])
+                       pl_path=environ["MML_CLIENT_PLAYLISTS_PATH"],
+                       pl_format=environ.get("MML_CLIENT_PLAYLISTS_FORMAT", "json"),
+                       cache_path=environ.get("MML_CLIENT_CACHE_PATH"),
+                       scan_workers=int(environ.get("MML_CLIENT_SCAN_WORKERS", "1")),
+                       scan_pool=environ.get("MML_CLIENT_SCAN_POOL", "thread"),
+                       scan_dirs=environ.get("MML_CLIENT_SCAN_DIRS", "all"))
     app.register_blueprint(main_view.bp, url_defaults={"backend": backend})
+    app.register_blueprint(api_view.bp, url_defaults={"backend": backend})
+    if metrics.enabled:
+        app.register_blueprint(metrics_view.bp)
 
     return app
@@ -0,0 +1,415 @@
+"""
+    Part of MML-client
+
+    Streaming playback engine used by Playback
+
+    Exports:
+        class StreamPlayer
+        class PcmCache
+        decode_head(path, seconds)
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from queue import Queue, Empty, Full
+
+# for playing the PCM chunks:
+from simpleaudio import play_buffer
+
+from bin import metrics
+# the PCM of the audio files, decoded by 'ffmpeg' or read as it is (see bin/decoders.py):
+from bin.decoders import BYTES_PER_SECOND, PCM_FORMAT, open_pcm
+
+
+# the PCM format, in which the audio files are decoded by 'ffmpeg':
+CHANNELS, SAMPLE_WIDTH, SAMPLE_RATE = PCM_FORMAT
+FRAME_SIZE = CHANNELS * SAMPLE_WIDTH
+
+# 1 second of PCM per chunk (~172 KB):
+CHUNK_SIZE = BYTES_PER_SECOND
+
+# max number of decoded chunks waiting to be played:
+BUFFER_CHUNKS = 4
+
+# how often the worker threads check if they were stopped:
+_POLL_INTERVAL = 0.1
+
+
+def decode_head(path, seconds):
+    """
+    Decodes only the start of an audio file
+
+    :param path: The path of the audio file
+    :type  path: str
+    :type  path: Path
+
+    :param int seconds: how much of the audio file to decode
+
+    :return (pcm, complete) - 'complete' is True when the whole file
+            was shorter than 'seconds' and is in 'pcm'
+            -> (b"", False) for the audio files played without decoding (e.g. WAV)
+    :rtype  tuple
+    """
+
+    size = seconds * BYTES_PER_SECOND
+    source = None
+    try:
+        with metrics.timer("mml_decode_head_seconds"):
+            source = open_pcm(path)
+            if source.zero_copy:
+                # nothing to gain, its first chunk is ready at once:
+                return b"", False
+            pcm = source.read(size)
+        metrics.inc("mml_decoded_bytes_total", len(pcm))
+    except OSError as e:
+        logging.error("Could not decode audio-file: {} "
+                      "Error: {}".format(path, e))
+        return b"", False
+    finally:
+        if source is not None:
+            source.close()
+
+    complete = len(pcm) < size
+    return pcm[:len(pcm) - len(pcm) % FRAME_SIZE], complete
+
+
+class PcmCache:
+    """
+        Part of MML-client
+
+        Thread-safe LRU cache of decoded PCM (see decode_head()),
+        keyed by the path of the audio file and bounded by the total size
+
+        Instance methods:
+            get(path)
+            put(path, pcm, complete)
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param int max_bytes: Max total size of the cached PCM
+        """
+
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, path):
+        with self._lock:
+            return str(path) in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, path):
+        """
+        :return (pcm, complete) or None if not cached
+        :rtype  tuple
+        """
+
+        with self._lock:
+            entry = self._entries.get(str(path))
+            if entry is not None:
+                self._entries.move_to_end(str(path))
+            return entry
+
+    def put(self, path, pcm, complete):
+        """
+        Caches the PCM, evicting the least recently used entries if needed
+        PCM bigger than 'max_bytes' is not cached
+        """
+
+        if len(pcm) > self.max_bytes:
+            return
+
+        with self._lock:
+            old_entry = self._entries.pop(str(path), None)
+            if old_entry is not None:
+                self.size -= len(old_entry[0])
+
+            self._entries[str(path)] = (pcm, complete)
+            self.size += len(pcm)
+            while self.size > self.max_bytes:
+                evicted_pcm, evicted_complete = self._entries.popitem(last=False)[1]
+                self.size -= len(evicted_pcm)
+
+
+class StreamPlayer:
+    """
+        Part of MML-client
+
+        Plays an audio file, without decoding it as a whole.
+        A decoder thread reads fixed-size PCM chunks (see bin/decoders.py ->
+        from 'ffmpeg' or, for WAV files, views of the memory-mapped file)
+        into a bounded buffer, an output thread plays them one after another
+        (each one is passed to the sink at the pace they are played,
+        while the previous one is still playing -> no gaps),
+        so the time to the first sample and the memory used
+        do NOT depend on the length of the audio file.
+
+        An already decoded start of the file ('head') is played first,
+        while the decoder continues after it.
+
+        With 'next_track', the decoder continues with the next audio file
+        as soon as the current one is decoded, so there is no gap between
+        them, 'on_track_change' is called when its first chunk is played.
+
+        Instance methods:
+            is_playing()
+            start()
+            stop()
+            wait_done()
+    """
+
+    def __init__(self, path, sink=play_buffer, chunk_size=CHUNK_SIZE, buffer_chunks=BUFFER_CHUNKS,
+                 head=None, next_track=None, on_track_change=None, start=0, index=None):
+        """
+        :param path: The path of the audio file to be played
+        :type  path: str
+        :type  path: Path
+
+        :param sink: Plays a single PCM chunk, same signature as simpleaudio.play_buffer
+        :type  sink: callable
+
+        :param int chunk_size:    Size of a single PCM chunk in bytes (of the decoded PCM,
+                                  the same duration for the audio files played as they are)
+        :param int buffer_chunks: Max number of decoded chunks held in memory
+
+        :param tuple head: (pcm, complete) as returned by decode_head()
+
+        :param next_track: Called by the decoder thread with the path of the decoded
+                           audio file, returns the (path, head) of the next one or None
+        :type  next_track: callable
+
+        :param on_track_change: Called by the output thread with the path
+                                of the next audio file, when it starts playing
+        :type  on_track_change: callable
+
+        :param start: seconds from the start of the (first) audio file, where playing starts,
+                      'head' is not used then
+        :type  start: int
+        :type  start: float
+
+        :param index: the seek index of the audio file (see Decoder.seek_index()),
+                      decoding starts at the frame closest to 'start'
+        :type  index: SeekIndex
+        """
+
+        self.path = str(path)
+        self._sink = sink
+        # only whole frames are sent to the sound card:
+        self._chunk_size = max(FRAME_SIZE, chunk_size - chunk_size % FRAME_SIZE)
+        self._buffer = Queue(maxsize=buffer_chunks)
+        self._head = head if not start else None
+        self._start = start
+        self._index = index
+        self._next_track = next_track
+        self._on_track_change = on_track_change
+
+        self._source = None
+        # the last 2 chunks passed to the sink, they could be playing at once:
+        self._play_obj = None
+        self._prev_play_obj = None
+        self._started = False
+        self._stopped = threading.Event()
+        self._done = threading.Event()
+
+        self._decoder = threading.Thread(target=self._decode, daemon=True)
+        self._output = threading.Thread(target=self._play, daemon=True)
+
+    def _decode(self):
+        """
+        Internal use
+
+        Runs in the decoder thread
+        """
+
+        path, head = self.path, self._head
+        start, index = self._start, self._index
+        try:
+            while not self._stopped.is_set():
+                self._decode_track(path, head, start, index)
+                start, index = 0, None
+                if self._next_track is None:
+                    break
+
+                next_track = self._next_track(path)
+                if next_track is None:
+                    break
+                path, head = next_track
+                # a 'str' in the buffer marks the start of the next audio file:
+                self._put(str(path))
+        finally:
+            # 'None' marks the end of the stream:
+            self._put(None)
+
+    def _decode_track(self, path, head, start=0, index=None):
+        """
+        Internal use
+
+        Runs in the decoder thread
+        """
+
+        pcm, complete = head if head is not None else (b"", False)
+        if pcm:
+            # a 'tuple' in the buffer -> the PCM format of the next chunks:
+            self._put(PCM_FORMAT)
+        for offset in range(0, len(pcm), self._chunk_size):
+            self._put(pcm[offset:offset + self._chunk_size])
+        if complete:
+            return
+
+        try:
+            # the head is always whole seconds, unless 'complete':
+            self._source = open_pcm(path, seconds=start or len(pcm) // BYTES_PER_SECOND, index=index)
+            channels, sample_width, sample_rate = self._source.pcm_format
+            frame_size = channels * sample_width
+            # the same duration as 'chunk_size' of decoded PCM, whole frames:
+            chunk_size = max(1, self._chunk_size * sample_rate // BYTES_PER_SECOND) * frame_size
+            if not pcm or self._source.pcm_format != PCM_FORMAT:
+                self._put(self._source.pcm_format)
+
+            while not self._stopped.is_set():
+                chunk = self._source.read(chunk_size)
+                if not chunk:
+                    break
+                if not self._source.zero_copy:
+                    metrics.inc("mml_decoded_bytes_total", len(chunk))
+                # the last chunk could end with an incomplete frame:
+                chunk = chunk[:len(chunk) - len(chunk) % frame_size]
+                if chunk:
+                    self._put(chunk)
+        except OSError as e:
+            logging.error("Could not decode audio-file: {} "
+                          "Error: {}".format(path, e))
+        finally:
+            if self._source is not None:
+                self._source.close()
+
+    def _play(self):
+        """
+        Internal use
+
+        Runs in the output thread
+        """
+
+        pcm_format = PCM_FORMAT
+        # when the next chunk is passed to the sink (time.monotonic()) -> when the
+        # previous one is played, the output streams are opened with the same delay:
+        next_start = None
+        # the next audio file, until its first chunk is played:
+        next_path = None
+        while not self._stopped.is_set():
+            try:
+                chunk = self._buffer.get(timeout=_POLL_INTERVAL)
+            except Empty:
+                continue
+            if chunk is None:
+                break
+            if isinstance(chunk, str):
+                next_path = chunk
+                continue
+            if isinstance(chunk, tuple):
+                pcm_format = chunk
+                continue
+
+            if next_start is not None and self._stopped.wait(next_start - time.monotonic()):
+                break
+            now = time.monotonic()
+            self._prev_play_obj, self._play_obj = self._play_obj, self._sink(chunk, *pcm_format)
+            channels, sample_width, sample_rate = pcm_format
+            # after a buffer underrun, from now on:
+            next_start = max(next_start or 0, now) + len(chunk) / (channels * sample_width * sample_rate)
+            # stop() could have been called while the chunk was passed to the sink:
+            if self._stopped.is_set():
+                self._play_obj.stop()
+            if next_path is not None:
+                self._track_changed(next_path)
+                next_path = None
+
+        if next_path is not None:
+            self._track_changed(next_path)
+        if self._play_obj is not None:
+            # the previous chunk ends before the last one:
+            self._play_obj.wait_done()
+        self._done.set()
+
+    def _track_changed(self, path):
+        """
+        Internal use
+
+        Runs in the output thread
+        """
+
+        self.path = path
+        if self._on_track_change is not None:
+            self._on_track_change(path)
+
+    def _put(self, chunk):
+        """
+        Internal use
+
+        Blocks while the buffer is full, unless the StreamPlayer is stopped
+        """
+
+        while not self._stopped.is_set():
+            try:
+                self._buffer.put(chunk, timeout=_POLL_INTERVAL)
+                return
+            except Full:
+                continue
+
+    def is_playing(self):
+        """
+        :return True from start() until the audio file ends or stop() is called
+        :rtype  Bool
+        """
+
+        return self._started and not self._done.is_set()
+
+    def start(self):
+        """
+        Starts the decoder and the output threads
+
+        :return self
+        :rtype  StreamPlayer
+        """
+
+        if not self._started:
+            self._started = True
+            self._decoder.start()
+            self._output.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the playback and the decoding, frees the buffered chunks
+        """
+
+        self._stopped.set()
+        for play_obj in (self._play_obj, self._prev_play_obj):
+            if play_obj is not None:
+                play_obj.stop()
+        if self._source is not None:
+            self._source.close()
+
+        if self._started:
+            self._output.join()
+            self._decoder.join()
+        else:
+            self._done.set()
+
+        # drop any chunks left in the buffer:
+        while not self._buffer.empty():
+            self._buffer.get_nowait()
+
+    def wait_done(self):
+        """
+        Blocks until the audio file ends or stop() is called
+        """
+
+        self._done.wait()
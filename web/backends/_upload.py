@@ -0,0 +1,232 @@
+"""
+    Part of MML-client
+
+    Background loading of uploaded audio files, used by Playback
+
+    Exports:
+        class UploadQueue
+"""
+
+import itertools
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from bin import Song
+from bin.content_hash import BLOCK_SIZE, ContentHasher
+
+
+# the states of a single uploaded file:
+QUEUED = "queued"
+LOADING = "loading"
+ADDED = "added"
+FAILED = "failed"
+# the same content as an audio file in the repo -> not saved:
+DUPLICATE = "duplicate"
+
+# the suffix of uploaded files, which are not loaded yet
+# (not an audio file suffix -> ignored by the Watcher):
+PART_SUFFIX = ".part"
+
+
+class UploadQueue:
+    """
+        Part of MML-client
+
+        Saves uploaded audio files next to the Songs in the repo and
+        loads them as Songs on a pool of worker threads, so the request
+        thread only waits for the files to be written to the disk.
+
+        Every call of submit() is a job, its progress is returned by status().
+        Only the last 'max_jobs' jobs are kept.
+
+        An uploaded file never replaces another one with the same name (a free
+        name is picked), with a ContentIndex it's not added at all, when its
+        content is already in the repo (hashed while it's written to the disk).
+
+        Instance methods:
+            submit(audio_files)
+            status(job_id)
+            shutdown()
+    """
+
+    def __init__(self, songs_path, on_song, workers=2, max_jobs=100, index=None):
+        """
+        :param songs_path: the directory, where the uploaded files are saved
+        :type  songs_path: str
+        :type  songs_path: Path
+
+        :param on_song: Called from a worker thread with every loaded Song
+        :type  on_song: callable
+
+        :param int workers:  number of worker threads loading the files
+        :param int max_jobs: number of jobs, whose status is kept
+
+        :param ContentIndex index: the audio files in the repo by their content
+        """
+
+        self.songs_path = Path(songs_path)
+        self._on_song = on_song
+        self._max_jobs = max_jobs
+        self._index = index
+        # job id -> {file name -> state}:
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mml-upload")
+
+    def submit(self, audio_files):
+        """
+        Saves the uploaded files and queues them to be loaded
+
+        :param audio_files: the uploaded files
+        :type  audio_files: list of werkzeug FileStorage objects
+
+        :return the id of the new job
+        :rtype  str
+        """
+
+        job_id = uuid.uuid4().hex
+        files = OrderedDict()
+        with self._lock:
+            self._jobs[job_id] = files
+            while len(self._jobs) > self._max_jobs:
+                self._jobs.popitem(last=False)
+
+        for audio_file in audio_files:
+            # only the name -> nothing can be saved outside 'songs_path':
+            name = Path(audio_file.filename or "").name
+            if not name:
+                continue
+            part_path = self.songs_path.joinpath(uuid.uuid4().hex + "-" + name + PART_SUFFIX)
+            hasher = ContentHasher() if self._index is not None else None
+            try:
+                self._save(audio_file, part_path, hasher)
+            except OSError as e:
+                logging.error("Could not save uploaded file: {} "
+                              "Error: {}".format(name, e))
+                self._set_state(files, name, FAILED)
+                continue
+
+            self._set_state(files, name, QUEUED)
+            self._pool.submit(self._load, files, name, part_path, hasher)
+        return job_id
+
+    @staticmethod
+    def _save(audio_file, part_path, hasher):
+        """
+        Internal use
+
+        Copies the upload chunk by chunk (werkzeug keeps bigger
+        uploads in a temporary file, not in memory), hashed on the way
+        """
+
+        if hasher is None:
+            audio_file.save(part_path)
+            return
+        with open(part_path, 'wb') as part_file:
+            for block in iter(lambda: audio_file.stream.read(BLOCK_SIZE), b""):
+                hasher.update(block)
+                part_file.write(block)
+
+    def _move(self, part_path, name):
+        """
+        Internal use
+
+        Moves the saved upload to 'name' in 'songs_path', or to "name (1)",
+        "name (2)"... if it's taken -> an existing file is never replaced
+
+        :return the new path
+        :rtype  Path
+        """
+
+        stem, suffix = os.path.splitext(name)
+        for number in itertools.count():
+            song_path = self.songs_path.joinpath(name if number == 0 else "{} ({}){}".format(stem, number, suffix))
+            try:
+                # unlike a rename, a link fails if the name is taken:
+                os.link(str(part_path), str(song_path))
+            except FileExistsError:
+                continue
+            part_path.unlink()
+            return song_path
+
+    def _set_state(self, files, name, state):
+        """
+        Internal use
+        """
+
+        with self._lock:
+            files[name] = state
+
+    def _load(self, files, name, part_path, hasher):
+        """
+        Internal use
+
+        Runs in a worker thread
+        """
+
+        self._set_state(files, name, LOADING)
+        song_path = None
+        try:
+            song_path = self._move(part_path, name)
+            if self._index is not None:
+                stat = song_path.stat()
+                original = self._index.add(song_path, stat.st_mtime_ns, stat.st_size,
+                                           partial=hasher.partial(), full=hasher.full())
+                if original is not None:
+                    logging.info("Uploaded file is a duplicate: {} (the same as {})".format(name, original))
+                    self._index.remove([song_path])
+                    song_path.unlink()
+                    self._set_state(files, name, DUPLICATE)
+                    return
+                self._index.save()
+            song = Song.load(song_path)
+        except Exception as e:
+            logging.error("Could not load uploaded file: {} "
+                          "Error: {}".format(name, e))
+            song = None
+
+        if song is None:
+            if self._index is not None and song_path is not None:
+                self._index.remove([song_path])
+            # the file could not be parsed, remove it from the local filesystem:
+            for path in (part_path, song_path):
+                if path is None:
+                    continue
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            self._set_state(files, name, FAILED)
+            return
+
+        self._on_song(song)
+        self._set_state(files, name, ADDED)
+
+    def status(self, job_id):
+        """
+        :return {"files": {file name -> state}, "done": Bool}
+                or None if there is no such job
+        :rtype  dict
+        """
+
+        with self._lock:
+            files = self._jobs.get(job_id)
+            if files is None:
+                return None
+            files = dict(files)
+        return {"files": files,
+                "done": all(state in (ADDED, FAILED, DUPLICATE) for state in files.values())}
+
+    def shutdown(self, wait=True):
+        """
+        Stops the worker threads, after the queued files are loaded
+
+        :param Bool wait: Block until the queued files are loaded
+        """
+
+        self._pool.shutdown(wait=wait)
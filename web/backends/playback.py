@@ -4,31 +4,90 @@
 """
 
 
-from bin import Crawler, Playlist, Song
+from bin import Crawler, Playlist, PlaylistCache, RWLock, SearchIndex, TagCache, Watcher, metrics
+from bin.content_hash import ContentIndex
+from bin.decoders import SeekIndex, find_decoder, supported_suffixes
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import logging
+import os
 
-# for reading '.mp3' files:
-from pydub import AudioSegment
+# for decoding and playing the audio files chunk by chunk:
+from ._stream import PcmCache, StreamPlayer, decode_head, play_buffer
+from ._upload import UploadQueue
 
-# for playing '.mp3' files:
-from simpleaudio import play_buffer, PlayObject
+# how much of the next/previous Song is decoded in advance:
+PREFETCH_SECONDS = 5
+
+# max number of seek indexes kept in memory (all of them are kept by the TagCache):
+SEEK_INDEXES = 32
 
 
 class Playback:
-    def __init__(self, songs_path, pl_path, default_name="--all-songs--"):
+    def __init__(self, songs_path, pl_path, pl_format="json", default_name="--all-songs--",
+                 scan_workers=1, scan_pool="thread", scan_dirs="all", cache_path=None, watch=True,
+                 playlist_cache_size=8, pcm_cache_size=64 * 2 ** 20, upload_workers=2, sink=play_buffer):
         self.songs_path = songs_path    # set by Flask.app from an ENV variable
         self.pl_path = pl_path          # set by Flask.app from an ENV variable
+        # the Playlists are saved as '.json' or in the compact binary '.mmlp' format:
+        self._pl_binary = pl_format == "binary"     # set by Flask.app from an ENV variable
         self._default_name = default_name
+        self._scan_workers = scan_workers   # set by Flask.app from an ENV variable
+        self._scan_pool = scan_pool         # set by Flask.app from an ENV variable
+        # only the directories changed since the last scan are listed at startup:
+        self._scan_changed_dirs = scan_dirs == "changed"   # set by Flask.app from an ENV variable
+
+        # guards 'playlist', its Songs and 'current_song_index', the Playlists and the playing Song,
+        # held for reading by the views only showing them (so they run in parallel),
+        # for writing by the views and the background threads changing them
+        # (NOT by the StreamPlayer threads, which are joined by 'song_stop()' while it is held):
+        self.lock = RWLock()
+
+        # the tags of the already loaded audio files, kept between runs:
+        self._tag_cache = TagCache(cache_path) if cache_path is not None else None
+
+        # the audio files in the repo by their content -> the same audio is added only once:
+        self._content_index = ContentIndex(self._tag_cache)
 
         # the default Playlist of all Song obj. in the repo:
         self.songs_in_repo = self._saved_songs_load()
 
+        # for searching the Songs in the repo by title, artist and album:
+        self.search_index = SearchIndex(self.songs_in_repo.songs)
+
+        # the last loaded Playlists, see 'playlist_cache.stats()' (or /metrics) for its hits/misses:
+        # (the Playlist files are written only by the App -> their Songs are not checked on load):
+        self.playlist_cache = PlaylistCache(playlist_cache_size, trusted=True)
+
+        # name -> "meta" header (see Playlist.load_meta()) of the saved Playlists,
+        # the Playlists themselves are loaded only when switched to:
+        self.lists_meta = {}
+
         # list of all Playlist names in the repo:
         self.lists_in_repo = [self.songs_in_repo.name()] + self._saved_playlists_load()
 
         self.playlist = self.songs_in_repo
-        self._song = PlayObject(play_id=1)
+
+        # loads the uploaded audio files, without blocking the requests:
+        self._uploads = UploadQueue(self.songs_path, self._song_added, workers=upload_workers,
+                                    index=self._content_index)
+
+        # keeps the default Playlist up to date with 'MML_CLIENT_SONGS_PATH':
+        self._watcher = Watcher(self.songs_path, self._saved_songs_update,
+                                file_types=supported_suffixes()).start() if watch else None
+        # the StreamPlayer of the last played Song:
+        self._song = None
+
+        # the decoded starts of the Songs next to the playing one,
+        # so switching to them (or to them automatically) has no delay:
+        self._pcm_cache = PcmCache(pcm_cache_size)
+        self._prefetcher = ThreadPoolExecutor(max_workers=1)
+        # checks the Songs of the loaded Playlists, without delaying the prefetching:
+        self._checker = ThreadPoolExecutor(max_workers=1)
+        # path -> (mtime_ns, size, SeekIndex) of the last played Songs, see 'song_seek()':
+        self._seek_indexes = {}
+        # plays the decoded PCM chunks, see StreamPlayer:
+        self._sink = sink
 
     def playlist_add(self, pl_name):
         """ Creates a new Playlist with the specified name
@@ -41,7 +100,7 @@ class Playback:
 
         tmp_pl = Playlist(pl_name)
         self.lists_in_repo.append(pl_name)
-        tmp_pl.save(self.pl_path)
+        saved_path = tmp_pl.save(self.pl_path, binary=self._pl_binary)
 
         # The Playlist constructor does NOT handle the possible PATH
         # of a file, where the Playlist obj. could be saved.
@@ -49,8 +108,10 @@ class Playback:
         # and NO Playlist.PATH modifications are made (it stays a '.').
         # Playlist.PATH is modified ONLY manually, or when the Playlist obj.
         # is LOADED with the Playlist.load() method !!!
+        # -> the saved file, with its '.json' (or '.mmlp') suffix:
 
-        tmp_pl.path = Path(self.pl_path).joinpath(pl_name)
+        tmp_pl.path = saved_path
+        self.lists_meta[pl_name] = {"name": pl_name, "path": saved_path, "songs": 0, "length": 0}
         return tmp_pl
 
     def playlist_change(self, pl_name):
@@ -58,9 +119,23 @@ class Playback:
             # switching to the already loaded default Playlist:
             return self.songs_in_repo
         else:
-            # loading the new Playlist:
-            tmp_path = Path(self.pl_path).joinpath(pl_name)
-            return Playlist.load(tmp_path)
+            # loading the new Playlist (if not already loaded):
+            # the file it was found in -> '.json' or '.mmlp':
+            tmp_path = self.lists_meta.get(pl_name, {}).get("path", Path(self.pl_path).joinpath(pl_name))
+            tmp_pl, loaded = self.playlist_cache.load(tmp_path)
+            if tmp_pl is not None and loaded:
+                # loaded from its file, not cached -> its Songs were not checked on load:
+                self._checker.submit(self._playlist_check, tmp_pl)
+            return tmp_pl
+
+    def _playlist_check(self, playlist):
+        """ Runs in the checker thread
+            Logs the Songs of the Playlist, whose audio files are missing """
+
+        missing = playlist.check_songs()
+        if missing:
+            logging.warning("{} audio files of Playlist '{}' are missing: {}".format(len(missing), playlist.name(),
+                                                                                     ", ".join(missing)))
 
     def playlist_delete(self):
         # because 'Playlist.__eq__' compares the absolute Paths,
@@ -68,29 +143,119 @@ class Playback:
         # checking if 'name' != 'default_name'
         if self.playlist.path is not None:
             del self.lists_in_repo[self.lists_in_repo.index(self.playlist.name())]
-            Path.unlink(self.playlist.path)
-            logging.info("Deleting MML-Playlist file: {}".format(self.playlist.path))
+            meta = self.lists_meta.pop(self.playlist.name(), None)
+            # the file it was last saved to (or found in):
+            path = meta["path"] if meta is not None else self.playlist.path
+            logging.info("Deleting MML-Playlist file: {}".format(path))
+            # removes its journal too:
+            Playlist.delete(path)
+            self.playlist_cache.invalidate(path)
             self.playlist = self.songs_in_repo
 
+    def playlist_save(self):
+        """ Saves the current Playlist in the 'MML_CLIENT_PLAYLISTS_PATH' directory
+            and updates its "meta" header in 'lists_meta'
+            The default Playlist is in memory only and is never saved """
+
+        if self.playlist.name() != self.songs_in_repo.name():
+            old_path = self.playlist.path
+            saved_path = self.playlist.save(self.pl_path, binary=self._pl_binary)
+            if old_path != saved_path and old_path.suffix in Playlist.suffixes and old_path.is_file():
+                # converted to the other format -> only one file per Playlist:
+                logging.info("Converted MML-Playlist file: {} -> {}".format(old_path, saved_path))
+                old_path.unlink()
+                self.playlist_cache.invalidate(old_path)
+            # the cached Playlist has the path of the file it is cached by:
+            self.playlist.path = saved_path
+            # the cached Playlist is the one being saved, only its mtime is updated:
+            self.playlist_cache.put(self.playlist, saved_path)
+            self.lists_meta[self.playlist.name()] = {"name": self.playlist.name(),
+                                                     "path": saved_path,
+                                                     "songs": len(self.playlist),
+                                                     "length": self.playlist.total_seconds()}
+
     def _saved_playlists_load(self):
         # TODO use DB for this:
         """ Loading of created and saved Playlist NAMES!!!
-            This is a temporary solution, should be read from a DB """
+            Only the "meta" header of every Playlist file is read,
+            NOT its Songs """
         playlist_names = []
-        for playlist in Crawler.find_playlist(self.pl_path):
-            playlist_names.append(str(playlist.name()))
+        for meta in Crawler.find_playlist_meta(self.pl_path):
+            playlist_names.append(str(meta["name"]))
+            self.lists_meta[str(meta["name"])] = meta
         return playlist_names
 
     def _saved_songs_load(self):
         """ Creates the default Playlist
-            with all of the '.mp3' files in 'MML_CLIENT_SONGS_PATH'
-            This method is called only when the app starts
-            and currently will NOT update if new files are added"""
+            with all of the supported audio files in 'MML_CLIENT_SONGS_PATH' and its subdirectories
+            This method is called only when the app starts,
+            any later changes are applied by '_saved_songs_update()'"""
         tmp_pl = Playlist(self._default_name)
-        tmp_pl.add_songs(Crawler.find_songs(self.songs_path))
+        tmp_pl.add_songs(Crawler.find_songs(self.songs_path,
+                                            workers=self._scan_workers,
+                                            pool=self._scan_pool,
+                                            cache=self._tag_cache,
+                                            skip_unchanged=self._scan_changed_dirs,
+                                            index=self._content_index))
         return tmp_pl
 
-    def song_add(self, audio_file):
+    def _saved_songs_update(self, added, removed, modified):
+        """ Applies the changes in 'MML_CLIENT_SONGS_PATH'
+            reported by the Watcher to the default Playlist
+            Only the changed audio files are loaded """
+
+        # the duplicates of the removed files are added instead of them:
+        orphans = set(self._content_index.remove(removed))
+        changed = self._unique_paths(sorted(added | modified | orphans))
+        # modified files, which are now duplicates of other ones, are removed:
+        duplicates = (added | modified | orphans).difference(changed)
+
+        loaded_songs = Crawler.load_songs(changed, cache=self._tag_cache)
+        if self._tag_cache is not None:
+            self._tag_cache.evict(removed)
+
+        # modified files, which can't be loaded anymore, are removed too:
+        unloadable = {path for path, song in zip(changed, loaded_songs) if song is None}
+        with self.lock.write():
+            self.songs_in_repo.remove_songs(removed | unloadable | duplicates)
+            for path, song in zip(changed, loaded_songs):
+                if song is not None and not self.songs_in_repo.replace_song(song):
+                    self.songs_in_repo.add_song(song)
+
+        self.search_index.remove_songs(removed | unloadable | duplicates)
+        self.search_index.add_songs(song for song in loaded_songs if song is not None)
+
+    def _unique_paths(self, paths):
+        """ Returns the 'paths' added to the content index,
+            without the duplicates of the audio files in the repo
+            The duplicates of a changed file (no longer the same) are added too """
+
+        unique_paths = []
+        paths = list(paths)
+        seen = set()
+        # the orphans appended by the content index are added by the same loop:
+        for path in paths:
+            if path in seen:
+                continue
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # removed since the change -> reported by the Watcher:
+                continue
+            original = self._content_index.add(path, stat.st_mtime_ns, stat.st_size, orphans=paths)
+            if original is None:
+                unique_paths.append(path)
+            else:
+                logging.info("Duplicate audio file: {} (the same as {})".format(path, original))
+        self._content_index.save()
+        return unique_paths
+
+    def songs_add(self, audio_files):
+        """ Saves the uploaded audio files in the 'MML_CLIENT_SONGS_PATH' directory
+            and loads them as Songs in the background (see songs_add_status())
+            Returns the id of the upload job """
+
         # !!! NOTE !!!: it makes more sense and would be quicker to
         # try loading the 'audio_file' as a Song object first
         # and only then save the file locally and add the Song
@@ -109,48 +274,183 @@ class Playback:
         #     except any bind mounts or volumes, so even only for a
         #     temporary work with a file, it has to be on the LOCAL filesystem
 
-        # a local (from the App's perspective) path,
-        # on successful save, the Song object will be loaded from here:
-        new_song_path = Path(self.songs_path).joinpath(audio_file.filename)
-
-        # duplicate the given FILE in the 'MML_CLIENT_SONGS_PATH' directory
+        # duplicate the given FILES in the 'MML_CLIENT_SONGS_PATH' directory
         # this way, every run of the app will have access only
-        # to it's locally saved Songs in 'MML_CLIENT_SONGS_PATH':
-        audio_file.save(new_song_path)
+        # to it's locally saved Songs in 'MML_CLIENT_SONGS_PATH',
+        # the files which could not be parsed are removed by the UploadQueue:
+        return self._uploads.submit(audio_files)
 
-        # create a new Song object from the audio file:
-        tmp_song = Song.load(new_song_path)
+    def songs_add_status(self, job_id):
+        """ Returns the state of every file of the upload job,
+            or None if there is no such job """
 
-        # if the audio file was actually parsed and can be played:
-        if tmp_song is not None:
-            # add the new Song to the repo:
-            self.songs_in_repo.add_song(tmp_song)
-        else:
-            # the given file could not be parsed,
-            # remove it from the local filesystem:
-            Path.unlink(new_song_path)
+        return self._uploads.status(job_id)
+
+    def _song_added(self, song):
+        """ Called by the UploadQueue with every loaded Song """
+
+        # the Watcher could have added it already:
+        with self.lock.write():
+            if not self.songs_in_repo.replace_song(song):
+                self.songs_in_repo.add_song(song)
+        self.search_index.add_song(song)
 
     def song_is_playing(self):
-        return self._song.is_playing()
+        return self._song is not None and self._song.is_playing()
+
+    def song_play(self, start=0):
+        """ Plays the marked Song of the Playlist (the first one, if none is marked)
+            from 'start' seconds, then the Songs after it """
 
-    def song_play(self):
         if len(self.playlist) > 0:
             # the list is loaded, but nothing was played until now
             # "button_play pressed" and nothing selected:
             if self.playlist.current_song_index == -1:
                 self.playlist.next_song()
 
-            song_to_play = self.playlist.songs[self.playlist.current_song_index].path()
+            playlist = self.playlist
+            song_to_play = playlist.songs[playlist.current_song_index].path()
 
+            # the Songs of a loaded Playlist are checked only when played (see Playlist.load(trusted=True)):
+            if not Path(song_to_play).is_file():
+                logging.error("Audio-file is missing: {}".format(song_to_play))
+                return
+
+            # only a seek needs the index, it's already there (or built) then:
+            index = self._song_seek_index(song_to_play) if start else None
             try:
-                sound = AudioSegment.from_mp3(song_to_play)
-                self._song = play_buffer(sound.raw_data,
-                                         num_channels=sound.channels,
-                                         bytes_per_sample=sound.sample_width,
-                                         sample_rate=sound.frame_rate)
+                # decoding is done in the background, chunk by chunk,
+                # so playing starts without waiting for the whole file,
+                # and continues with the next Songs in the Playlist:
+                # the output thread must never wait for 'lock' (see 'song_stop()'),
+                # 'player' is the StreamPlayer, once it is created:
+                player = StreamPlayer(song_to_play,
+                                      sink=self._sink,
+                                      head=self._pcm_cache.get(song_to_play),
+                                      next_track=lambda path: self._song_next_track(playlist, path),
+                                      on_track_change=lambda path: self._prefetcher.submit(self._song_track_changed,
+                                                                                           playlist, player, path),
+                                      start=start,
+                                      index=index)
+                self._song = player.start()
                 logging.info("Playing audio-file: {}".format(song_to_play))
             except Exception:
                 logging.error("Could not open audio-file: {}".format(song_to_play))
 
+            self._song_prefetch(playlist, playlist.current_song_index)
+            # ready for a seek in the playing Song:
+            self._prefetcher.submit(self._song_seek_index, song_to_play)
+
+    def song_seek(self, seconds):
+        """ Plays the marked Song from 'seconds' (restarted, if it's already playing)
+            Decoding starts at the closest frame from its seek index,
+            so the delay does not depend on 'seconds'
+            Returns True if the Song is playing """
+
+        if isinstance(seconds, bool) or not isinstance(seconds, (int, float)):
+            raise TypeError("Playback.song_seek() seconds must be an Int or a Float!")
+        if seconds < 0:
+            raise ValueError("Playback.song_seek() seconds cannot be a negative value!")
+
+        self.song_stop()
+        self.song_play(start=seconds)
+        return self.song_is_playing()
+
+    def _song_seek_index(self, path):
+        """ Returns the SeekIndex of the audio file (None for the formats seeking without one),
+            built with a single scan of its frame headers, only if it's not cached
+            or the file was changed since then
+            Runs in the prefetcher thread or while 'lock' is held for writing """
+
+        decoder = find_decoder(path)
+        if decoder is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        cached = self._seek_indexes.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+
+        index = None
+        if self._tag_cache is not None:
+            record = self._tag_cache.seek_index(path)
+            if record is not None and tuple(record[:2]) == (stat.st_mtime_ns, stat.st_size):
+                index = SeekIndex.from_bytes(record[2])
+
+        if index is None:
+            try:
+                with metrics.timer("mml_seek_index_seconds"):
+                    index = decoder.seek_index(path)
+            except OSError as e:
+                logging.error("Could not index audio-file: {} "
+                              "Error: {}".format(path, e))
+                return None
+            if index is not None and self._tag_cache is not None:
+                self._tag_cache.update_seek_index(path, stat.st_mtime_ns, stat.st_size, index.to_bytes())
+
+        if len(self._seek_indexes) >= SEEK_INDEXES:
+            # dicts keep the insertion order -> the oldest one:
+            self._seek_indexes.pop(next(iter(self._seek_indexes)), None)
+        self._seek_indexes[path] = (stat.st_mtime_ns, stat.st_size, index)
+        return index
+
+    def _song_next_track(self, playlist, path):
+        """ Called by the StreamPlayer, when the Song being decoded ('path') ends
+            Returns the (path, head) of the Song after it (where it is now,
+            the Playlist could have been reordered since) or None
+            Runs in the decoder thread -> does NOT take 'lock' """
+
+        index = playlist.index_of(path)
+        if index == -1:
+            # removed while playing:
+            return None
+        try:
+            # a single read of the list -> a concurrent removal can only make it an IndexError:
+            next_path = playlist.songs[index + 1].path()
+        except IndexError:
+            return None
+        return next_path, self._pcm_cache.get(next_path)
+
+    def _song_track_changed(self, playlist, player, path):
+        """ Called (in the prefetcher thread), when the next Song ('path')
+            started playing by the StreamPlayer 'player' """
+
+        with self.lock.write():
+            # a newer StreamPlayer already set the Song being played:
+            if self._song is not player:
+                return
+            index = playlist.index_of(path)
+            if index == -1:
+                # removed since it was decoded:
+                return
+            playlist.current_song_index = index
+            logging.info("Playing audio-file: {}".format(path))
+            self._song_prefetch(playlist, index)
+
+    def _song_prefetch(self, playlist, index):
+        """ Decodes the start of the Songs before and after 'index' in the background """
+
+        for neighbour in (index + 1, index - 1):
+            if 0 <= neighbour < len(playlist):
+                path = playlist.songs[neighbour].path()
+                if path not in self._pcm_cache:
+                    self._prefetcher.submit(self._song_prefetch_one, path)
+
+    def _song_prefetch_one(self, path):
+        """ Runs in the prefetcher thread """
+
+        if path not in self._pcm_cache:
+            pcm, complete = decode_head(path, PREFETCH_SECONDS)
+            if pcm:
+                self._pcm_cache.put(path, pcm, complete)
+
     def song_stop(self):
-        self._song.stop()
+        """ Stops the playing Song, a pending track change of its StreamPlayer is then ignored """
+
+        with self.lock.write():
+            player, self._song = self._song, None
+            if player is not None:
+                player.stop()
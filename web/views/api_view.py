@@ -0,0 +1,201 @@
+import base64
+import binascii
+import json
+import logging
+from flask import Blueprint, jsonify, request, url_for
+
+
+bp = Blueprint("api_view", __name__, url_prefix="/api")
+
+# the Song fields, which can be requested with '?fields=':
+SONG_FIELDS = {
+    "index": lambda index, song: index,
+    "title": lambda index, song: song.title(),
+    "artist": lambda index, song: song.artist(),
+    "album": lambda index, song: song.album(),
+    "length": lambda index, song: int(song.length()),
+    "length_pretty": lambda index, song: song.length_pretty(minutes=True, seconds=True),
+}
+DEFAULT_FIELDS = ["index", "title", "artist", "album", "length"]
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class ApiError(Exception):
+    """Invalid request parameters, returned as a '400 Bad Request'"""
+
+
+@bp.errorhandler(ApiError)
+def api_error(error):
+    return jsonify({"error": str(error)}), 400
+
+
+def _encode_cursor(index, song):
+    """
+    The cursor points after the last returned Song,
+    it stays valid if Songs before it are added or removed
+    """
+
+    cursor = json.dumps([index, song.path()]).encode()
+    return base64.urlsafe_b64encode(cursor).decode()
+
+
+def _decode_cursor(playlist, cursor):
+    """
+    :return the index, from which the next page starts
+    :rtype  int
+    """
+
+    if not cursor:
+        return 0
+    try:
+        index, path = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        index = int(index)
+    except (binascii.Error, ValueError, TypeError):
+        raise ApiError("Invalid cursor")
+    # a crafted cursor -> a negative index would wrap around the list:
+    if index < -1:
+        raise ApiError("Invalid cursor")
+
+    # the Song could have moved (or could be removed) since the last page:
+    moved_index = playlist.index_of(path)
+    return moved_index + 1 if moved_index != -1 else index + 1
+
+
+def _getters():
+    """
+    :return (field, getter) of the Song fields requested by '?fields=' (comma-separated)
+    :rtype  list
+    """
+
+    fields = request.args.get("fields")
+    fields = fields.split(",") if fields else DEFAULT_FIELDS
+    unknown_fields = [field for field in fields if field not in SONG_FIELDS]
+    if unknown_fields:
+        raise ApiError("Unknown fields: {}".format(", ".join(unknown_fields)))
+    return [(field, SONG_FIELDS[field]) for field in fields]
+
+
+def _limit():
+    """
+    :return the page size requested by '?limit='
+    :rtype  int
+    """
+
+    try:
+        limit = int(request.args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError("'limit' must be an Int")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ApiError("'limit' must be between 1 and {}".format(MAX_LIMIT))
+    return limit
+
+
+def _page(playlist):
+    """
+    A page of Songs from 'playlist', as requested by
+    '?cursor=', '?limit=' and '?fields=' (comma-separated)
+    """
+
+    limit = _limit()
+    getters = _getters()
+
+    start = _decode_cursor(playlist, request.args.get("cursor"))
+    end = min(start + limit, len(playlist))
+    items = [{field: getter(index, playlist.songs[index]) for field, getter in getters}
+             for index in range(start, end)]
+
+    next_cursor = _encode_cursor(end - 1, playlist.songs[end - 1]) if end < len(playlist) else None
+    return {"items": items, "next_cursor": next_cursor, "total": len(playlist)}
+
+
+@bp.route("/songs", methods=["GET"])
+def songs(backend):
+    logging.debug("Server path: {}  Method: {}".format(request.path, request.method))
+    with backend.lock.read():
+        return jsonify(_page(backend.songs_in_repo))
+
+
+@bp.route("/playlist", methods=["GET"])
+def playlist(backend):
+    logging.debug("Server path: {}  Method: {}".format(request.path, request.method))
+    with backend.lock.read():
+        page = _page(backend.playlist)
+        page.update({"name": backend.playlist.name(),
+                     "current_song_index": backend.playlist.current_song_index,
+                     "length": backend.playlist.total_length()})
+    return jsonify(page)
+
+
+@bp.route("/search", methods=["GET"])
+def search(backend):
+    """ Songs from the repo matching '?q=' (see SearchIndex.search()),
+        'index' is their index in the default Playlist """
+    logging.debug("Server path: {}  Method: {}".format(request.path, request.method))
+
+    limit = _limit()
+    getters = _getters()
+
+    found = backend.search_index.search(request.args.get("q", ""), limit=limit)
+    with backend.lock.read():
+        items = [{field: getter(backend.songs_in_repo.index_of(song.path()), song) for field, getter in getters}
+                 for song in found]
+    return jsonify({"items": items, "total": len(items)})
+
+
+@bp.route("/uploads", methods=["POST"])
+def uploads(backend):
+    """ Queues the uploaded 'audio_files' to be loaded,
+        returns the id of the job and where to follow its progress """
+    logging.debug("Server path: {}  Method: {}".format(request.path, request.method))
+
+    audio_files = request.files.getlist("audio_files")
+    if not audio_files:
+        raise ApiError("No 'audio_files' uploaded")
+    job_id = backend.songs_add(audio_files)
+    return jsonify({"job_id": job_id,
+                    "status_url": url_for("api_view.upload_status", job_id=job_id)}), 202
+
+
+@bp.route("/uploads/<job_id>", methods=["GET"])
+def upload_status(backend, job_id):
+    logging.debug("Server path: {}  Method: {}".format(request.path, request.method))
+    status = backend.songs_add_status(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown upload job"}), 404
+    return jsonify(dict(status, job_id=job_id))
+
+
+@bp.route("/seek", methods=["POST"])
+def seek(backend):
+    """ Plays the marked Song of the current Playlist from '?seconds=' (or the form field) """
+    logging.debug("Server path: {}  Method: {}".format(request.path, request.method))
+
+    try:
+        seconds = float(request.values.get("seconds", ""))
+    except ValueError:
+        raise ApiError("Invalid seconds")
+    if not 0 <= seconds < float("inf"):
+        raise ApiError("Invalid seconds")
+
+    with backend.lock.write():
+        playing = backend.song_seek(seconds)
+        index = backend.playlist.current_song_index
+    return jsonify({"playing": playing, "current_song_index": index, "seconds": seconds})
+
+
+@bp.route("/playlists", methods=["GET"])
+def playlists(backend):
+    logging.debug("Server path: {}  Method: {}".format(request.path, request.method))
+    with backend.lock.read():
+        items = [{"name": backend.songs_in_repo.name(),
+                  "songs": len(backend.songs_in_repo),
+                  "length": backend.songs_in_repo.total_seconds()}]
+        for name in backend.lists_in_repo[1:]:
+            meta = backend.lists_meta.get(name, {})
+            items.append({"name": name,
+                          "songs": meta.get("songs", 0),
+                          "length": meta.get("length", 0)})
+        current = backend.playlist.name()
+    return jsonify({"items": items, "current": current})
@@ -0,0 +1,28 @@
+import time
+from flask import Blueprint, Response, g, request
+from bin import metrics
+
+
+# registered only when the metrics are enabled (see create_app()):
+bp = Blueprint("metrics_view", __name__)
+
+
+@bp.before_app_request
+def request_started():
+    g.request_started = time.perf_counter()
+
+
+@bp.after_app_request
+def request_finished(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        metrics.observe("mml_request_seconds", time.perf_counter() - started,
+                        endpoint=request.endpoint or "unknown",
+                        method=request.method,
+                        status=response.status_code)
+    return response
+
+
+@bp.route("/metrics", methods=["GET"])
+def metrics_text():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,24 @@
+"""
+    Part of MML-client
+
+    WSGI entry point, for serving the App with a production web server:
+
+        gunicorn --workers 1 --threads 8 --bind 0.0.0.0:5000 wsgi:app
+
+    The audio is played by the serving process, so only a single worker
+    process must be used, the requests are served by its threads.
+    The App is configured only from the ENV (see 'python main.py -h').
+"""
+
+import logging
+from os import environ
+import main
+import web
+
+
+# the defaults for everything not set in the ENV (the CLI is not parsed):
+main.set_vars([])
+main.init_logging(level=getattr(logging, environ["MML_CLIENT_LOG_LEVEL"].upper(), None),
+                  log_dir=environ["MML_CLIENT_LOG_DIR"])
+
+app = web.create_app()